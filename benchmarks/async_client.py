@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Compare a sequential QNAPStats sweep with a concurrent AsyncQNAPStats sweep.
+
+Responses are served from the fixtures in tests/responses/ with an artificial
+per-request latency standing in for the NAS' slow CGI handlers.
+"""
+# -*- coding:utf-8 -*-
+import asyncio
+import os
+import re
+import sys
+import time
+
+import responses
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import qnapstats  # noqa: E402
+
+LATENCY = float(os.environ.get('QNAP_BENCH_LATENCY', '0.05'))
+ROUNDS = int(os.environ.get('QNAP_BENCH_ROUNDS', '5'))
+
+response_directory = os.path.join(os.path.dirname(__file__), '..', 'tests', 'responses')
+
+# CGI path (without the SID) -> fixture file
+fixtures = {
+    'authLogin.cgi': 'login.xml',
+    'management/manaRequest.cgi?subfunc=sysinfo&hd=no&multicpu=1': 'systemstats.xml',
+    'management/chartReq.cgi?chart_func=disk_usage&disk_select=all&include=all': 'volumes.xml',
+    'disk/qsmart.cgi?func=all_hd_data': 'smartdiskhealth.xml',
+    'management/chartReq.cgi?chart_func=QSM40bandwidth': 'bandwidth.xml',
+}
+
+getters = {
+    'systemstats.xml': 'get_system_stats',
+    'volumes.xml': 'get_volumes',
+    'smartdiskhealth.xml': 'get_smart_disk_health',
+    'bandwidth.xml': 'get_bandwidth',
+}
+
+
+def read_fixture(model, name):
+    path = os.path.join(response_directory, model, name)
+    if not os.path.exists(path):
+        return None
+
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def add_delayed_responses(rsps, model):
+    def callback(request):
+        time.sleep(LATENCY)
+        path = re.sub(r'[?&]sid=[^&]*$', '', request.path_url.split('/cgi-bin/', 1)[1])
+        if path.startswith('authLogin.cgi'):
+            path = 'authLogin.cgi'
+        body = read_fixture(model, fixtures.get(path, '')) if path in fixtures else None
+        if body is None:
+            return 404, {}, b''
+        return 200, {'Content-Type': 'text/xml'}, body
+
+    pattern = re.compile(r'http://localhost:8080/cgi-bin/.*')
+    rsps.add_callback(responses.GET, pattern, callback=callback)
+    rsps.add_callback(responses.POST, pattern, callback=callback)
+
+
+def sync_sweep(model, names):
+    qnap = qnapstats.QNAPStats('localhost', 8080, 'admin', 'correcthorsebatterystaple')
+    return [getattr(qnap, name)() for name in names]
+
+
+async def async_sweep(model, names):
+    qnap = qnapstats.AsyncQNAPStats('localhost', 8080, 'admin', 'correcthorsebatterystaple')
+    return await asyncio.gather(*[getattr(qnap, name)() for name in names])
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        func(*args)
+    return (time.perf_counter() - start) / ROUNDS
+
+
+def main():
+    print(f'latency={LATENCY * 1000:.0f}ms rounds={ROUNDS}')
+    print(f'{"model":<22}{"getters":>8}{"sync":>10}{"async":>10}{"speedup":>9}')
+
+    loop = asyncio.new_event_loop()
+    for model in sorted(os.listdir(response_directory)):
+        names = [name for fixture, name in getters.items() if read_fixture(model, fixture) is not None]
+        if len(names) < 2:
+            continue
+
+        with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+            add_delayed_responses(rsps, model)
+            assert sync_sweep(model, names) == loop.run_until_complete(async_sweep(model, names))
+
+            sync_time = timed(sync_sweep, model, names)
+            async_time = timed(lambda: loop.run_until_complete(async_sweep(model, names)))
+
+        print(f'{model:<22}{len(names):>8}{sync_time * 1000:>8.1f}ms{async_time * 1000:>8.1f}ms'
+              f'{sync_time / async_time:>8.2f}x')
+
+
+if __name__ == '__main__':
+    main()
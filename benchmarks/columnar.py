@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Compare archiving polls as JSON lines with the columnar archive.
+
+Writes the system stats, volumes and SMART fixtures of tests/responses/ once
+per simulated poll in both formats, then reports their size and the time to
+scan one metric over every poll.
+"""
+# -*- coding:utf-8 -*-
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import qnapstats  # noqa: E402
+
+POLLS = int(os.environ.get('QNAP_BENCH_POLLS', '100000'))
+MODEL = os.environ.get('QNAP_BENCH_MODEL', 'TS-451-4.2.2')
+
+response_directory = os.path.join(os.path.dirname(__file__), '..', 'tests', 'responses')
+
+fixtures = {
+    'get_system_stats': 'systemstats.json',
+    'get_volumes': 'volumes.json',
+    'get_smart_disk_health': 'smartdiskhealth.json',
+}
+
+
+def load_results():
+    results = {}
+    for getter, fixture in fixtures.items():
+        path = os.path.join(response_directory, MODEL, fixture)
+        if os.path.exists(path):
+            with open(path) as f:
+                results[getter] = json.load(f)
+    return results
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    results = load_results()
+    directory = tempfile.mkdtemp()
+    try:
+        lines = os.path.join(directory, 'polls.jsonl')
+
+        def write_lines():
+            with open(lines, 'w') as f:
+                for poll in range(POLLS):
+                    f.write(json.dumps({'time': 1000.0 + poll, 'device': 'nas1', 'data': results}) + '\n')
+
+        def scan_lines():
+            with open(lines) as f:
+                return sum(json.loads(line)['data']['get_system_stats']['cpu']['usage_percent'] for line in f)
+
+        archive = os.path.join(directory, 'archive')
+
+        def write_archive():
+            with qnapstats.ColumnarWriter(archive) as writer:
+                for poll in range(POLLS):
+                    for getter, result in results.items():
+                        writer.add('nas1', getter, result, timestamp=1000.0 + poll)
+
+        def scan_archive():
+            reader = qnapstats.ColumnarReader(archive)
+            return sum(value for _, _, value in reader.scan('get_system_stats', 'cpu_usage_percent'))
+
+        _, lines_write = timed(write_lines)
+        lines_total, lines_scan = timed(scan_lines)
+        _, archive_write = timed(write_archive)
+        archive_total, archive_scan = timed(scan_archive)
+        assert abs(lines_total - archive_total) < 1e-6 * abs(lines_total or 1)
+
+        lines_size = os.path.getsize(lines)
+        archive_size = sum(os.path.getsize(os.path.join(archive, name)) for name in os.listdir(archive))
+
+        print(f'{POLLS} polls of {MODEL}')
+        print(f'{"":<12}{"size":>12}{"write":>10}{"scan":>10}')
+        print(f'{"JSON lines":<12}{lines_size / 1e6:>10.1f}MB{lines_write:>9.2f}s{lines_scan:>9.2f}s')
+        print(f'{"columnar":<12}{archive_size / 1e6:>10.1f}MB{archive_write:>9.2f}s{archive_scan:>9.2f}s')
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Compare the xmltodict and etree parser backends on the recorded responses.
+
+Each fixture is parsed the way its getter requests it (same force_list and
+pruning hints) and the mean time per parse is reported.
+"""
+# -*- coding:utf-8 -*-
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from qnapstats import parsers  # noqa: E402
+
+NUMBER = int(os.environ.get('QNAP_BENCH_NUMBER', '200'))
+
+response_directory = os.path.join(os.path.dirname(__file__), '..', 'tests', 'responses')
+
+# Fixture -> (force_list, keep) as passed by the corresponding getter
+fixtures = {
+    'systemstats.xml': ("DNS_LIST", ("func", "model", "firmware")),
+    'systemhealth.xml': (None, ("func",)),
+    'volumes.xml': (("volume", "volumeUse", "folder_element"), ("volumeList", "volumeUseList")),
+    'smartdiskhealth.xml': ("entry", ("Disk_Info",)),
+    'bandwidth.xml': ("item", ("bandwidth_info", "df_gateway")),
+    'firmwareupdate.xml': (None, ("func",)),
+}
+
+
+def main():
+    backend = parsers.etree_backend()[0].__name__
+    print(f'etree backend: {backend}, {NUMBER} parses per fixture')
+    print(f'{"fixture":<42}{"bytes":>8}{"xmltodict":>12}{"etree":>10}{"speedup":>9}')
+
+    for model in sorted(os.listdir(response_directory)):
+        for name, (force_list, keep) in fixtures.items():
+            path = os.path.join(response_directory, model, name)
+            if not os.path.exists(path):
+                continue
+
+            with open(path, 'rb') as f:
+                content = f.read()
+
+            reference = timeit.timeit(lambda: parsers.parse_xmltodict(content, force_list, keep), number=NUMBER)
+            candidate = timeit.timeit(lambda: parsers.parse_etree(content, force_list, keep), number=NUMBER)
+
+            print(f'{model + "/" + name:<42}{len(content):>8}{reference / NUMBER * 1e6:>10.0f}us'
+                  f'{candidate / NUMBER * 1e6:>8.0f}us{reference / candidate:>8.2f}x')
+
+
+if __name__ == '__main__':
+    main()
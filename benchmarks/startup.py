@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Measure how long a fresh interpreter takes to import qnapstats and to fetch a first result.
+
+Every scenario runs in a new process, as a serverless collector or cron job
+would, and the interpreter's own startup time is subtracted. The heavy
+modules each scenario ends up loading are listed as well.
+
+    python benchmarks/startup.py --output startup.json
+"""
+# -*- coding:utf-8 -*-
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from qnapstats.simulator import QTSSimulator  # noqa: E402
+
+root_directory = os.path.join(os.path.dirname(__file__), '..')
+fixture_directory = os.path.join(root_directory, 'tests', 'responses', 'TS-451-4.2.2')
+
+HEAVY_MODULES = ('requests', 'urllib3', 'xmltodict', 'asyncio', 'concurrent.futures', 'json')
+
+FETCH = ('qnap = qnapstats.QNAPStats("{host}", {port}, "admin", "x", parser="etree"{session})\n'
+         'assert qnap.get_system_stats() is not None')
+
+scenarios = {
+    'import': 'import qnapstats',
+    'construct': 'import qnapstats\nqnapstats.QNAPStats("nas", 8080, "admin", "x")',
+    'first_request': 'import qnapstats\n' + FETCH.format(host='{host}', port='{port}', session=''),
+    'first_request_lite': 'import qnapstats\n' + FETCH.format(
+        host='{host}', port='{port}', session=', session=qnapstats.LiteSession()'
+    ),
+}
+
+
+def run(code):
+    """Run code in a fresh interpreter; return the wall time and the heavy modules it loaded."""
+    report = f'\nimport sys\nprint(" ".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))'
+    env = dict(os.environ, PYTHONPATH=root_directory)
+    start = time.perf_counter()
+    output = subprocess.check_output([sys.executable, '-c', code + report], env=env)
+    return time.perf_counter() - start, output.decode().split()
+
+
+def bench_startup(rounds, host, port):
+    """Return the median time of each scenario above a bare interpreter, in seconds, and its heavy imports."""
+    baseline = statistics.median(run('pass')[0] for _ in range(rounds))
+
+    results = {}
+    for name, code in scenarios.items():
+        code = code.replace('{host}', host).replace('{port}', str(port))
+        samples = []
+        for _ in range(rounds):
+            elapsed, modules = run(code)
+            samples.append(elapsed)
+        results[name] = {'seconds': max(statistics.median(samples) - baseline, 0), 'modules': modules}
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the import and first-request cost of qnapstats.')
+    parser.add_argument('--output', help='file the JSON results are written to')
+    parser.add_argument('--rounds', type=int, default=10, help='processes started per scenario')
+    args = parser.parse_args()
+
+    simulator = QTSSimulator(fixture_directory).start()
+    try:
+        results = bench_startup(args.rounds, simulator.host, simulator.port)
+    finally:
+        simulator.stop()
+
+    for name, result in results.items():
+        print(f'{name:<20}{result["seconds"] * 1000:>8.1f}ms  {" ".join(result["modules"]) or "-"}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
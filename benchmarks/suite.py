@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""Benchmark the client's hot paths against simulated devices and write the results as JSON.
+
+For every model in tests/responses/ this measures the login cost, the latency,
+network and parse time of each getter and the memory it allocates, the
+throughput of a QNAPFleet polling many simulated devices and the startup cost
+of a fresh process (see startup.py). Pass ``--compare``
+with an earlier results file to see the relative change of every metric.
+
+    python benchmarks/suite.py --output before.json
+    python benchmarks/suite.py --output after.json --compare before.json
+"""
+# -*- coding:utf-8 -*-
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import qnapstats  # noqa: E402
+from qnapstats.parsers import PARSERS  # noqa: E402
+from qnapstats.simulator import QTSSimulator, start_simulators  # noqa: E402
+from startup import bench_startup  # noqa: E402
+
+response_directory = os.path.join(os.path.dirname(__file__), '..', 'tests', 'responses')
+
+# Getter -> fixture it needs
+getters = {
+    'get_system_stats': 'systemstats.xml',
+    'get_volumes': 'volumes.xml',
+    'get_smart_disk_health': 'smartdiskhealth.xml',
+    'get_bandwidth': 'bandwidth.xml',
+}
+
+# Metrics where a larger value is an improvement, used by --compare
+higher_is_better = ('devices_per_second', 'requests_per_second')
+
+
+def client(simulator, parser):
+    qnap = qnapstats.QNAPStats(simulator.host, simulator.port, 'admin', 'correcthorsebatterystaple', parser=parser)
+    return qnap, qnap.enable_request_stats()
+
+
+def summary(samples):
+    return {
+        'mean': statistics.mean(samples),
+        'median': statistics.median(samples),
+        'min': min(samples),
+        'max': max(samples),
+    }
+
+
+def bench_login(simulator, parser, rounds):
+    """Time a fresh client's login, which is the POST (and any GET fallback) to authLogin.cgi."""
+    samples = []
+    for _ in range(rounds):
+        qnap, stats = client(simulator, parser)
+        # The first getter call logs in; only the authLogin.cgi requests are counted
+        qnap.get_system_stats()
+        login = stats.endpoints().get('authLogin.cgi')
+        if login is None:
+            return None
+        samples.append(login['network_time'] + login['parse_time'])
+
+    return summary(samples)
+
+
+def bench_getter(simulator, parser, name, rounds):
+    """Time repeated calls of one getter on a logged-in client and trace the memory of one call."""
+    qnap, stats = client(simulator, parser)
+    getter = getattr(qnap, name)
+    if getter() is None:
+        return None
+    stats.reset()
+
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        getter()
+        samples.append(time.perf_counter() - start)
+    totals = stats.totals()
+
+    tracemalloc.start()
+    try:
+        getter()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'latency': summary(samples),
+        'network_time': totals['network_time'] / totals['requests'],
+        'parse_time': totals['parse_time'] / totals['requests'],
+        'bytes': totals['bytes'] // totals['requests'],
+        'peak_memory': peak,
+        'retained_memory': retained,
+    }
+
+
+def bench_model(model, parser, rounds):
+    fixture_dir = os.path.join(response_directory, model)
+    simulator = QTSSimulator(fixture_dir).start()
+    try:
+        result = {'login': bench_login(simulator, parser, rounds), 'getters': {}}
+        for name, fixture in getters.items():
+            if os.path.exists(os.path.join(fixture_dir, fixture)):
+                result['getters'][name] = bench_getter(simulator, parser, name, rounds)
+    finally:
+        simulator.stop()
+
+    return result
+
+
+def bench_fleet(model, parser, devices, workers, latency):
+    """Poll ``devices`` simulated NAS once to log in, then time a second, steady-state sweep."""
+    simulators = start_simulators(os.path.join(response_directory, model), devices, latency=latency)
+    try:
+        fleet = qnapstats.QNAPFleet(
+            [{'host': s.host, 'port': s.port, 'username': 'admin', 'password': 'secret', 'parser': parser}
+             for s in simulators],
+            max_workers=workers
+        )
+        fleet.poll_all()
+
+        before = sum(s.requests for s in simulators)
+        start = time.perf_counter()
+        results = fleet.poll_all()
+        elapsed = time.perf_counter() - start
+        requests = sum(s.requests for s in simulators) - before
+    finally:
+        for simulator in simulators:
+            simulator.stop()
+
+    return {
+        'model': model,
+        'devices': devices,
+        'workers': workers,
+        'latency': latency,
+        'errors': sum(result.error is not None for result in results.values()),
+        'seconds': elapsed,
+        'devices_per_second': devices / elapsed,
+        'requests_per_second': requests / elapsed,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(data, prefix=''):
+    """Flatten nested results into {'models.TS-451.getters.get_volumes.parse_time': value, ...}."""
+    values = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[prefix + key] = value
+    return values
+
+
+def compare(baseline, current, threshold):
+    """Print every metric that moved by more than ``threshold`` and return the number of regressions."""
+    sections = [section for section in ('models', 'fleet', 'startup') if section in baseline]
+    old = flatten({section: baseline[section] for section in sections})
+    new = flatten({section: current[section] for section in sections})
+
+    regressions = 0
+    print(f'\nChanges against {baseline["meta"]["revision"]} (threshold {threshold:.0%}):')
+    for key in sorted(set(old) & set(new)):
+        # Extremes are too noisy to compare, and only the fleet's rates are measurements
+        if key.endswith(('.min', '.max')) or (key.startswith('fleet.') and not key.endswith(higher_is_better)):
+            continue
+        if not old[key]:
+            continue
+
+        change = new[key] / old[key] - 1
+        if abs(change) < threshold:
+            continue
+
+        worse = change < 0 if key.endswith(higher_is_better) else change > 0
+        regressions += worse
+        print(f'  {"REGRESSION" if worse else "improved  "} {key}: {old[key]:.6g} -> {new[key]:.6g} ({change:+.0%})')
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark QNAPStats against simulated devices.')
+    parser.add_argument('--output', default='benchmark.json', help='file the JSON results are written to')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative change reported by --compare')
+    parser.add_argument('--parser', default='xmltodict', choices=sorted(PARSERS))
+    parser.add_argument('--rounds', type=int, default=20, help='calls per measurement')
+    parser.add_argument('--models', nargs='*', help='models to benchmark (all by default)')
+    parser.add_argument('--fleet-model', default='TS-451-4.2.2')
+    parser.add_argument('--fleet-devices', type=int, default=50)
+    parser.add_argument('--fleet-workers', type=int, default=16)
+    parser.add_argument('--fleet-latency', type=float, default=0.01, help='seconds added to every request')
+    parser.add_argument('--startup-rounds', type=int, default=5, help='processes started per startup scenario')
+    args = parser.parse_args()
+
+    results = {
+        'meta': {
+            'revision': git_revision(),
+            'date': datetime.datetime.utcnow().isoformat() + 'Z',
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'parser': args.parser,
+            'rounds': args.rounds,
+        },
+        'models': {},
+    }
+
+    for model in args.models or sorted(os.listdir(response_directory)):
+        results['models'][model] = result = bench_model(model, args.parser, args.rounds)
+        login = result['login']
+        print(f'{model}: login {login["median"] * 1000:.2f}ms' if login else f'{model}: login unavailable')
+        for name, getter in result['getters'].items():
+            if getter is None:
+                print(f'  {name:<24} failed')
+                continue
+            print(f'  {name:<24}{getter["latency"]["median"] * 1000:>8.2f}ms{getter["parse_time"] * 1000:>8.2f}ms parse'
+                  f'{getter["peak_memory"] / 1024:>9.1f}KiB peak')
+
+    results['fleet'] = fleet = bench_fleet(
+        args.fleet_model, args.parser, args.fleet_devices, args.fleet_workers, args.fleet_latency
+    )
+    print(f'fleet: {fleet["devices"]} devices in {fleet["seconds"]:.2f}s, '
+          f'{fleet["requests_per_second"]:.0f} requests/s, {fleet["errors"]} errors')
+
+    simulator = QTSSimulator(os.path.join(response_directory, args.fleet_model)).start()
+    try:
+        results['startup'] = bench_startup(args.startup_rounds, simulator.host, simulator.port)
+    finally:
+        simulator.stop()
+    for name, startup in results['startup'].items():
+        print(f'startup {name}: {startup["seconds"] * 1000:.1f}ms')
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f'Results written to {args.output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(baseline, results, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
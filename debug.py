@@ -41,7 +41,7 @@ except Exception as e:
     traceback.print_exc()
 
 try:
-    qnap.get_external_drive()
+    qnap.list_external_drive()
 except Exception as e:
     print(e.args)
     traceback.print_exc()
@@ -1,2 +1,47 @@
 """Main module for QNAPStats."""
-from .qnap_stats import QNAPStats  # noqa: F401
+import importlib
+
+# Public name -> module defining it; modules are imported when a name is first used
+_EXPORTS = {
+    "QNAPStats": "qnap_stats", "AsyncQNAPStats": "async_qnap_stats", "Snapshot": "qnap_stats",
+    "SnapshotSection": "qnap_stats", "Listing": "qnap_stats",
+    "ResponseCache": "cache",
+    "RequestCoalescer": "coalesce",
+    "MemorySessionStore": "session_store", "FileSessionStore": "session_store",
+    "RequestMetrics": "metrics", "RequestStats": "metrics",
+    "RingBuffer": "sampler", "Sampler": "sampler",
+    "Delta": "delta", "DeltaTracker": "delta",
+    "create_session": "transport",
+    "LiteSession": "lite",
+    "Capabilities": "capabilities",
+    "ColumnarWriter": "columnar", "ColumnarReader": "columnar",
+    "ExternalDeviceWatcher": "external", "ExternalDeviceEvent": "external",
+    "RetryPolicy": "retry", "CircuitBreaker": "retry", "Failure": "retry", "RequestFailed": "retry",
+    "TransportError": "retry",
+    "SystemStats": "results", "Nic": "results", "SysFan": "results", "Volume": "results", "Folder": "results",
+    "Disk": "results", "BandwidthInterface": "results",
+    "SmartCollector": "smart",
+    "QNAPFleet": "fleet", "DeviceResult": "fleet", "DeviceTimeout": "fleet",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    """Import the module defining a public name, or a submodule such as ``parsers``, on first access."""
+    if name not in _EXPORTS:
+        try:
+            return importlib.import_module(f".{name}", __name__)
+        except ModuleNotFoundError as e:
+            if e.name != f"{__name__}.{name}":
+                raise
+            raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    """List the public names along with the module's own attributes."""
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,190 @@
+"""Module containing the asyncio variant of QNAPStats."""
+# -*- coding:utf-8 -*-
+import asyncio
+
+from .qnap_stats import SNAPSHOT_SECTIONS, Listing, QNAPStats, Snapshot
+from .results import external_devices
+from .retry import SESSION_REJECTED, exception_failure
+
+
+# pylint: disable=invalid-overridden-method
+class AsyncQNAPStats(QNAPStats):
+    """Asyncio variant of QNAPStats whose getters are coroutines.
+
+    Blocking HTTP calls run in an executor so several endpoints of the same
+    NAS can be fetched at once, e.g. with ``asyncio.gather``.
+    """
+
+    def __init__(self, *args, executor=None, **kwargs):
+        """Instantiate a new async qnap_stats object."""
+        super().__init__(*args, **kwargs)
+
+        self._executor = executor
+        self._login_lock = None  # type: asyncio.Lock
+
+    async def _run(self, func, *args, **kwargs):
+        """Run a blocking function in the executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: func(*args, **kwargs))
+
+    async def _init_session(self):
+        if self._session_valid():
+            return None
+
+        # Only one coroutine may log in; the others wait and reuse its SID
+        if self._login_lock is None:
+            self._login_lock = asyncio.Lock()
+
+        async with self._login_lock:
+            return await self._run(super()._init_session)
+
+    async def get_delta(self, getter, **kwargs):
+        """Call a getter by name and return a Delta against its previous result."""
+        if self._delta_tracker is None:
+            self.enable_delta()
+
+        result = await getattr(self, getter)(**kwargs)
+        if result is None:
+            return None
+
+        return self._delta_tracker.update(getter, result)
+
+    async def _get_url(self, url, retry_on_error=True, use_cache=True, **kwargs):
+        """High-level function for making GET requests, retried according to the retry policy."""
+        cached = self._cached(url, use_cache, kwargs)
+        if cached is not None:
+            return cached
+
+        return await self._coalesce(url, kwargs, lambda: self._fetch_url(url, retry_on_error, **kwargs))
+
+    async def _coalesce(self, url, kwargs, fetch):
+        """Await ``fetch()``, sharing it with identical requests in flight when a RequestCoalescer is set."""
+        if self._coalescer is None:
+            return await fetch()
+
+        return await self._coalescer.call_async(self._coalesce_key(url, kwargs), fetch)
+
+    async def _fetch_url(self, url, retry_on_error, **kwargs):
+        """Make a GET request, retried according to the retry policy, and record its outcome."""
+        if not self._circuit_allows():
+            return None
+
+        result, failure = await self._attempt_get_url(url, False, **kwargs)
+        for retry in range(1, self._retry_policy.attempts if retry_on_error else 1):
+            if failure is None or not failure.retryable:
+                break
+
+            await asyncio.sleep(self._retry_delay(retry, failure))
+            result, failure = await self._attempt_get_url(url, True, **kwargs)
+
+        return self._finish_get_url(url, result, failure, kwargs.get("force_list"))
+
+    async def _attempt_get_url(self, url, retry, **kwargs):
+        """Log in if needed and make one GET request; returns the result and a Failure or None."""
+        try:
+            failure = await self._init_session()
+            if failure is not None:
+                return None, failure
+
+            # The failure is recorded per thread, so it is read in the executor thread that made the request
+            return await self._run(self._request_get_url, url, retry, **kwargs)
+        except Exception as e:  # pylint: disable=broad-except
+            # Also a malformed body, so that it is reported to the circuit breaker like any failed request
+            return None, exception_failure(e)
+
+    async def _post_url(self, url, data, **kwargs):
+        """High-level function for making POST requests, logging in again once if the SID was rejected."""
+        for retry in (False, True):
+            if await self._init_session() is not None:
+                return None
+
+            result, failure = await self._run(self._request_post_url, url, data, retry, **kwargs)
+            if failure is not SESSION_REJECTED:
+                return result
+
+        return None
+
+    async def _run_steps(self, steps, use_cache=True):
+        """Drive a getter's steps, awaiting each CGIRequest they yield."""
+        try:
+            request = next(steps)
+            while True:
+                request = steps.send(await self._request(request, use_cache))
+        except StopIteration as stop:
+            return stop.value
+
+    async def get_system_health(self, use_cache=True):
+        """Obtain the system's overall health."""
+        return await self._run_steps(self._system_health_steps(), use_cache)
+
+    async def get_volumes(self, use_cache=True):
+        """Obtain information about volumes and shared directories."""
+        return await self._run_steps(self._volumes_steps(), use_cache)
+
+    async def get_smart_disk_health(self, use_cache=True):
+        """Obtain SMART information about each disk."""
+        return await self._run_steps(self._smart_disk_health_steps(), use_cache)
+
+    async def get_smart_disk_attributes(self, drive_number, use_cache=True):
+        """Obtain the SMART attribute table of one disk, keyed by attribute id."""
+        return await self._run_steps(self._smart_disk_attributes_steps(drive_number), use_cache)
+
+    async def get_system_stats(self, use_cache=True):
+        """Obtain core system information and resource utilization."""
+        return await self._run_steps(self._system_stats_steps(), use_cache)
+
+    async def get_bandwidth(self, use_cache=True):
+        """Obtain the current bandwidth usage speeds."""
+        return await self._run_steps(self._bandwidth_steps(), use_cache)
+
+    async def get_firmware_update(self, use_cache=True):
+        """Get firmware update version if available."""
+        return await self._run_steps(self._firmware_update_steps(), use_cache)
+
+    async def iter_volumes(self, chunk_size=16384):
+        """Stream volumes and shared folders, as an async generator of the tuples yielded by the sync client.
+
+        The response is read and parsed in the executor, one event at a time.
+        """
+        events = self._stream_volumes(chunk_size, super()._init_session)
+        try:
+            while True:
+                event = await self._run(next, events, None)
+                if event is None:
+                    return
+                yield event
+        finally:
+            try:
+                events.close()
+            except ValueError:
+                # Cancelled while the executor reads the response; the generator closes it when collected
+                pass
+
+    async def list_external_drive(self):
+        """List External drive connected on qnap."""
+        return self._listed(await self.get_external_drive_listing())
+
+    async def get_external_drive_listing(self):
+        """Return the external drives as a Listing, or None if the request failed."""
+        resp = await self._post_url("devices/devRequest.cgi", {"func": "getExternalDev"}, digest=True)
+        return None if resp is None else Listing(resp.digest, external_devices(resp.data))
+
+    async def get_storage_information_on_external_device(self):
+        """Get informations on volumes in External drive connected on qnap."""
+        return self._listed(await self.get_external_storage_listing())
+
+    async def get_external_storage_listing(self):
+        """Return the volumes of external drives as a Listing, or None if the request failed."""
+        resp = await self._post_url("disk/disk_manage.cgi", {"func": "external_get_all"}, digest=True)
+        return None if resp is None else Listing(resp.digest, resp.data.get("Disk_Vol"))
+
+    async def get_snapshot(self, sections=SNAPSHOT_SECTIONS, use_cache=True):
+        """Fetch several metric sections concurrently and return them as a Snapshot."""
+        await self._init_session()
+
+        result = {}
+        tasks = self._snapshot_tasks(sections)
+        for sections_done in await asyncio.gather(*(self._run_steps(steps, use_cache) for steps in tasks)):
+            result.update(sections_done)
+
+        return Snapshot(**result)
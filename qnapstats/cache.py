@@ -0,0 +1,113 @@
+"""Module containing an in-memory TTL cache for parsed CGI responses."""
+# -*- coding:utf-8 -*-
+import collections
+import threading
+import time
+
+# Seconds each endpoint stays fresh, matched by the longest URL prefix
+DEFAULT_TTLS = {
+    "sys/sysRequest.cgi?subfunc=firm_update": 3600,
+    "disk/qsmart.cgi": 3600,
+    "management/chartReq.cgi?chart_func=disk_usage": 3600,
+}
+
+CGI_ROOT = "/cgi-bin/"
+
+
+def cgi_path(url):
+    """Return the CGI path of a full URL, e.g. ``disk/qsmart.cgi?func=all_hd_data``; other URLs are returned as is."""
+    index = url.find(CGI_ROOT)
+    return url if index < 0 else url[index + len(CGI_ROOT):]
+
+
+# pylint: disable=too-many-instance-attributes
+class ResponseCache:
+    """Bounded LRU cache of parsed responses with per-endpoint TTLs."""
+
+    def __init__(self, ttls=None, default_ttl=0, max_size=128):
+        """Instantiate a new cache.
+
+        ``ttls`` maps CGI URL prefixes to a TTL in seconds (DEFAULT_TTLS when
+        omitted). URLs matching no prefix use ``default_ttl``; a TTL of 0
+        disables caching for them. Entries are keyed by full URL, so the
+        cache may be shared by clients of different devices.
+        """
+        self._ttls = sorted((DEFAULT_TTLS if ttls is None else ttls).items(), key=lambda item: -len(item[0]))
+        self._default_ttl = default_ttl
+        self._max_size = max_size
+
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def ttl(self, url):
+        """Return the TTL in seconds that applies to the given URL, matched by its CGI path."""
+        url = cgi_path(url)
+        for prefix, ttl in self._ttls:
+            if url.startswith(prefix):
+                return ttl
+
+        return self._default_ttl
+
+    def get(self, url, force_list=None):
+        """Return the cached response for the full URL, or None if missing or stale."""
+        if self.ttl(url) <= 0:
+            return None
+
+        key = (url, force_list)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, url, force_list, data):
+        """Store a response if its endpoint has a non-zero TTL."""
+        ttl = self.ttl(url)
+        if ttl <= 0:
+            return
+
+        key = (url, force_list)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, data)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, url=None):
+        """Drop the entries for a URL (any force_list), or everything if no URL is given.
+
+        A full URL drops the entries of one device, a CGI path those of every device.
+        """
+        with self._lock:
+            if url is None:
+                self._entries.clear()
+                return
+
+            for key in [key for key in self._entries if url in (key[0], cgi_path(key[0]))]:
+                del self._entries[key]
+
+    def stats(self):
+        """Return the hit/miss/eviction counters and current size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+            }
+
+    def __len__(self):
+        """Return the number of cached entries, stale ones included."""
+        return len(self._entries)
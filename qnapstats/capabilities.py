@@ -0,0 +1,60 @@
+"""Module containing the per-device cache of which endpoint variants a NAS supports."""
+# -*- coding:utf-8 -*-
+import threading
+
+
+class Capabilities:
+    """Remember which endpoint variants a NAS supports, until its firmware changes.
+
+    Getters that have to try one request and fall back to another record what
+    worked here, so later calls go straight to the right variant. Known names
+    are "login" ("post" or "get"), "bandwidth" (the chart_func that returns
+    bandwidth_info) and "combined_sysinfo" (whether one sysinfo request returns
+    both stats and health). Pass the same instance to the clients of one device
+    to share what was learned.
+    """
+
+    def __init__(self):
+        """Instantiate an empty cache."""
+        self._values = {}
+        self._firmware = None
+        self._lock = threading.Lock()
+
+    @property
+    def firmware(self):
+        """The firmware the cached capabilities were learned on, or None if not seen yet."""
+        with self._lock:
+            return self._firmware
+
+    def get(self, name):
+        """Return a learned capability, or None if it has not been probed yet."""
+        with self._lock:
+            return self._values.get(name)
+
+    def set(self, name, value):
+        """Record a capability."""
+        with self._lock:
+            self._values[name] = value
+
+    def firmware_seen(self, firmware):
+        """Note the firmware reported by the NAS, forgetting all capabilities if it changed.
+
+        Returns whether the capabilities were invalidated.
+        """
+        with self._lock:
+            changed = self._firmware is not None and firmware != self._firmware
+            if changed:
+                self._values.clear()
+            self._firmware = firmware
+            return changed
+
+    def clear(self):
+        """Forget all capabilities, so they are probed again."""
+        with self._lock:
+            self._values.clear()
+            self._firmware = None
+
+    def as_dict(self):
+        """Return the learned capabilities as a dict."""
+        with self._lock:
+            return dict(self._values)
@@ -0,0 +1,186 @@
+"""Command-line collector polling the devices of a config file once or on a schedule.
+
+    qnapstats devices.json --once
+    qnapstats devices.json --format prometheus --listen 0.0.0.0:9942
+    qnapstats devices.json --format columnar --output /var/lib/qnapstats/archive
+
+The config file is JSON::
+
+    {
+        "interval": 60,
+        "getters": ["get_system_stats", "get_volumes"],
+        "devices": [
+            {"name": "nas1", "host": "192.168.1.3", "port": 8080, "username": "admin", "password": "secret"}
+        ]
+    }
+
+Each device takes the QNAPStats constructor arguments; ``max_workers`` and
+``host_timeout`` are passed to QNAPFleet.
+"""
+# -*- coding:utf-8 -*-
+import argparse
+import concurrent.futures
+import json
+import signal
+import sys
+import threading
+import time
+
+from .columnar import ColumnarWriter
+from .fleet import DEFAULT_GETTERS, QNAPFleet
+from .sinks import InfluxSink, JsonLinesSink, PrometheusSink
+from .transport import create_session
+
+FORMATS = ("json", "influx", "prometheus", "columnar")
+
+
+def load_config(path):
+    """Read a collector config file, filling in the defaults."""
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+
+    if not config.get("devices"):
+        raise ValueError(f"{path} lists no devices")
+
+    config.setdefault("interval", 60)
+    config.setdefault("getters", list(DEFAULT_GETTERS))
+    config.setdefault("max_workers", 8)
+    config.setdefault("host_timeout", 30)
+    return config
+
+
+def build_fleet(config):
+    """Build the QNAPFleet described by a config, its devices sharing one connection pool."""
+    session = create_session(pool_connections=len(config["devices"]))
+    return QNAPFleet(
+        config["devices"], getters=config["getters"], max_workers=config["max_workers"],
+        host_timeout=config["host_timeout"], session=session
+    )
+
+
+class PollScheduler:
+    """Poll every device of a fleet every ``interval`` seconds and pass the results to a sink.
+
+    Devices are polled on their own schedule, their start times spread evenly
+    over the interval so requests don't all go out at once. A device whose
+    previous poll is still running when it is due again is skipped for that
+    round and counted in ``skipped``.
+    """
+
+    def __init__(self, fleet, sink, interval, max_workers=8):
+        """Instantiate a scheduler; call run() to start polling."""
+        self._fleet = fleet
+        self._sink = sink
+        self._interval = interval
+        self._max_workers = max_workers
+        self._stop = threading.Event()
+
+        self.skipped = {name: 0 for name in fleet.names}
+
+    def run(self):
+        """Poll until stop() is called."""
+        names = self._fleet.names
+        start = time.monotonic()
+        due = {name: start + self._interval * i / len(names) for i, name in enumerate(names)}
+        running = {}
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._max_workers)
+        try:
+            while not self._stop.is_set():
+                name = min(due, key=due.get)
+                wait = due[name] - time.monotonic()
+                if wait > 0:
+                    self._stop.wait(wait)
+                    continue
+
+                # A late round is not made up for, so a stall doesn't cause a burst of polls
+                due[name] = max(due[name] + self._interval, time.monotonic())
+
+                future = running.get(name)
+                if future is not None and not future.done():
+                    self.skipped[name] += 1
+                    print(f"qnapstats: skipping {name}, its previous poll is still running", file=sys.stderr)
+                    continue
+
+                running[name] = executor.submit(self._poll, name)
+        finally:
+            # Don't block on hung devices; their threads finish in the background
+            executor.shutdown(wait=False)
+
+    def _poll(self, name):
+        result = self._fleet.poll_device(name)
+        try:
+            self._sink.write(result)
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"qnapstats: writing the result of {name} failed: {e!r}", file=sys.stderr)
+
+    def stop(self):
+        """Make run() return."""
+        self._stop.set()
+
+
+def build_sink(args, stream):
+    """Build the sink selected on the command line, writing to ``stream`` unless it serves Prometheus or archives."""
+    if args.format == "prometheus":
+        host, _, port = args.listen.rpartition(":")
+        return PrometheusSink(host or "0.0.0.0", int(port))
+    if args.format == "columnar":
+        return ColumnarWriter(args.output)
+
+    return InfluxSink(stream) if args.format == "influx" else JsonLinesSink(stream)
+
+
+def main(argv=None):
+    """Run the collector."""
+    parser = argparse.ArgumentParser(prog="qnapstats", description="Collect QNAP NAS stats from many devices.")
+    parser.add_argument("config", help="JSON file listing the devices and what to collect")
+    parser.add_argument("--once", action="store_true", help="poll every device once and exit")
+    parser.add_argument("--interval", type=float, help="seconds between polls of a device (overrides the config)")
+    parser.add_argument("--format", choices=FORMATS, default="json",
+                        help="JSON lines, InfluxDB line protocol, a Prometheus /metrics endpoint or a columnar archive")
+    parser.add_argument("--output", default="-",
+                        help="file JSON lines or line protocol are appended to, or directory of the columnar archive")
+    parser.add_argument("--listen", default="0.0.0.0:9942", help="address the Prometheus endpoint listens on")
+    args = parser.parse_args(argv)
+
+    if args.once and args.format == "prometheus":
+        parser.error("--once cannot be used with the prometheus format")
+    if args.format == "columnar" and args.output == "-":
+        parser.error("the columnar format needs an --output directory")
+
+    try:
+        config = load_config(args.config)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if args.interval is not None:
+        config["interval"] = args.interval
+
+    fleet = build_fleet(config)
+    # pylint: disable=consider-using-with
+    stream = sys.stdout if args.output == "-" or args.format == "columnar" else open(
+        args.output, "a", encoding="utf-8"
+    )
+    sink = build_sink(args, stream)
+    try:
+        if args.once:
+            failed = False
+            for result in fleet.poll():
+                sink.write(result)
+                failed = failed or result.error is not None
+            return 1 if failed else 0
+
+        scheduler = PollScheduler(fleet, sink, config["interval"], config["max_workers"])
+        signal.signal(signal.SIGTERM, lambda signum, frame: scheduler.stop())
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            pass
+        return 0
+    finally:
+        sink.close()
+        if stream is not sys.stdout:
+            stream.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""Module for sharing one request between concurrent callers of the same endpoint."""
+# -*- coding:utf-8 -*-
+import threading
+
+from .lazy import LazyModule
+
+asyncio = LazyModule("asyncio")
+
+
+class _Call:  # pylint: disable=too-few-public-methods
+    """A request in flight in one thread, waited for by the others."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        """Block until the request is done and return its result, or raise its exception."""
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class RequestCoalescer:
+    """Let concurrent identical requests share a single CGI call and parsed result.
+
+    The first caller of a key makes the request; callers arriving while it is
+    in flight wait for it and receive the same result, or the same exception.
+    Threads and coroutines are coalesced separately, coroutines only with
+    others on the same event loop.
+    """
+
+    def __init__(self):
+        """Instantiate a new coalescer; it may be shared by clients of different devices."""
+        self._calls = {}
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.coalesced = 0
+
+    def _join(self, key, create):
+        """Return the call in flight for ``key`` and False, or a new one made by ``create`` and True."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                return call, False
+
+            call = self._calls[key] = create()
+            self.requests += 1
+            return call, True
+
+    def _leave(self, key):
+        with self._lock:
+            del self._calls[key]
+
+    def call(self, key, func):
+        """Return ``func()``, or the result of the call for ``key`` already in flight in another thread."""
+        call, leader = self._join(key, _Call)
+        if not leader:
+            return call.wait()
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._leave(key)
+            call.done.set()
+
+        return call.result
+
+    async def call_async(self, key, func):
+        """Await ``func()``, or the call for ``key`` already in flight on the running event loop."""
+        loop = asyncio.get_running_loop()
+        key = (loop, key)
+        task, leader = self._join(key, lambda: loop.create_task(func()))
+        if leader:
+            task.add_done_callback(lambda done: self._leave_async(key, done))
+
+        # The request runs in a task of its own: a cancelled caller, even the first one, only stops waiting
+        return await asyncio.shield(task)
+
+    def _leave_async(self, key, task):
+        self._leave(key)
+        # Mark the exception as retrieved even when every caller stopped waiting
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        """Return the number of requests made, of calls that shared one, and of requests in flight."""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }
@@ -0,0 +1,265 @@
+"""Module containing a compact columnar archive of polled metrics, for long-term storage.
+
+Getter results are flattened into series by sinks.samples(): one series per
+device, getter, field and labels (volume, drive, NIC...). Every series is
+stored as two typed column files appended in batches, its timestamps
+(float64 epoch seconds) and its values (int64 or float64), described by
+``schema.json``::
+
+    archive/
+        schema.json
+        000001.ts  000001.val
+        000002.ts  000002.val
+        ...
+
+A ColumnarReader maps the column files into memory, so a metric can be scanned
+over millions of samples without reading the rest of the archive, or handed
+to numpy with ``numpy.frombuffer``.
+"""
+# -*- coding:utf-8 -*-
+import array
+import bisect
+import contextlib
+import json
+import mmap
+import os
+import sys
+import threading
+import time
+
+from .sinks import samples
+
+SCHEMA_FILE = "schema.json"
+SCHEMA_VERSION = 1
+
+# array typecodes of the columns, all 8 bytes wide
+TIMESTAMP_TYPE = "d"
+INT_TYPE = "q"
+FLOAT_TYPE = "d"
+
+
+def _series_key(device, getter, field, labels):
+    return device, getter, field, tuple(sorted(labels.items()))
+
+
+# pylint: disable=too-many-instance-attributes
+class ColumnarWriter:
+    """Append poll results to a columnar archive directory, in batches of ``batch_size`` samples.
+
+    Usable as a sink of the command-line collector: write() takes a
+    DeviceResult. Call close() (or use it as a context manager) to write the
+    last batch.
+    """
+
+    def __init__(self, path, batch_size=10000):
+        """Open the archive at ``path``, creating it if needed."""
+        self._path = path
+        self._batch_size = batch_size
+        self._lock = threading.Lock()
+
+        os.makedirs(path, exist_ok=True)
+        self._series = _load_schema(path)
+        self._ids = {
+            _series_key(series["device"], series["getter"], series["field"], series["labels"]): series
+            for series in self._series
+        }
+        self._schema_changed = False
+
+        # Drop what an interrupted batch left past the last whole timestamp, so appended values line up again
+        for series in self._series:
+            _truncate_columns(path, series["id"])
+
+        # Series id -> (timestamps, values) not written yet
+        self._batch = {}
+        self._pending = 0
+
+    def add(self, device, getter, result, timestamp=None):
+        """Add the numeric values of one getter result (a dict) of a device, sampled at ``timestamp``."""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            for field, labels, value in samples(getter, result):
+                series = self._ids.get(_series_key(device, getter, field, labels))
+                if series is None:
+                    series = self._new_series(device, getter, field, labels, value)
+
+                columns = self._batch.get(series["id"])
+                if columns is None:
+                    columns = self._batch[series["id"]] = (array.array(TIMESTAMP_TYPE), array.array(series["type"]))
+                columns[0].append(timestamp)
+                # A series keeps the type of its first value
+                columns[1].append(int(value) if series["type"] == INT_TYPE else float(value))
+                self._pending += 1
+
+            if self._pending >= self._batch_size:
+                self._flush()
+
+    def write(self, result):
+        """Add every getter result of a DeviceResult."""
+        timestamp = time.time()
+        for getter, data in result.data.items():
+            if data is not None:
+                self.add(result.name, getter, data, timestamp)
+
+    def _new_series(self, device, getter, field, labels, value):
+        series = {
+            "id": len(self._series) + 1, "device": device, "getter": getter, "field": field,
+            "labels": dict(labels), "type": INT_TYPE if isinstance(value, int) else FLOAT_TYPE,
+        }
+        self._series.append(series)
+        self._ids[_series_key(device, getter, field, labels)] = series
+        self._schema_changed = True
+        return series
+
+    def flush(self):
+        """Write the samples added so far to the column files."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        # The schema is written first, so every column file on disk is described by it
+        if self._schema_changed:
+            _save_schema(self._path, self._series)
+            self._schema_changed = False
+
+        for series_id, (timestamps, values) in self._batch.items():
+            with open(_column_path(self._path, series_id, "val"), "ab") as f:
+                values.tofile(f)
+            # Timestamps go last: a sample only counts once both columns hold it
+            with open(_column_path(self._path, series_id, "ts"), "ab") as f:
+                timestamps.tofile(f)
+
+        self._batch = {}
+        self._pending = 0
+
+    def close(self):
+        """Write the samples not written yet."""
+        self.flush()
+
+    def __enter__(self):
+        """Return the writer."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Close the writer."""
+        self.close()
+
+
+class ColumnarReader:
+    """Read a columnar archive written by a ColumnarWriter, through memory-mapped column files."""
+
+    def __init__(self, path):
+        """Open the archive at ``path``; series added to it later are not seen."""
+        self._path = path
+        self._series = _load_schema(path)
+
+    def series(self, getter=None, field=None, device=None, **labels):
+        """Return the series matching the given getter, field, device and labels, with their sample counts."""
+        found = []
+        for series in self._series:
+            if getter is not None and series["getter"] != getter:
+                continue
+            if field is not None and series["field"] != field:
+                continue
+            if device is not None and series["device"] != device:
+                continue
+            if any(series["labels"].get(key) != value for key, value in labels.items()):
+                continue
+
+            found.append(dict(series, labels=dict(series["labels"]), count=_column_size(self._path, series["id"]) // 8))
+
+        return found
+
+    @contextlib.contextmanager
+    def columns(self, series):
+        """Map the timestamps and values of a series, as typed memoryviews only valid inside the block."""
+        with contextlib.ExitStack() as stack:
+            timestamps = stack.enter_context(self._map(series["id"], "ts", TIMESTAMP_TYPE))
+            values = stack.enter_context(self._map(series["id"], "val", series["type"]))
+            # The timestamps of a batch are written last, so they never outnumber the values
+            values = values[:len(timestamps)]
+            try:
+                yield timestamps, values
+            finally:
+                values.release()
+
+    @contextlib.contextmanager
+    def _map(self, series_id, column, typecode):
+        try:
+            f = open(_column_path(self._path, series_id, column), "rb")  # pylint: disable=consider-using-with
+        except FileNotFoundError:
+            # The series' first batch is not written yet
+            yield memoryview(b"").cast(typecode)
+            return
+
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            # An interrupted write may have left a partial value at the end
+            size -= size % 8
+            if size == 0:
+                yield memoryview(b"").cast(typecode)
+                return
+
+            with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped).cast(typecode)
+                try:
+                    yield view
+                finally:
+                    view.release()
+
+    def scan(self, getter, field, device=None, start=None, end=None, **labels):
+        """Yield ``(series, timestamp, value)`` for the samples of a metric between ``start`` and ``end``.
+
+        Samples are found by bisecting the timestamps of each series, which
+        are in the order they were added.
+        """
+        for series in self.series(getter, field, device, **labels):
+            with self.columns(series) as (timestamps, values):
+                first = 0 if start is None else bisect.bisect_left(timestamps, start)
+                last = len(timestamps) if end is None else bisect.bisect_right(timestamps, end)
+                for index in range(first, last):
+                    yield series, timestamps[index], values[index]
+
+
+def _column_path(path, series_id, column):
+    return os.path.join(path, f"{series_id:06d}.{column}")
+
+
+def _column_size(path, series_id):
+    try:
+        return os.path.getsize(_column_path(path, series_id, "ts"))
+    except FileNotFoundError:
+        return 0
+
+
+def _truncate_columns(path, series_id):
+    size = _column_size(path, series_id)
+    size -= size % 8
+    for column in ("ts", "val"):
+        try:
+            if os.path.getsize(_column_path(path, series_id, column)) > size:
+                os.truncate(_column_path(path, series_id, column), size)
+        except FileNotFoundError:
+            pass
+
+
+def _load_schema(path):
+    try:
+        with open(os.path.join(path, SCHEMA_FILE), "r", encoding="utf-8") as f:
+            schema = json.load(f)
+    except FileNotFoundError:
+        return []
+
+    if schema["version"] != SCHEMA_VERSION:
+        raise ValueError(f"{path} has schema version {schema['version']}, expected {SCHEMA_VERSION}")
+    if schema["byteorder"] != sys.byteorder:
+        raise ValueError(f"{path} was written on a {schema['byteorder']}-endian machine")
+
+    return schema["series"]
+
+
+def _save_schema(path, series):
+    # Replaced atomically, so readers never see a partly written schema
+    temporary = os.path.join(path, SCHEMA_FILE + ".tmp")
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump({"version": SCHEMA_VERSION, "byteorder": sys.byteorder, "series": series}, f, indent=1)
+    os.replace(temporary, os.path.join(path, SCHEMA_FILE))
@@ -0,0 +1,85 @@
+"""Module for reporting only what changed between consecutive getter results."""
+# -*- coding:utf-8 -*-
+import collections
+import threading
+
+from .results import to_plain
+
+Delta = collections.namedtuple("Delta", ["full", "changes", "removed"])
+Delta.__doc__ = """Difference between a getter result and its previous value.
+
+When ``full`` is True, ``changes`` is the complete result (first poll,
+periodic resync, or a non-dict result that changed). Otherwise ``changes``
+holds only the leaves that changed or appeared, nested like the result, and
+``removed`` lists the key paths (tuples) that disappeared.
+"""
+
+
+def diff(old, new, path=()):
+    """Compare two nested dicts and return (changes, removed) as described by Delta.
+
+    Lists and other values are compared as a whole.
+    """
+    changes = {}
+    removed = []
+
+    for key, value in new.items():
+        if key not in old:
+            changes[key] = value
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            nested_changes, nested_removed = diff(old[key], value, path + (key,))
+            if nested_changes:
+                changes[key] = nested_changes
+            removed.extend(nested_removed)
+        elif value != old[key]:
+            changes[key] = value
+
+    for key in old:
+        if key not in new:
+            removed.append(path + (key,))
+
+    return changes, removed
+
+
+class DeltaTracker:
+    """Remember the last result per key and turn new results into Deltas."""
+
+    def __init__(self, resync_every=30):
+        """Instantiate a tracker sending a full result every ``resync_every`` updates of a key."""
+        self._resync_every = resync_every
+        self._last = {}
+        self._polls = {}
+        self._lock = threading.Lock()
+
+    def update(self, key, value):
+        """Record the latest result for the key and return its Delta; typed results are compared as dicts."""
+        value = to_plain(value)
+        with self._lock:
+            previous = self._last.get(key)
+            polls = self._polls.get(key, 0)
+
+            self._last[key] = value
+            if key not in self._polls or polls + 1 >= self._resync_every:
+                self._polls[key] = 0
+                return Delta(True, value, [])
+
+            self._polls[key] = polls + 1
+
+        if isinstance(previous, dict) and isinstance(value, dict):
+            changes, removed = diff(previous, value)
+            return Delta(False, changes, removed)
+
+        if previous != value:
+            return Delta(True, value, [])
+
+        return Delta(False, {}, [])
+
+    def reset(self, key=None):
+        """Forget the last result of a key (or of all keys) so the next update is a full one."""
+        with self._lock:
+            if key is None:
+                self._last.clear()
+                self._polls.clear()
+            else:
+                self._last.pop(key, None)
+                self._polls.pop(key, None)
@@ -0,0 +1,31 @@
+"""Module describing the CGI requests made by the getters of QNAPStats and AsyncQNAPStats."""
+# -*- coding:utf-8 -*-
+import collections
+
+# Per-disk SMART attribute table, as requested by the QTS storage manager; the drive number is appended
+SMART_ATTRIBUTES_URL = "disk/qsmart.cgi?func=get_hd_smartinfo&drive_no="
+
+CGIRequest = collections.namedtuple("CGIRequest", ["url", "force_list", "keep"])
+CGIRequest.__doc__ = "A GET request made by a getter: its CGI URL and the force_list and keep options of its parser."
+
+SYSTEM_HEALTH_REQUEST = CGIRequest("management/manaRequest.cgi?subfunc=sysinfo&sysHealth=1", None, ("func",))
+SYSTEM_STATS_REQUEST = CGIRequest(
+    "management/manaRequest.cgi?subfunc=sysinfo&hd=no&multicpu=1", "DNS_LIST", ("func", "model", "firmware")
+)
+# Both of the above in one request, on firmwares that support it
+COMBINED_SYSINFO_REQUEST = CGIRequest(
+    "management/manaRequest.cgi?subfunc=sysinfo&hd=no&multicpu=1&sysHealth=1", "DNS_LIST", ("func", "model", "firmware")
+)
+VOLUMES_REQUEST = CGIRequest(
+    "management/chartReq.cgi?chart_func=disk_usage&disk_select=all&include=all",
+    ("volume", "volumeUse", "folder_element"), ("volumeList", "volumeUseList")
+)
+SMART_DISK_HEALTH_REQUEST = CGIRequest("disk/qsmart.cgi?func=all_hd_data", "entry", ("Disk_Info",))
+QSM40_BANDWIDTH_REQUEST = CGIRequest(
+    "management/chartReq.cgi?chart_func=QSM40bandwidth", "item", ("bandwidth_info", "df_gateway")
+)
+# changes in API since QTS 4.5.4, old query returns no values
+BANDWIDTH_REQUEST = CGIRequest(
+    "management/chartReq.cgi?chart_func=bandwidth", None, ("bandwidth_info", "df_gateway")
+)
+FIRMWARE_UPDATE_REQUEST = CGIRequest("sys/sysRequest.cgi?subfunc=firm_update", None, ("func",))
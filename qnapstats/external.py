@@ -0,0 +1,179 @@
+"""Module for watching external (USB, eSATA) drives being plugged, unplugged or filled."""
+# -*- coding:utf-8 -*-
+import collections
+import json
+import threading
+import time
+
+from .sampler import BackgroundPoller
+
+# Fields identifying a device or volume across polls, in order of preference
+KEY_FIELDS = (
+    "serial_num", "serialNum", "serial", "device_id", "deviceId", "dev_id", "uuid",
+    "devName", "device_name", "deviceName", "vol_label", "volumeLabel", "label", "name",
+)
+# Fields whose name contains one of these describe the capacity of a volume
+CAPACITY_WORDS = ("size", "capacity", "free", "used", "total")
+
+ExternalDeviceEvent = collections.namedtuple("ExternalDeviceEvent", ["kind", "key", "data", "previous", "timestamp"])
+ExternalDeviceEvent.__doc__ = """A change of the external drives: "plugged", "unplugged" or "capacity_changed".
+
+``data`` is the device or volume entry after the change (None once
+unplugged) and ``previous`` the one before (None when plugged).
+"""
+
+
+def entries(value):
+    """Return the list of entries of a device or volume listing, whether it holds one entry, several or none."""
+    if isinstance(value, list):
+        return [entry for entry in value if isinstance(entry, dict)]
+    if not isinstance(value, dict):
+        return []
+
+    # A wrapper element such as <Disk_Vol><volume>...</volume></Disk_Vol>
+    if len(value) == 1:
+        inner = next(iter(value.values()))
+        if isinstance(inner, (list, dict)):
+            return entries(inner)
+
+    return [value]
+
+
+def entry_key(entry, key_fields=KEY_FIELDS):
+    """Return the value identifying an entry: its first non-empty key field, or its non-capacity fields."""
+    for field in key_fields:
+        value = entry.get(field)
+        if value not in (None, ""):
+            return str(value)
+
+    return json.dumps({field: value for field, value in entry.items() if not is_capacity_field(field)},
+                      sort_keys=True, default=str)
+
+
+def is_capacity_field(field):
+    """Return whether a field of a volume entry describes its capacity."""
+    field = field.lower()
+    return any(word in field for word in CAPACITY_WORDS)
+
+
+# pylint: disable=too-many-instance-attributes
+class ExternalDeviceWatcher(BackgroundPoller):
+    """Poll the external drives of a NAS adaptively and report changes as ExternalDeviceEvents.
+
+    The interval starts at ``min_interval`` seconds and is multiplied by
+    ``backoff`` after every poll without a change, up to ``max_interval``; any
+    event brings it back to ``min_interval``. A response whose body hashes
+    like the previous one is not compared entry by entry. The first
+    successful poll only records the current state.
+    """
+
+    thread_name = "qnapstats-external-watcher"
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, qnap, callback=None, *, min_interval=2, max_interval=60, backoff=2, key_fields=KEY_FIELDS):
+        """Instantiate a watcher for the NAS behind a (synchronous) QNAPStats client.
+
+        ``callback`` is called with every ExternalDeviceEvent, from the watcher's
+        thread when started with start().
+        """
+        super().__init__()
+        self._qnap = qnap
+        self._callback = callback
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._backoff = backoff
+        self._key_fields = key_fields
+
+        self._devices = None
+        self._storage = None
+        self._digests = {}
+        self._interval = min_interval
+        self._lock = threading.Lock()
+
+    @property
+    def interval(self):
+        """Seconds until the next poll of the background thread."""
+        return self._interval
+
+    @property
+    def devices(self):
+        """The external devices seen by the last successful poll, keyed by entry_key(), or None before it."""
+        with self._lock:
+            return None if self._devices is None else dict(self._devices)
+
+    @property
+    def storage(self):
+        """The volumes of external devices seen by the last successful poll, keyed by entry_key()."""
+        with self._lock:
+            return None if self._storage is None else dict(self._storage)
+
+    def poll(self):
+        """Fetch both listings now and return the ExternalDeviceEvents since the last poll.
+
+        The events are also passed to the callback.
+        """
+        devices = self._fetch("get_external_drive_listing")
+        storage = self._fetch("get_external_storage_listing")
+        timestamp = time.time()
+
+        events = []
+        with self._lock:
+            if devices is not None:
+                if self._devices is not None:
+                    events.extend(self._plug_events(self._devices, devices, timestamp))
+                self._devices = devices
+
+            if storage is not None:
+                if self._storage is not None:
+                    events.extend(self._capacity_events(self._storage, storage, timestamp))
+                self._storage = storage
+
+            if events:
+                self._interval = self._min_interval
+            else:
+                self._interval = min(self._interval * self._backoff, self._max_interval)
+
+        if self._callback is not None:
+            for event in events:
+                self._callback(event)
+
+        return events
+
+    def _fetch(self, getter):
+        """Return a listing's entries keyed by entry_key(), the previous ones if unchanged, or None on failure."""
+        listing = getattr(self._qnap, getter)()
+        if listing is None:
+            return None
+
+        with self._lock:
+            unchanged = self._digests.get(getter) == listing.digest
+            self._digests[getter] = listing.digest
+            if unchanged:
+                return self._devices if getter == "get_external_drive_listing" else self._storage
+
+        return {entry_key(entry, self._key_fields): entry for entry in entries(listing.data)}
+
+    @staticmethod
+    def _plug_events(before, after, timestamp):
+        for key in after.keys() - before.keys():
+            yield ExternalDeviceEvent("plugged", key, after[key], None, timestamp)
+        for key in before.keys() - after.keys():
+            yield ExternalDeviceEvent("unplugged", key, None, before[key], timestamp)
+
+    @staticmethod
+    def _capacity_events(before, after, timestamp):
+        for key in after.keys() & before.keys():
+            old, new = before[key], after[key]
+            fields = {field for field in old.keys() | new.keys() if is_capacity_field(field)}
+            if any(old.get(field) != new.get(field) for field in fields):
+                yield ExternalDeviceEvent("capacity_changed", key, new, old, timestamp)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception:  # pylint: disable=broad-except
+                # A failed poll is retried after the current interval
+                pass
+
+            self._stop.wait(self._interval)
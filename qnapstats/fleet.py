@@ -0,0 +1,129 @@
+"""Module for polling many QNAP devices in parallel."""
+# -*- coding:utf-8 -*-
+import collections
+import concurrent.futures
+import time
+
+from .qnap_stats import QNAPStats
+
+DEFAULT_GETTERS = ("get_system_stats", "get_system_health", "get_volumes", "get_smart_disk_health", "get_bandwidth")
+
+DeviceResult = collections.namedtuple("DeviceResult", ["name", "data", "error", "latency"])
+DeviceResult.__doc__ = """Outcome of polling a single device.
+
+``data`` maps each getter name to its result, ``error`` holds the exception
+that aborted the poll (or None) and ``latency`` is the wall-clock time in
+seconds spent on the device.
+"""
+
+
+class DeviceTimeout(Exception):
+    """Raised when a device does not finish polling within its time budget."""
+
+
+class QNAPFleet:
+    """Poll a list of QNAP devices on a bounded worker pool."""
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, devices, getters=DEFAULT_GETTERS, max_workers=8, host_timeout=30, session=None):
+        """Instantiate a new fleet.
+
+        Each entry of ``devices`` is a dict of QNAPStats constructor arguments
+        (host, port, username, password, ...) with an optional ``name``.
+        ``session`` is a requests.Session shared by every device that does not
+        set its own, e.g. one built with create_session().
+        """
+        self._getters = getters
+        self._max_workers = max_workers
+        self._host_timeout = host_timeout
+
+        # Clients are kept across polls so their sessions and SIDs are reused
+        self._clients = collections.OrderedDict()
+        for device in devices:
+            config = dict(device)
+            name = config.pop("name", None) or f"{config['host']}:{config['port']}"
+            if session is not None:
+                config.setdefault("session", session)
+            self._clients[name] = QNAPStats(**config)
+
+    @property
+    def names(self):
+        """Names of the devices in the fleet."""
+        return list(self._clients)
+
+    def circuit_states(self):
+        """Return the CircuitBreaker stats of each device that has a breaker, keyed by device name."""
+        return {
+            name: client.circuit_breaker.stats() for name, client in self._clients.items()
+            if client.circuit_breaker is not None
+        }
+
+    def _poll_device(self, name, started):
+        """Run all getters against one device, stopping once its time budget is spent."""
+        start = time.monotonic()
+        started[name] = start
+        deadline = start + self._host_timeout
+
+        client = self._clients[name]
+        data = {}
+        try:
+            for getter in self._getters:
+                if time.monotonic() > deadline:
+                    raise DeviceTimeout(f"{name} exceeded {self._host_timeout}s")
+                data[getter] = getattr(client, getter)()
+        except Exception as e:  # pylint: disable=broad-except
+            return DeviceResult(name, data, e, time.monotonic() - start)
+
+        return DeviceResult(name, data, None, time.monotonic() - start)
+
+    def poll_device(self, name):
+        """Poll a single device and return its DeviceResult.
+
+        The ``host_timeout`` budget is checked between getters; a getter that
+        hangs is not interrupted.
+        """
+        return self._poll_device(name, {})
+
+    def poll(self):
+        """Poll every device, yielding a DeviceResult as soon as each one finishes.
+
+        A device that is still running after ``host_timeout`` seconds is reported
+        with a DeviceTimeout error and no longer waited for.
+        """
+        started = {}
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._max_workers)
+        try:
+            pending = {executor.submit(self._poll_device, name, started): name for name in self._clients}
+
+            while pending:
+                done, _ = concurrent.futures.wait(
+                    pending, timeout=self._next_wakeup(pending, started),
+                    return_when=concurrent.futures.FIRST_COMPLETED
+                )
+
+                for future in done:
+                    pending.pop(future)
+                    yield future.result()
+
+                now = time.monotonic()
+                for future, name in list(pending.items()):
+                    if name in started and now - started[name] > self._host_timeout:
+                        pending.pop(future)
+                        error = DeviceTimeout(f"{name} exceeded {self._host_timeout}s")
+                        yield DeviceResult(name, {}, error, now - started[name])
+        finally:
+            # Don't block on hung devices; their threads finish in the background
+            executor.shutdown(wait=False)
+
+    def poll_all(self):
+        """Poll every device and return a dict of DeviceResult keyed by device name."""
+        return {result.name: result for result in self.poll()}
+
+    def _next_wakeup(self, pending, started):
+        """Seconds until the earliest running device hits its timeout."""
+        now = time.monotonic()
+        deadlines = [started[name] + self._host_timeout - now for name in pending.values() if name in started]
+        if not deadlines:
+            return self._host_timeout
+
+        return max(min(deadlines), 0)
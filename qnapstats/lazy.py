@@ -0,0 +1,22 @@
+"""Module for deferring the import of heavy dependencies until they are first used."""
+# -*- coding:utf-8 -*-
+import importlib
+
+
+class LazyModule:  # pylint: disable=too-few-public-methods
+    """Stand-in for a module that is only imported when one of its attributes is read.
+
+    Keeps ``import qnapstats`` cheap for code that never makes a request, such
+    as config builders or readers of cached snapshots.
+    """
+
+    def __init__(self, name):
+        """Instantiate a stand-in for the module called ``name``."""
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        """Import the module if needed and return one of its attributes."""
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
@@ -0,0 +1,229 @@
+"""Module containing a minimal HTTP transport built on http.client, for clients that start often.
+
+Importing requests costs more than everything else qnapstats needs at startup.
+A LiteSession passed as ``session`` to QNAPStats makes the same requests with
+the standard library only, keeping connections alive between them.
+"""
+# -*- coding:utf-8 -*-
+import http.client
+import socket
+import ssl
+import threading
+import urllib.parse
+
+from .retry import TransportError, TransportSSLError, TransportTimeout
+
+
+class _Cookies:
+    """Cookies set by each host, sent back on later requests to it."""
+
+    def __init__(self):
+        self._cookies = {}
+        self._lock = threading.Lock()
+
+    def header(self, host):
+        """Return the Cookie header value for a host, or None."""
+        with self._lock:
+            cookies = self._cookies.get(host)
+            return "; ".join(f"{name}={value}" for name, value in cookies.items()) if cookies else None
+
+    def update(self, host, set_cookie_headers):
+        """Store the cookies of the Set-Cookie headers of a response from a host."""
+        cookies = {}
+        for header in set_cookie_headers:
+            name, _, value = header.split(";", 1)[0].partition("=")
+            if name.strip():
+                cookies[name.strip()] = value.strip()
+
+        if cookies:
+            with self._lock:
+                self._cookies.setdefault(host, {}).update(cookies)
+
+        return cookies
+
+    def clear(self, domain=None):
+        """Forget the cookies of a host, or of all hosts; raises KeyError for an unknown host, like requests."""
+        with self._lock:
+            if domain is None:
+                self._cookies.clear()
+            else:
+                del self._cookies[domain]
+
+
+class LiteResponse:
+    """The parts of a requests.Response that QNAPStats reads."""
+
+    def __init__(self, url, response, release, stream=False):
+        """Wrap an http.client response; the body is read at once unless ``stream`` is set."""
+        self.url = url
+        self.status_code = response.status
+        self.headers = response.headers
+        self.cookies = {}
+        self._response = response
+        self._release = release
+        self._content = None
+        if not stream:
+            self._content = self._read(response.read)
+
+    def _read(self, read, *args):
+        try:
+            return read(*args)
+        except socket.timeout as e:
+            self.close(reuse=False)
+            raise TransportTimeout(str(e)) from e
+        except (OSError, http.client.HTTPException) as e:
+            self.close(reuse=False)
+            raise TransportError(str(e)) from e
+        finally:
+            if self._response is not None and self._response.isclosed():
+                self.close()
+
+    @property
+    def content(self):
+        """The body as bytes."""
+        if self._content is None:
+            self._content = self._read(self._response.read) if self._response is not None else b""
+        return self._content
+
+    @property
+    def text(self):
+        """The body decoded with the charset of the Content-Type header, UTF-8 by default."""
+        return self.content.decode(self.headers.get_content_charset() or "utf-8", "replace")
+
+    def iter_content(self, chunk_size=8192):
+        """Yield the body in chunks of up to ``chunk_size`` bytes."""
+        if self._content is not None:
+            for start in range(0, len(self._content), chunk_size):
+                yield self._content[start:start + chunk_size]
+            return
+
+        while self._response is not None:
+            chunk = self._read(self._response.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self, reuse=True):
+        """Release the connection, back to the pool if the whole body was read."""
+        if self._response is not None:
+            response, self._response = self._response, None
+            self._release(reuse and response.isclosed())
+
+
+# pylint: disable=too-many-instance-attributes
+class LiteSession:
+    """Session-like HTTP client on top of http.client with per-host keep-alive connections.
+
+    Supports what QNAPStats needs from a requests.Session: ``get``, ``post``,
+    ``cookies`` and ``close``. Network errors are raised as TransportError.
+    """
+
+    def __init__(self, pool_maxsize=10, keep_alive=True, ssl_context=None):
+        """Instantiate a session keeping up to ``pool_maxsize`` idle connections per host.
+
+        ``ssl_context`` replaces the default context for certificate-verified
+        HTTPS requests.
+        """
+        self._pool_maxsize = pool_maxsize
+        self._keep_alive = keep_alive
+        self._ssl_context = ssl_context
+        self._unverified_context = None
+        self._idle = {}
+        self._lock = threading.Lock()
+        self.cookies = _Cookies()
+
+    def get(self, url, timeout=None, verify=True, stream=False):
+        """Send a GET request."""
+        return self.request("GET", url, timeout=timeout, verify=verify, stream=stream)
+
+    def post(self, url, data=None, timeout=None, verify=True):
+        """Send a POST request with ``data`` (a dict or str) form-encoded."""
+        return self.request("POST", url, data=data, timeout=timeout, verify=verify)
+
+    # pylint: disable=too-many-arguments,too-many-locals
+    def request(self, method, url, data=None, *, timeout=None, verify=True, stream=False):
+        """Send a request and return a LiteResponse."""
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port, verify)
+        path = parts.path + ("?" + parts.query if parts.query else "")
+
+        headers = {"Accept-Encoding": "identity", "Connection": "keep-alive" if self._keep_alive else "close"}
+        body = None
+        if data is not None:
+            body = urllib.parse.urlencode(data) if isinstance(data, dict) else data
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        cookie = self.cookies.header(parts.hostname)
+        if cookie:
+            headers["Cookie"] = cookie
+
+        # A kept-alive connection may have been closed by the server; retry once on a fresh one
+        for reused in (True, False):
+            connection, was_idle = self._connection(key, timeout, reused)
+            try:
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+            except socket.timeout as e:
+                connection.close()
+                raise TransportTimeout(str(e)) from e
+            except ssl.SSLError as e:
+                connection.close()
+                raise TransportSSLError(str(e)) from e
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                if was_idle:
+                    continue
+                raise TransportError(str(e)) from e
+            break
+
+        def release(reuse):
+            if reuse and self._keep_alive and not response.will_close:
+                self._put_idle(key, connection)
+            else:
+                connection.close()
+
+        result = LiteResponse(url, response, release, stream)
+        result.cookies = self.cookies.update(parts.hostname, response.headers.get_all("Set-Cookie") or [])
+        return result
+
+    def _connection(self, key, timeout, reuse):
+        """Return an idle connection for ``key`` if ``reuse`` allows, or a new one, and whether it was idle."""
+        if reuse:
+            with self._lock:
+                idle = self._idle.get(key)
+                if idle:
+                    connection = idle.pop()
+                    connection.timeout = timeout
+                    if connection.sock is not None:
+                        connection.sock.settimeout(timeout)
+                    return connection, True
+
+        scheme, host, port, verify = key
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=timeout, context=self._context(verify)), False
+        return http.client.HTTPConnection(host, port, timeout=timeout), False
+
+    def _context(self, verify):
+        if verify:
+            return self._ssl_context
+        if self._unverified_context is None:
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            self._unverified_context = context
+        return self._unverified_context
+
+    def _put_idle(self, key, connection):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self._pool_maxsize:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
@@ -0,0 +1,63 @@
+"""Module containing per-request metrics collected by QNAPStats."""
+# -*- coding:utf-8 -*-
+import collections
+import threading
+
+RequestMetrics = collections.namedtuple(
+    "RequestMetrics",
+    ["endpoint", "method", "status", "bytes", "network_time", "parse_time", "retry", "login"]
+)
+RequestMetrics.__doc__ = """Measurements of a single CGI request.
+
+``endpoint`` is the CGI URL without the SID (and without credentials for
+logins), ``status`` is None when the request raised, times are in seconds,
+``retry`` flags a retried request and ``login`` an authLogin.cgi call.
+"""
+
+
+class RequestStats:
+    """In-memory aggregate of RequestMetrics, usable as a request hook."""
+
+    FIELDS = ("requests", "errors", "retries", "logins", "bytes", "network_time", "parse_time")
+
+    def __init__(self):
+        """Instantiate empty statistics."""
+        self._lock = threading.Lock()
+        self._totals = dict.fromkeys(self.FIELDS, 0)
+        self._endpoints = {}
+        self.last = None  # type: RequestMetrics
+
+    def __call__(self, metrics):
+        """Record the metrics of one request."""
+        with self._lock:
+            endpoint = self._endpoints.get(metrics.endpoint)
+            if endpoint is None:
+                endpoint = self._endpoints[metrics.endpoint] = dict.fromkeys(self.FIELDS, 0)
+
+            for counters in (self._totals, endpoint):
+                counters["requests"] += 1
+                counters["errors"] += metrics.status != 200
+                counters["retries"] += metrics.retry
+                counters["logins"] += metrics.login
+                counters["bytes"] += metrics.bytes
+                counters["network_time"] += metrics.network_time
+                counters["parse_time"] += metrics.parse_time
+
+            self.last = metrics
+
+    def totals(self):
+        """Return the counters summed over all endpoints."""
+        with self._lock:
+            return dict(self._totals)
+
+    def endpoints(self):
+        """Return the counters of each endpoint, keyed by endpoint."""
+        with self._lock:
+            return {endpoint: dict(counters) for endpoint, counters in self._endpoints.items()}
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        with self._lock:
+            self._totals = dict.fromkeys(self.FIELDS, 0)
+            self._endpoints = {}
+            self.last = None
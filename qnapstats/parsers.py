@@ -0,0 +1,221 @@
+"""Module containing the XML parser backends used to decode CGI responses."""
+# -*- coding:utf-8 -*-
+import functools
+
+from .lazy import LazyModule
+
+json = LazyModule("json")
+xmltodict = LazyModule("xmltodict")
+ElementTree = LazyModule("xml.etree.ElementTree")
+
+
+@functools.lru_cache(maxsize=None)
+def etree_backend():
+    """Return the ElementTree module used by parse_etree and its parser, importing them on first use.
+
+    Uses lxml, with entity resolution and network access disabled, when it is installed.
+    """
+    try:
+        from lxml import etree  # pylint: disable=import-outside-toplevel
+        return etree, etree.XMLParser(resolve_entities=False, no_network=True)
+    except ImportError:
+        from xml.etree import ElementTree as etree  # pylint: disable=import-outside-toplevel
+        return etree, None
+
+
+def parse_xmltodict(content, force_list=None, keep=None):  # pylint: disable=unused-argument
+    """Parse a QDocRoot document into nested dicts with xmltodict."""
+    return xmltodict.parse(content, force_list=force_list)["QDocRoot"]
+
+
+def parse_etree(content, force_list=None, keep=None):
+    """Parse a QDocRoot document into the same nested dicts as xmltodict, using ElementTree.
+
+    Only the top-level elements named in ``keep`` (plus ``authPassed``) are
+    converted; the others are skipped. Uses lxml when it is installed.
+    """
+    element_tree, xml_parser = etree_backend()
+    if xml_parser is not None:
+        root = element_tree.fromstring(content, xml_parser)
+    else:
+        root = element_tree.fromstring(content)
+
+    if keep is not None:
+        keep = set(keep)
+        keep.add("authPassed")
+
+    return _convert(root, force_list, keep)
+
+
+def _convert(element, force_list, keep=None):
+    """Convert an element following xmltodict's rules for attributes, text and repeated tags."""
+    item = None
+    if element.attrib:
+        item = {"@" + key: value for key, value in element.attrib.items()}
+
+    # Like xmltodict, the text of an element includes the tails of its children
+    texts = [element.text] if element.text else []
+    for child in element:
+        if child.tail:
+            texts.append(child.tail)
+
+        # lxml yields comments and processing instructions as children
+        if not isinstance(child.tag, str):
+            continue
+        if keep is not None and child.tag not in keep:
+            continue
+
+        item = _push(item, child.tag, _convert(child, force_list), force_list)
+
+    data = "".join(texts).strip() or None
+    if item is None:
+        return data
+
+    if data:
+        _push(item, "#text", data, force_list)
+
+    return item
+
+
+def _push(item, key, value, force_list):
+    if item is None:
+        item = {}
+
+    if key in item:
+        if isinstance(item[key], list):
+            item[key].append(value)
+        else:
+            item[key] = [item[key], value]
+    elif force_list is True or (force_list and key in force_list):
+        # Matches xmltodict, which tests membership even when force_list is a string
+        item[key] = [value]
+    else:
+        item[key] = value
+
+    return item
+
+
+def parse_json(content, force_list=None, keep=None):
+    """Parse a JSON response into the same nested dicts as its XML counterpart.
+
+    Scalars become strings like XML text (booleans "1"/"0"), objects under a
+    key named in ``force_list`` are wrapped in lists, and only the top-level
+    keys named in ``keep`` (plus ``authPassed``) are converted.
+    """
+    data = json.loads(content)
+    if isinstance(data, dict) and set(data) == {"QDocRoot"}:
+        data = data["QDocRoot"]
+
+    if keep is not None:
+        keep = set(keep)
+        keep.add("authPassed")
+        data = {key: value for key, value in data.items() if key in keep}
+
+    return _from_json(data, force_list)
+
+
+def _from_json(value, force_list, key=None):
+    if isinstance(value, dict):
+        value = {child: _from_json(item, force_list, child) for child, item in value.items()}
+    elif isinstance(value, list):
+        return [_from_json(item, force_list) for item in value]
+    elif isinstance(value, bool):
+        value = "1" if value else "0"
+    elif value is not None:
+        value = str(value)
+
+    if key is not None and (force_list is True or (force_list and key in force_list)):
+        return [value]
+
+    return value
+
+
+class SessionRejected(Exception):
+    """Raised by streaming parsers when the document reports authPassed == 0."""
+
+
+def _text(element):
+    """Return the element's text stripped like xmltodict does, or None when empty."""
+    return (element.text or "").strip() or None
+
+
+# pylint: disable=too-many-branches
+def iter_volume_events(chunks):
+    """Incrementally parse a disk_usage document, yielding volumes and folders as they complete.
+
+    Yields ``("volume", label, info)`` once the size of a volume is known and
+    ``("folder", label, folder)`` for each of its shared folders. Processed
+    elements are discarded so memory stays flat regardless of the share count.
+    """
+    parser = ElementTree.XMLPullParser(events=("start", "end"))
+    labels = {}
+    stack = []
+    volume_use = {}
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, element in parser.read_events():
+            if event == "start":
+                if element.tag == "volumeUse":
+                    volume_use = {"emitted": False}
+                elif element.tag == "folder_element" and volume_use.get("emitted") is False:
+                    yield from _emit_volume(volume_use, labels)
+                stack.append(element)
+                continue
+
+            stack.pop()
+            parent = stack[-1] if stack else None
+            tag = element.tag
+
+            if tag == "authPassed" and len(stack) == 1 and _text(element) == "0":
+                raise SessionRejected()
+
+            if tag == "volume":
+                value = element.findtext("volumeValue", "").strip()
+                label_element = element.find("volumeLabel")
+                labels[value] = _text(label_element) if label_element is not None else "Volume " + value
+            elif tag in ("volumeValue", "free_size", "total_size") and parent is not None \
+                    and parent.tag == "volumeUse":
+                volume_use[tag] = _text(element)
+                continue
+            elif tag == "folder_element":
+                label = labels.get(volume_use.get("volumeValue"))
+                sharename = element.find("sharename")
+                used_size = element.findtext("used_size")
+                if label is not None and sharename is not None and used_size is not None:
+                    yield "folder", label, {"sharename": _text(sharename), "used_size": int(used_size)}
+            elif tag == "volumeUse":
+                if volume_use.get("emitted") is False:
+                    yield from _emit_volume(volume_use, labels)
+                volume_use = {}
+            else:
+                continue
+
+            # Drop the processed element so the tree never holds more than one of them
+            element.clear()
+            if parent is not None:
+                parent.remove(element)
+
+    parser.close()
+
+
+def _emit_volume(volume_use, labels):
+    volume_use["emitted"] = True
+
+    key = volume_use.get("volumeValue")
+    # Skip any system reserved volumes
+    if key not in labels:
+        return
+
+    info = {"id": key, "label": labels[key]}
+    for size in ("free_size", "total_size"):
+        if volume_use.get(size) is not None:
+            info[size] = int(volume_use[size])
+
+    yield "volume", labels[key], info
+
+
+PARSERS = {
+    "xmltodict": parse_xmltodict,
+    "etree": parse_etree,
+}
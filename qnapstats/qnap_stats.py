@@ -1,18 +1,89 @@
 """Module containing multiple classes to obtain QNAP system stats via cgi calls."""
 # -*- coding:utf-8 -*-
 import base64
-import json
-import xmltodict
-import requests
-
-
-# pylint: disable=too-many-instance-attributes
+import collections
+import hashlib
+import threading
+import time
+import urllib.parse
+
+from .capabilities import Capabilities
+from .delta import DeltaTracker
+from .endpoints import (
+    BANDWIDTH_REQUEST, COMBINED_SYSINFO_REQUEST, FIRMWARE_UPDATE_REQUEST, QSM40_BANDWIDTH_REQUEST,
+    SMART_ATTRIBUTES_URL, SMART_DISK_HEALTH_REQUEST, SYSTEM_HEALTH_REQUEST, SYSTEM_STATS_REQUEST, VOLUMES_REQUEST,
+    CGIRequest
+)
+from .lazy import LazyModule
+from .metrics import RequestMetrics, RequestStats
+from .parsers import PARSERS, SessionRejected, iter_volume_events, parse_json
+from .results import (
+    BandwidthInterface, Disk, SystemStats, Volume, bandwidth_interfaces, external_devices, volume_labels, volume_usage
+)
+from .retry import (
+    LOGIN_REFUSED, NOT_XML, SESSION_REJECTED, RequestFailed, RetryPolicy, TransportError, exception_failure,
+    http_failure
+)
+
+# Imported on first use, so importing the package stays cheap
+concurrent_futures = LazyModule("concurrent.futures")
+json = LazyModule("json")
+requests = LazyModule("requests")
+
+SNAPSHOT_SECTIONS = (
+    "system_stats", "system_health", "volumes", "smart_disk_health", "bandwidth", "firmware_update"
+)
+
+SnapshotSection = collections.namedtuple("SnapshotSection", ["data", "timestamp"])
+SnapshotSection.__doc__ = "Result of one getter along with the time (epoch seconds) it was fetched."
+
+Snapshot = collections.namedtuple("Snapshot", SNAPSHOT_SECTIONS)
+Snapshot.__doc__ = "All metric sections of a NAS; sections that were not requested are None."
+Snapshot.__new__.__defaults__ = (None,) * len(SNAPSHOT_SECTIONS)
+
+Listing = collections.namedtuple("Listing", ["digest", "data"])
+Listing.__doc__ = "External drives or volumes: a hash of the response body, and the listing (None if empty)."
+
+# Query parameter asking a CGI for a JSON body; firmwares without JSON support ignore it and answer in XML
+JSON_QUERY = "output=json"
+JSON_CONTENT_TYPES = ("application/json", "text/json")
+
+
+def _content_type(resp):
+    """Return the media type of a response, without parameters such as the charset."""
+    return resp.headers.get("Content-Type", "").split(";", 1)[0].strip()
+
+
+# pylint: disable=too-many-instance-attributes,too-many-public-methods
 class QNAPStats:
     """Class containing the main functions."""
 
-    # pylint: disable=too-many-arguments
-    def __init__(self, host, port, username, password, debugmode=False, verify_ssl=True, timeout=5):
-        """Instantiate a new qnap_stats object."""
+    # pylint: disable=too-many-arguments,too-many-locals
+    def __init__(self, host, port, username, password, debugmode=False, verify_ssl=True, timeout=5, *,
+                 cache=None, session_store=None, session_ttl=3600, parser="xmltodict", session=None,
+                 retry_policy=None, circuit_breaker=None, typed_results=False, response_format="xml",
+                 capabilities=None, coalescer=None):
+        """Instantiate a new qnap_stats object.
+
+        Pass a ResponseCache as ``cache`` to reuse parsed responses of slowly
+        changing endpoints, and a session store as ``session_store`` to reuse
+        SIDs (for up to ``session_ttl`` seconds) across instances and processes.
+        ``parser`` selects the XML backend: "xmltodict" or the faster "etree".
+        ``session`` is a requests.Session (see create_session()) or a
+        LiteSession whose connection pool may be shared with other instances. Failed requests are
+        retried according to ``retry_policy`` (a RetryPolicy), and a
+        CircuitBreaker passed as ``circuit_breaker`` stops requests to a NAS
+        that keeps failing. With ``typed_results`` get_system_stats(),
+        get_volumes(), get_smart_disk_health() and get_bandwidth() return
+        compact result objects converting their fields on access.
+        ``response_format`` is "xml", "json" (always ask for JSON bodies) or
+        "auto" (ask for JSON until the NAS answers a request in XML).
+        Endpoint variants that work on this NAS are remembered in
+        ``capabilities`` (a Capabilities, which may be shared by clients of the
+        same device) until get_system_stats() reports a new firmware.
+        Concurrent calls of the same endpoint share one request and parsed
+        result when a RequestCoalescer is passed as ``coalescer``.
+        """
         self._username = username
         self._password = base64.b64encode(password.encode('utf-8')).decode('ascii')
 
@@ -20,7 +91,16 @@ class QNAPStats:
         self._debugmode = debugmode
 
         self._session_error = False
-        self._session = None  # type: requests.Session
+        # Why the last request of each thread failed
+        self._local = threading.local()
+        self._session = session  # type: requests.Session
+        self._owns_session = session is None
+
+        # Guards the SID and session; held while logging in, so only one thread logs in at a time
+        self._session_lock = threading.RLock()
+        # Number of logins made and why the last one failed, shared with the threads that waited for it
+        self._login_generation = 0
+        self._login_failure = None  # type: Failure
 
         if not (host.startswith("http://") or host.startswith("https://")):
             host = "http://" + host
@@ -28,106 +108,486 @@ class QNAPStats:
         self._verify_ssl = verify_ssl
         self._timeout = timeout
 
+        self._capabilities = capabilities or Capabilities()
+
+        self._cache = cache  # type: ResponseCache
+        self._coalescer = coalescer  # type: RequestCoalescer
+
         self._base_url = f"{host}:{port}/cgi-bin/"
+        self._hostname = urllib.parse.urlsplit(self._base_url).hostname
+
+        self._session_store = session_store  # type: MemorySessionStore
+        self._session_ttl = session_ttl
+        self._session_key = f"{username}@{self._base_url}"
+
+        self._parse = PARSERS[parser]
+        self._typed_results = typed_results
+
+        self._response_format = response_format
+        # Whether the NAS answers JSON when asked to (None = not probed in this session yet)
+        self._json_supported = None
+
+        self._request_hooks = []
+        self._request_stats = None  # type: RequestStats
+
+        self._delta_tracker = None  # type: DeltaTracker
+
+        self._retry_policy = retry_policy or RetryPolicy()
+        self._circuit_breaker = circuit_breaker  # type: CircuitBreaker
+
+    @property
+    def cache(self):
+        """The ResponseCache in use, or None if caching is disabled."""
+        return self._cache
+
+    @property
+    def coalescer(self):
+        """The RequestCoalescer in use, or None if requests are not coalesced."""
+        return self._coalescer
+
+    @property
+    def capabilities(self):
+        """The Capabilities learned for this NAS."""
+        return self._capabilities
+
+    @property
+    def circuit_breaker(self):
+        """The CircuitBreaker guarding this NAS, or None if there is none."""
+        return self._circuit_breaker
+
+    @property
+    def request_stats(self):
+        """The RequestStats being collected, or None if they are not enabled."""
+        return self._request_stats
+
+    def add_request_hook(self, hook):
+        """Register a callable that receives a RequestMetrics after every request."""
+        # The list is replaced rather than changed, so requests in other threads can iterate it without locking
+        self._request_hooks = self._request_hooks + [hook]
+
+    def remove_request_hook(self, hook):
+        """Unregister a hook added with add_request_hook()."""
+        hooks = list(self._request_hooks)
+        hooks.remove(hook)
+        self._request_hooks = hooks
+
+    def enable_request_stats(self):
+        """Start aggregating request metrics in memory and return the RequestStats."""
+        with self._session_lock:
+            if self._request_stats is None:
+                self._request_stats = RequestStats()
+                self.add_request_hook(self._request_stats)
+
+        return self._request_stats
+
+    def enable_delta(self, resync_every=30):
+        """Enable get_delta(), sending the full result of a getter every ``resync_every`` calls."""
+        self._delta_tracker = DeltaTracker(resync_every)
+        return self._delta_tracker
+
+    def get_delta(self, getter, **kwargs):
+        """Call a getter by name and return a Delta against its previous result.
+
+        Returns None, without forgetting the previous result, if the getter fails.
+        """
+        if self._delta_tracker is None:
+            self.enable_delta()
+
+        result = getattr(self, getter)(**kwargs)
+        if result is None:
+            return None
 
-    def _debuglog(self, message):
-        """Output message if debug mode is enabled."""
+        return self._delta_tracker.update(getter, result)
+
+    @property
+    def _failure(self):
+        """Why the last request or login made by the calling thread failed."""
+        return getattr(self._local, "failure", None)
+
+    @_failure.setter
+    def _failure(self, failure):
+        self._local.failure = failure
+
+    def _debuglog(self, message, *args):
+        """Output message if debug mode is enabled, formatting args lazily."""
         if self._debugmode:
-            print("DEBUG: " + message)
+            print("DEBUG: " + (message % args if args else message))
 
     def _init_session(self):
-        if self._sid is None or self._session is None or self._session_error:
-            # Clear sid and reset error
-            self._sid = None
-            self._session_error = False
-
-            if self._session is not None:
-                self._session = None
+        """Log in unless the current SID is usable; returns None, or the Failure that made logging in fail.
+
+        Logins are single-flight: threads arriving while another one logs in
+        wait for it and share its outcome instead of logging in again.
+        """
+        generation = self._login_generation
+        with self._session_lock:
+            if self._session_valid():
+                return None
+
+            if self._login_generation != generation:
+                # A login finished while we waited and still failed, or its SID was rejected since
+                return self._login_failure
+
+            try:
+                self._login_failure = self._renew_session()
+            except (TransportError, requests.exceptions.RequestException) as e:
+                # The waiting threads get this failure rather than each trying again while holding the lock
+                self._login_failure = exception_failure(e)
+                raise
+            finally:
+                self._login_generation += 1
+
+            return self._login_failure
+
+    def _session_valid(self):
+        """Return whether there is a SID that was not rejected, so no login is needed."""
+        return self._sid is not None and self._session is not None and not self._session_error
+
+    def _renew_session(self):
+        """Replace the SID, with a stored one or by logging in; returns None or the Failure."""
+        if self._session_error and self._session_store is not None:
+            # The NAS rejected our SID, so don't hand it to anyone else
+            self._session_store.delete(self._session_key)
+
+        if self._session is None:
             self._debuglog("Creating new session")
             self._session = requests.Session()
+        else:
+            # Only the SID is stale; keep the pooled connections but drop the old login's cookies
+            self._clear_cookies()
+
+        if self._session_store is not None:
+            sid = self._session_store.get(self._session_key)
+            if sid is not None:
+                self._debuglog("Reusing stored session")
+                self._sid, self._session_error = sid, False
+                return None
+
+        # We created a new session so login
+        if self._login() is False:
+            self._sid, self._session_error = None, True
+            self._debuglog("Login failed, unable to process request")
+            return self._failure or LOGIN_REFUSED
 
-            # We created a new session so login
-            if self._login() is False:
+        self._session_error = False
+        if self._session_store is not None:
+            self._session_store.set(self._session_key, self._sid, self._session_ttl)
+
+        return None
+
+    def _session_state(self):
+        """Return the session and SID to make a request with, waiting for a login in progress."""
+        with self._session_lock:
+            return self._session, self._sid
+
+    def _reject_session(self, sid):
+        """Make the next request log in again, unless another thread already replaced the rejected SID."""
+        with self._session_lock:
+            if sid is None or sid == self._sid:
                 self._session_error = True
-                self._debuglog("Login failed, unable to process request")
-                return
+
+    def _clear_cookies(self):
+        try:
+            self._session.cookies.clear(self._hostname)
+        except KeyError:
+            pass
+
+    def close(self):
+        """Close the connections of the session, unless it was passed in and may be shared."""
+        with self._session_lock:
+            if self._session is not None and self._owns_session:
+                self._session.close()
+                self._session = None
+            self._sid = None
 
     def _login(self):
         """Log into QNAP and obtain a session id."""
-        data = {"user": self._username, "pwd": self._password}
-        result = self._execute_post_url("authLogin.cgi", data, False)
+        # The method that worked last time goes first; the other one is tried if it fails
+        methods = ("get", "post") if self._capabilities.get("login") == "get" else ("post", "get")
+        for method in methods:
+            result = self._login_request(method)
+            if result is not None and result.get("authSid"):
+                break
 
-        if result is None or not result.get("authSid"):
-            # Another method to login
-            suffix_url = "authLogin.cgi?user=" + self._username + "&pwd=" + self._password
-            result = self._execute_get_url(suffix_url, False)
+        if result is not None and not result.get("authSid"):
+            result = None
+            self._failure = LOGIN_REFUSED
 
         if result is None:
+            if self._failure is SESSION_REJECTED:
+                # authPassed == 0 in reply to a login means the credentials were refused
+                self._failure = LOGIN_REFUSED
             return False
 
         self._sid = result["authSid"]
+        self._capabilities.set("login", method)
+        if self._response_format == "auto":
+            self._json_supported = None
 
         return True
 
-    def _get_url(self, url, retry_on_error=True, **kwargs):
-        """High-level function for making GET requests."""
-        self._init_session()
+    def _login_request(self, method):
+        """Make a login request with the "post" or "get" method and return its response."""
+        if method == "post":
+            return self._execute_post_url("authLogin.cgi", {"user": self._username, "pwd": self._password}, False)
 
-        result = self._execute_get_url(url, **kwargs)
-        if (self._session_error or result is None) and retry_on_error:
-            self._debuglog("Error occured, retrying...")
-            self._get_url(url, False, **kwargs)
+        return self._execute_get_url("authLogin.cgi?user=" + self._username + "&pwd=" + self._password, False)
 
-        return result
+    def _get_url(self, url, retry_on_error=True, use_cache=True, **kwargs):
+        """High-level function for making GET requests, retried according to the retry policy."""
+        cached = self._cached(url, use_cache, kwargs)
+        if cached is not None:
+            return cached
+
+        return self._coalesce(url, kwargs, lambda: self._fetch_url(url, retry_on_error, **kwargs))
+
+    def _cached(self, url, use_cache, kwargs):
+        """Return the cached response of a GET request, or None."""
+        if not use_cache or self._cache is None:
+            return None
+
+        return self._cache.get(self._base_url + url, kwargs.get("force_list"))
 
-    def _execute_get_url(self, url, append_sid=True, **kwargs):
+    def _coalesce(self, url, kwargs, fetch):
+        """Return ``fetch()``, sharing it with identical requests in flight when a RequestCoalescer is set."""
+        if self._coalescer is None:
+            return fetch()
+
+        return self._coalescer.call(self._coalesce_key(url, kwargs), fetch)
+
+    def _coalesce_key(self, url, kwargs):
+        """Key identifying the identical requests to coalesce: the full CGI URL and ``force_list``."""
+        return self._base_url + url, kwargs.get("force_list")
+
+    def _fetch_url(self, url, retry_on_error, **kwargs):
+        """Make a GET request, retried according to the retry policy, and record its outcome."""
+        if not self._circuit_allows():
+            return None
+
+        result, failure = None, None
+        for attempt in range(self._retry_policy.attempts if retry_on_error else 1):
+            if attempt:
+                time.sleep(self._retry_delay(attempt, failure))
+
+            result, failure = self._attempt_get_url(url, attempt > 0, **kwargs)
+            if failure is None or not failure.retryable:
+                break
+
+        return self._finish_get_url(url, result, failure, kwargs.get("force_list"))
+
+    def _retry_delay(self, retry, failure):
+        """Return the seconds to wait before a retry after a Failure, as the retry policy says."""
+        delay = self._retry_policy.delay(retry, failure)
+        self._debuglog("Error occured (%s), retrying in %.2fs...", failure.reason, delay)
+        return delay
+
+    def _attempt_get_url(self, url, retry, **kwargs):
+        """Log in if needed and make one GET request; returns the result and a Failure or None."""
+        try:
+            failure = self._init_session()
+            if failure is not None:
+                return None, failure
+
+            return self._request_get_url(url, retry, **kwargs)
+        except Exception as e:  # pylint: disable=broad-except
+            # Also a malformed body, so that it is reported to the circuit breaker like any failed request
+            return None, exception_failure(e)
+
+    def _request_get_url(self, url, retry, **kwargs):
+        """Make one GET request in the calling thread; returns the result and a Failure or None."""
+        result = self._execute_get_url(url, retry=retry, **kwargs)
+        return result, self._failure if result is None else None
+
+    def _circuit_allows(self):
+        if self._circuit_breaker is None or self._circuit_breaker.allow():
+            return True
+
+        self._debuglog("Circuit breaker open, skipping request")
+        return False
+
+    def _finish_get_url(self, url, result, failure, force_list):
+        """Report the outcome of a request to the circuit breaker and cache; re-raises request exceptions."""
+        if failure is None:
+            if self._circuit_breaker is not None:
+                self._circuit_breaker.record_success()
+            if self._cache is not None:
+                self._cache.set(self._base_url + url, force_list, result)
+            return result
+
+        self._debuglog("Request failed: %s", failure.reason)
+        if self._circuit_breaker is not None:
+            self._circuit_breaker.record_failure(failure)
+        if failure.exception is not None:
+            raise failure.exception
+
+        return None
+
+    def _execute_get_url(self, url, append_sid=True, retry=False, **kwargs):
         """Low-level function to execute a GET request."""
+        # Requests without a SID are logins, whose query string holds the credentials
+        endpoint = url if append_sid else url.split("?", 1)[0]
         url = self._base_url + url
-        self._debuglog("GET from URL: " + url)
+        self._debuglog("GET from URL: %s", url)
+
+        json_requested = append_sid and self._wants_json()
+        if json_requested:
+            url = f"{url}&{JSON_QUERY}"
 
+        session, sid = self._session_state()
         if append_sid:
-            self._debuglog("Appending access_token (SID: " + self._sid + ") to url")
-            url = f"{url}&sid={self._sid}"
+            self._debuglog("Appending access_token (SID: %s) to url", sid)
+            url = f"{url}&sid={sid}"
+
+        return self._send(
+            "GET", endpoint, retry,
+            lambda: session.get(url, timeout=self._timeout, verify=self._verify_ssl),
+            json_requested=json_requested, sid=sid, **kwargs
+        )
 
-        resp = self._session.get(url, timeout=self._timeout, verify=self._verify_ssl)
-        return self._handle_response(resp, **kwargs)
+    def _wants_json(self):
+        if self._response_format == "auto":
+            return self._json_supported is not False
+        return self._response_format == "json"
 
-    def _execute_post_url(self, url, data, append_sid=True, **kwargs):
+    def _post_url(self, url, data, **kwargs):
+        """High-level function for making POST requests, logging in again once if the SID was rejected."""
+        for retry in (False, True):
+            if self._init_session() is not None:
+                return None
+
+            result, failure = self._request_post_url(url, data, retry, **kwargs)
+            if failure is not SESSION_REJECTED:
+                return result
+
+        return None
+
+    def _request_post_url(self, url, data, retry, **kwargs):
+        """Make one POST request in the calling thread; returns the result and a Failure or None."""
+        result = self._execute_post_url(url, data, retry=retry, **kwargs)
+        return result, self._failure if result is None else None
+
+    def _execute_post_url(self, url, data, append_sid=True, retry=False, **kwargs):
         """Low-level function to execute a POST request."""
+        endpoint = url
         url = self._base_url + url
-        self._debuglog("POST to URL: " + url)
+        self._debuglog("POST to URL: %s", url)
 
+        session, sid = self._session_state()
         if append_sid:
-            self._debuglog("Appending access_token (SID: " + self._sid + ") to url")
-            data["sid"] = self._sid
+            self._debuglog("Appending access_token (SID: %s) to url", sid)
+            # Copied, as the caller's dict may be in use by other threads
+            data = dict(data, sid=sid)
+
+        return self._send(
+            "POST", endpoint, retry,
+            lambda: session.post(url, data, timeout=self._timeout, verify=self._verify_ssl),
+            sid=sid, **kwargs
+        )
+
+    def _send(self, method, endpoint, retry, request, **kwargs):
+        """Perform a request and handle its response, timing both when hooks are registered."""
+        if not self._request_hooks:
+            return self._handle_response(request(), **kwargs)
+
+        start = time.perf_counter()
+        try:
+            resp = request()
+        except Exception:
+            self._emit_request_metrics(RequestMetrics(
+                endpoint, method, None, 0, time.perf_counter() - start, 0.0, retry,
+                endpoint.startswith("authLogin.cgi")
+            ))
+            raise
+
+        network_time = time.perf_counter() - start
+        result = self._handle_response(resp, **kwargs)
+        parse_time = time.perf_counter() - start - network_time
+
+        self._emit_request_metrics(RequestMetrics(
+            endpoint, method, resp.status_code, len(resp.content), network_time, parse_time, retry,
+            endpoint.startswith("authLogin.cgi")
+        ))
 
-        resp = self._session.post(url, data, timeout=self._timeout, verify=self._verify_ssl)
-        return self._handle_response(resp, **kwargs)
+        return result
+
+    def _emit_request_metrics(self, metrics):
+        for hook in self._request_hooks:
+            hook(metrics)
+
+    # pylint: disable=too-many-arguments
+    def _handle_response(self, resp, force_list=None, keep=None, json_requested=False, sid=None, digest=False):
+        """Ensure response is successful and return its XML or JSON body as dicts; ``sid`` is the one sent.
+
+        With ``digest`` a Listing of the body's hash and the dicts is returned.
+        """
+        self._debuglog("Request executed: %s", resp.status_code)
+        content_type = _content_type(resp)
+        # Errors are answered the same way whatever the format, so only a 200 tells whether JSON is supported
+        if json_requested and self._json_supported is None and resp.status_code == 200:
+            self._detect_json(content_type in JSON_CONTENT_TYPES)
 
-    def _handle_response(self, resp, force_list=None):
-        """Ensure response is successful and return body as XML."""
-        self._debuglog("Request executed: " + str(resp.status_code))
         if resp.status_code != 200:
+            self._failure = http_failure(resp.status_code)
             return None
 
-        if resp.headers["Content-Type"] != "text/xml":
-            # JSON requests not currently supported
+        if content_type in JSON_CONTENT_TYPES:
+            parse = parse_json
+        elif content_type == "text/xml":
+            parse = self._parse
+        else:
+            self._failure = NOT_XML
             return None
-        self._debuglog("Headers: " + json.dumps(dict(resp.headers)))
-        self._debuglog("Cookies: " + json.dumps(dict(resp.cookies)))
-        self._debuglog("Response Text: " + resp.text)
-        data = xmltodict.parse(resp.content, force_list=force_list)['QDocRoot']
+
+        if self._debugmode:
+            self._debuglog("Headers: " + json.dumps(dict(resp.headers)))
+            self._debuglog("Cookies: " + json.dumps(dict(resp.cookies)))
+            self._debuglog("Response Text: " + resp.text)
+        data = parse(resp.content, force_list=force_list, keep=keep)
 
         auth_passed = data.get('authPassed')
         if auth_passed is not None and len(auth_passed) == 1 and auth_passed == "0":
-            self._session_error = True
+            self._reject_session(sid)
+            self._failure = SESSION_REJECTED
             return None
 
+        if digest:
+            return Listing(hashlib.blake2b(resp.content, digest_size=16).digest(), data)
+
         return data
 
-    def get_system_health(self):
+    def _detect_json(self, supported):
+        """Remember whether the NAS answered a JSON request in JSON, so it is only probed once per session."""
+        if self._response_format == "auto":
+            self._json_supported = supported
+            self._debuglog("JSON responses %s", "supported" if supported else "not supported")
+
+    def _request(self, request, use_cache=True):
+        """Make the GET request described by a CGIRequest."""
+        return self._get_url(request.url, force_list=request.force_list, keep=request.keep, use_cache=use_cache)
+
+    def _run_steps(self, steps, use_cache=True):
+        """Drive a getter's steps: make each CGIRequest they yield, send back its response and return their result.
+
+        The steps of a getter are written once, as a generator, and driven
+        by this method or by its coroutine counterpart in AsyncQNAPStats.
+        """
+        try:
+            request = next(steps)
+            while True:
+                request = steps.send(self._request(request, use_cache))
+        except StopIteration as stop:
+            return stop.value
+
+    def get_system_health(self, use_cache=True):
         """Obtain the system's overall health."""
-        resp = self._get_url("management/manaRequest.cgi?subfunc=sysinfo&sysHealth=1")
+        return self._run_steps(self._system_health_steps(), use_cache)
+
+    def _system_health_steps(self):
+        resp = yield SYSTEM_HEALTH_REQUEST
+        return self._parse_system_health(resp)
+
+    @staticmethod
+    def _parse_system_health(resp):
         if resp is None:
             return None
 
@@ -137,42 +597,29 @@ class QNAPStats:
 
         return status
 
-    def get_volumes(self):
+    def get_volumes(self, use_cache=True):
         """Obtain information about volumes and shared directories."""
-        resp = self._get_url(
-            "management/chartReq.cgi?chart_func=disk_usage&disk_select=all&include=all",
-            force_list=("volume", "volumeUse", "folder_element")
-        )
+        return self._run_steps(self._volumes_steps(), use_cache)
 
+    def _volumes_steps(self):
+        resp = yield VOLUMES_REQUEST
+        return self._parse_volumes(resp, self._typed_results)
+
+    @staticmethod
+    def _parse_volumes(resp, typed=False):
         if resp is None:
             return None
 
+        if typed:
+            return Volume.from_response(resp)
+
         if resp["volumeList"] is None or resp["volumeUseList"] is None:
             return {}
 
-        volumes = {}
-        id_map = {}
-
-        for vol in resp["volumeList"]["volume"]:
-            key = vol["volumeValue"]
-            label = vol["volumeLabel"] if "volumeLabel" in vol else "Volume " + vol["volumeValue"]
-
-            volumes[label] = {
-                "id": key,
-                "label": label
-            }
-
-            id_map[key] = label
-
-        for vol in resp["volumeUseList"]["volumeUse"]:
-            id_number = vol["volumeValue"]
-
-            # Skip any system reserved volumes
-            if id_number not in id_map:
-                continue
-
-            key = id_map[id_number]
+        labels = volume_labels(resp)
+        volumes = {label: {"id": key, "label": label} for key, label in labels.items()}
 
+        for key, vol in volume_usage(resp, labels):
             volumes[key]["free_size"] = int(vol["free_size"])
             volumes[key]["total_size"] = int(vol["total_size"])
 
@@ -189,13 +636,67 @@ class QNAPStats:
 
         return volumes
 
-    def get_smart_disk_health(self):
+    def iter_volumes(self, chunk_size=16384):
+        """Stream volumes and shared folders without loading the whole response.
+
+        Yields ``("volume", label, info)`` and ``("folder", label, folder)``
+        tuples carrying the same fields as get_volumes(). Raises RequestFailed
+        when logging in or the request fails, as a generator cannot return None.
+        """
+        return self._stream_volumes(chunk_size, self._init_session)
+
+    def _stream_volumes(self, chunk_size, init_session):
+        """Yield the events of the disk usage response, logging in with the blocking ``init_session``."""
+        url = VOLUMES_REQUEST.url
+
+        for retry in (False, True):
+            failure = init_session()
+            if failure is not None:
+                raise self._stream_failed(failure)
+
+            session, sid = self._session_state()
+            self._debuglog("Streaming GET from URL: %s%s", self._base_url, url)
+            resp = session.get(
+                f"{self._base_url}{url}&sid={sid}",
+                timeout=self._timeout, verify=self._verify_ssl, stream=True
+            )
+            try:
+                if resp.status_code != 200:
+                    raise self._stream_failed(http_failure(resp.status_code))
+                if _content_type(resp) != "text/xml":
+                    raise self._stream_failed(NOT_XML)
+                yield from iter_volume_events(resp.iter_content(chunk_size))
+                return
+            except SessionRejected:
+                self._reject_session(sid)
+                if retry:
+                    raise self._stream_failed(SESSION_REJECTED) from None
+                self._debuglog("Session rejected, retrying...")
+            finally:
+                resp.close()
+
+    def _stream_failed(self, failure):
+        """Record why a streaming request failed and return the RequestFailed to raise."""
+        self._failure = failure
+        self._debuglog("Request failed: %s", failure.reason)
+        return RequestFailed(failure)
+
+    def get_smart_disk_health(self, use_cache=True):
         """Obtain SMART information about each disk."""
-        resp = self._get_url("disk/qsmart.cgi?func=all_hd_data", force_list="entry")
+        return self._run_steps(self._smart_disk_health_steps(), use_cache)
+
+    def _smart_disk_health_steps(self):
+        resp = yield SMART_DISK_HEALTH_REQUEST
+        return self._parse_smart_disk_health(resp, self._typed_results)
 
+    @staticmethod
+    def _parse_smart_disk_health(resp, typed=False):
         if resp is None:
             return None
 
+        if typed:
+            return Disk.from_response(resp)
+
         disks = {}
         for disk in resp["Disk_Info"]["entry"]:
             if disk["Model"]:
@@ -212,16 +713,52 @@ class QNAPStats:
 
         return disks
 
-    def get_system_stats(self):
+    def get_smart_disk_attributes(self, drive_number, use_cache=True):
+        """Obtain the SMART attribute table of one disk, keyed by attribute id.
+
+        ``drive_number`` is a key of get_smart_disk_health(), e.g. "0:1".
+        """
+        return self._run_steps(self._smart_disk_attributes_steps(drive_number), use_cache)
+
+    def _smart_disk_attributes_steps(self, drive_number):
+        resp = yield CGIRequest(SMART_ATTRIBUTES_URL + urllib.parse.quote(drive_number), "entry", ("SmartInfo",))
+        return self._parse_smart_disk_attributes(resp)
+
+    @staticmethod
+    def _parse_smart_disk_attributes(resp):
+        if resp is None:
+            return None
+
+        attributes = {}
+        for entry in (resp.get("SmartInfo") or {}).get("entry", []):
+            attributes[int(entry["ID"])] = {
+                "name": entry.get("Name"),
+                "value": int(entry["Value"]) if entry.get("Value") else None,
+                "worst": int(entry["Worst"]) if entry.get("Worst") else None,
+                "threshold": int(entry["Threshold"]) if entry.get("Threshold") else None,
+                "raw": entry.get("Raw"),
+                "status": entry.get("Status"),
+            }
+
+        return attributes
+
+    def get_system_stats(self, use_cache=True):
         """Obtain core system information and resource utilization."""
-        resp = self._get_url(
-            "management/manaRequest.cgi?subfunc=sysinfo&hd=no&multicpu=1",
-            force_list=("DNS_LIST")
-        )
+        return self._run_steps(self._system_stats_steps(), use_cache)
 
+    def _system_stats_steps(self):
+        resp = yield SYSTEM_STATS_REQUEST
+        self._note_firmware(resp)
+        return self._parse_system_stats(resp, self._typed_results)
+
+    @staticmethod
+    def _parse_system_stats(resp, typed=False):
         if resp is None:
             return None
 
+        if typed:
+            return SystemStats.from_response(resp)
+
         root = resp["func"]["ownContent"]["root"]
 
         details = {
@@ -276,7 +813,7 @@ class QNAPStats:
                 "tx_packets": int(root["tx_packet" + i]),
                 "err_packets": int(root["err_packet" + i])
             }
-            
+
         sysfan_count = int(root["sysfan_count"])
         for sysfan_index in range(sysfan_count):
             i = str(sysfan_index + 1)
@@ -285,7 +822,6 @@ class QNAPStats:
                 "speed": int(root["sysfan" + i]),
                 "status": "alert" if int(root["sysfan" + i + "_stat"]) == -1 else "ok"
             }
-        
 
         dnsInfo = root.get("dnsInfo")
         if dnsInfo:
@@ -294,40 +830,36 @@ class QNAPStats:
 
         return details
 
-    def get_bandwidth(self):
+    def get_bandwidth(self, use_cache=True):
         """Obtain the current bandwidth usage speeds."""
-        resp = self._get_url(
-            "management/chartReq.cgi?chart_func=QSM40bandwidth",
-            force_list="item"
-        )
+        return self._run_steps(self._bandwidth_steps(), use_cache)
+
+    def _bandwidth_steps(self):
+        resp = None
+        if self._capabilities.get("bandwidth") != "bandwidth":
+            resp = yield QSM40_BANDWIDTH_REQUEST
+            self._note_bandwidth_chart(resp)
+
+        if self._capabilities.get("bandwidth") == "bandwidth":
+            resp = yield BANDWIDTH_REQUEST
+
+        return self._parse_bandwidth(resp, self._typed_results)
 
-        if resp and "bandwidth_info" not in resp:
-            # changes in API since QTS 4.5.4, old query returns no values
-            resp = self._get_url("management/chartReq.cgi?chart_func=bandwidth")
+    def _note_bandwidth_chart(self, resp):
+        """Remember which chart returns bandwidth_info, judging from a QSM40bandwidth response."""
+        if resp:
+            self._capabilities.set("bandwidth", "QSM40bandwidth" if "bandwidth_info" in resp else "bandwidth")
 
+    @staticmethod
+    def _parse_bandwidth(resp, typed=False):
         if resp is None:
             return None
 
-        details = {}
-        interfaces = []
-        bandwidth_info = resp["bandwidth_info"]
-
-        default = resp.get("df_gateway") or bandwidth_info.get("df_gateway")
+        if typed:
+            return BandwidthInterface.from_response(resp)
 
-        if "item" in bandwidth_info:
-            interfaces.extend(bandwidth_info["item"])
-        else:
-            interfaceIds = []
-            if bandwidth_info["eth_index_list"]:
-                for num in bandwidth_info["eth_index_list"].split(','):
-                    interfaceIds.append("eth" + num)
-            if bandwidth_info["wlan_index_list"]:
-                for num in bandwidth_info["wlan_index_list"].split(','):
-                    interfaceIds.append("wlan" + num)
-            for interfaceId in interfaceIds:
-                interface = bandwidth_info[interfaceId]
-                interface["id"] = interfaceId
-                interfaces.extend([interface])
+        details = {}
+        interfaces, default = bandwidth_interfaces(resp)
 
         for item in interfaces:
             details[item["id"]] = {
@@ -339,9 +871,16 @@ class QNAPStats:
 
         return details
 
-    def get_firmware_update(self):
+    def get_firmware_update(self, use_cache=True):
         """Get firmware update version if available."""
-        resp = self._get_url("sys/sysRequest.cgi?subfunc=firm_update")
+        return self._run_steps(self._firmware_update_steps(), use_cache)
+
+    def _firmware_update_steps(self):
+        resp = yield FIRMWARE_UPDATE_REQUEST
+        return self._parse_firmware_update(resp)
+
+    @staticmethod
+    def _parse_firmware_update(resp):
         if resp is None:
             return None
 
@@ -353,26 +892,102 @@ class QNAPStats:
 
     def list_external_drive(self):
         """List External drive connected on qnap."""
-        data = {"func": "getExternalDev"}
-        resp = self._execute_post_url("devices/devRequest.cgi", data=data)
-        if resp is None:
-            return None
+        return self._listed(self.get_external_drive_listing())
 
-        external_drives = resp.get("func", {}).get("ownContent", {}).get("externalDevice")
-        if external_drives is None or len(external_drives) == 0:
+    @staticmethod
+    def _listed(listing):
+        """Return the data of a Listing, or None if the request failed or nothing is listed."""
+        if listing is None or not listing.data:
             return None
 
-        return external_drives
+        return listing.data
+
+    def get_external_drive_listing(self):
+        """Return the external drives as a Listing, or None if the request failed."""
+        resp = self._post_url("devices/devRequest.cgi", {"func": "getExternalDev"}, digest=True)
+        return None if resp is None else Listing(resp.digest, external_devices(resp.data))
 
     def get_storage_information_on_external_device(self):
         """Get informations on volumes in External drive connected on qnap."""
-        data = {"func": "external_get_all"}
-        resp = self._execute_post_url("disk/disk_manage.cgi", data=data)
+        return self._listed(self.get_external_storage_listing())
+
+    def get_external_storage_listing(self):
+        """Return the volumes of external drives as a Listing, or None if the request failed."""
+        resp = self._post_url("disk/disk_manage.cgi", {"func": "external_get_all"}, digest=True)
+        return None if resp is None else Listing(resp.digest, resp.data.get("Disk_Vol"))
+
+    def get_snapshot(self, sections=SNAPSHOT_SECTIONS, use_cache=True):
+        """Fetch several metric sections concurrently and return them as a Snapshot.
+
+        System stats and health are served by one sysinfo request when the
+        firmware supports it.
+        """
+        self._init_session()
+
+        tasks = self._snapshot_tasks(sections)
+        result = {}
+        with concurrent_futures.ThreadPoolExecutor(max_workers=len(tasks) or 1) as executor:
+            for sections_done in executor.map(lambda steps: self._run_steps(steps, use_cache), tasks):
+                result.update(sections_done)
+
+        return Snapshot(**result)
+
+    def _snapshot_tasks(self, sections):
+        """Return the steps of a snapshot that can run concurrently, each giving a dict of SnapshotSections."""
+        tasks = []
+        if "system_stats" in sections or "system_health" in sections:
+            tasks.append(self._snapshot_sysinfo_steps(sections))
+        for section in sections:
+            if section not in ("system_stats", "system_health"):
+                tasks.append(self._snapshot_section_steps(section))
+
+        return tasks
+
+    def _snapshot_section_steps(self, section):
+        data = yield from getattr(self, f"_{section}_steps")()
+        return {section: SnapshotSection(data, time.time())}
+
+    def _snapshot_sysinfo_steps(self, sections):
+        wanted = [section for section in ("system_stats", "system_health") if section in sections]
+        result = {}
+
+        if len(wanted) == 2 and self._capabilities.get("combined_sysinfo") is not False:
+            resp = yield COMBINED_SYSINFO_REQUEST
+            result = self._split_sysinfo(resp)
+
+        for section in wanted:
+            if section not in result:
+                result.update((yield from self._snapshot_section_steps(section)))
+
+        return result
+
+    def _split_sysinfo(self, resp):
+        """Extract the stats and health sections from a combined sysinfo response."""
+        timestamp = time.time()
         if resp is None:
-            return None
+            # A failed request tells nothing about the firmware, and the NAS is not asked twice more
+            return {section: SnapshotSection(None, timestamp) for section in ("system_stats", "system_health")}
 
-        disk_vol = resp.get("Disk_Vol")
-        if disk_vol is None or len(disk_vol) == 0:
-            return None
+        own_content = (resp.get("func") or {}).get("ownContent") or {}
+
+        result = {}
+        self._note_firmware(resp)
+        if "root" in own_content:
+            result["system_stats"] = SnapshotSection(self._parse_system_stats(resp, self._typed_results), timestamp)
+        if "sysHealth" in own_content:
+            result["system_health"] = SnapshotSection(self._parse_system_health(resp), timestamp)
+
+        # Remember whether this firmware can serve both at once
+        self._capabilities.set("combined_sysinfo", len(result) == 2)
+
+        return result
+
+    def _note_firmware(self, resp):
+        """Invalidate the learned capabilities when a sysinfo response reports a new firmware."""
+        firmware = (resp or {}).get("firmware")
+        if not firmware:
+            return
 
-        return disk_vol
+        version = f"{firmware.get('version')} build {firmware.get('build')}"
+        if self._capabilities.firmware_seen(version):
+            self._debuglog("Firmware changed to %s, probing capabilities again", version)
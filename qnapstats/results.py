@@ -0,0 +1,411 @@
+"""Module containing compact result objects whose fields are converted lazily."""
+# -*- coding:utf-8 -*-
+
+
+class Field:  # pylint: disable=too-few-public-methods
+    """Attribute of a Result holding a raw value that is converted when read.
+
+    ``convert`` is applied to the stored value on every access (None stays
+    None); ``section`` and ``key`` place the value in the output of to_dict().
+    """
+
+    def __init__(self, convert=None, section=None, key=None):
+        """Instantiate a field."""
+        self.convert = convert
+        self.section = section
+        self.key = key
+        self.name = None
+        self.slot = None
+
+    def __set_name__(self, owner, name):
+        """Remember the attribute name; the raw value lives in the slot of the same name prefixed by _."""
+        self.name = name
+        self.slot = "_" + name
+        if self.key is None:
+            self.key = name
+
+    def __get__(self, instance, owner):
+        """Return the converted value, or None when the NAS did not report it."""
+        if instance is None:
+            return self
+        value = getattr(instance, self.slot, None)
+        if value is None or self.convert is None:
+            return value
+        return self.convert(value)
+
+
+_ABSENT = object()
+
+
+class Result:
+    """Base class of the typed results returned when ``typed_results`` is enabled.
+
+    Subclasses declare their Fields as class attributes, and in ``__slots__``
+    one slot per field holding its raw value, named after it with a leading _.
+    """
+
+    __slots__ = ()
+    FIELDS = ()
+
+    def __init_subclass__(cls, **kwargs):
+        """Collect the Fields of a subclass, in the order they are declared."""
+        super().__init_subclass__(**kwargs)
+        cls.FIELDS = cls.FIELDS + tuple(value for value in vars(cls).values() if isinstance(value, Field))
+
+    def __init__(self, **values):
+        """Store raw values by field name; fields that are not passed are absent from to_dict()."""
+        for name, value in values.items():
+            if not isinstance(getattr(type(self), name, None), Field):
+                raise TypeError(f"{type(self).__name__}() got an unexpected keyword argument {name!r}")
+            setattr(self, "_" + name, value)
+
+    def to_dict(self):
+        """Convert every field and return the same nested dicts as the untyped getters."""
+        result = {}
+        for field in self.FIELDS:
+            value = getattr(self, field.slot, _ABSENT)
+            if value is _ABSENT:
+                continue
+
+            if value is not None:
+                if field.convert is not None:
+                    value = field.convert(value)
+                elif not isinstance(value, str):
+                    value = to_plain(value)
+
+            if field.section is None:
+                result[field.key] = value
+            else:
+                result.setdefault(field.section, {})[field.key] = value
+
+        return result
+
+    def __eq__(self, other):
+        """Compare the raw values of two results of the same type."""
+        if type(self) is not type(other):  # pylint: disable=unidiomatic-typecheck
+            return NotImplemented
+        return all(getattr(self, field.slot, None) == getattr(other, field.slot, None) for field in self.FIELDS)
+
+    __hash__ = None
+
+    def __repr__(self):
+        """Show the converted fields."""
+        fields = ", ".join(
+            f"{field.name}={getattr(self, field.name)!r}" for field in self.FIELDS if hasattr(self, field.slot)
+        )
+        return f"{type(self).__name__}({fields})"
+
+
+def to_plain(value):
+    """Return a getter result with every Result in it replaced by its to_dict(), so typed and untyped results match."""
+    if isinstance(value, Result):
+        return value.to_dict()
+    if isinstance(value, dict):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_plain(item) for item in value]
+    return value
+
+
+def _percent(value):
+    return float(value.replace("%", ""))
+
+
+def _link_status(value):
+    return "Up" if value == "1" else "Down"
+
+
+def _fan_status(value):
+    return "alert" if int(value) == -1 else "ok"
+
+
+def _disk_type(value):
+    return "ssd" if int(value) else "hdd"
+
+
+def _per_second(value):
+    # The NAS reports the bytes transferred over its 5 second sampling period
+    return round(int(value) / 5)
+
+
+class Nic(Result):  # pylint: disable=too-few-public-methods
+    """Status and packet counters of a network interface."""
+
+    __slots__ = (
+        "_link_status", "_max_speed", "_ip", "_mask", "_mac", "_usage", "_rx_packets", "_tx_packets", "_err_packets"
+    )
+
+    link_status = Field(_link_status)
+    max_speed = Field(int)
+    ip = Field()
+    mask = Field()
+    mac = Field()
+    usage = Field()
+    rx_packets = Field(int)
+    tx_packets = Field(int)
+    err_packets = Field(int)
+
+
+class SysFan(Result):  # pylint: disable=too-few-public-methods
+    """Speed and status of a system fan."""
+
+    __slots__ = ("_speed", "_status")
+
+    speed = Field(int)
+    status = Field(_fan_status)
+
+
+class SystemStats(Result):
+    """Core system information and resource utilization."""
+
+    __slots__ = (
+        "_name", "_model", "_serial_number", "_temp_c", "_temp_f", "_timezone", "_firmware_version", "_firmware_build",
+        "_firmware_patch", "_firmware_build_time", "_uptime_days", "_uptime_hours", "_uptime_minutes",
+        "_uptime_seconds", "_cpu_model", "_cpu_usage_percent", "_cpu_temp_c", "_cpu_temp_f", "_memory_total",
+        "_memory_free", "_nics", "_dns", "_sysfans"
+    )
+
+    name = Field(section="system")
+    model = Field(section="system")
+    serial_number = Field(section="system")
+    temp_c = Field(int, section="system")
+    temp_f = Field(int, section="system")
+    timezone = Field(section="system")
+
+    firmware_version = Field(section="firmware", key="version")
+    firmware_build = Field(section="firmware", key="build")
+    firmware_patch = Field(section="firmware", key="patch")
+    firmware_build_time = Field(section="firmware", key="build_time")
+
+    uptime_days = Field(int, section="uptime", key="days")
+    uptime_hours = Field(int, section="uptime", key="hours")
+    uptime_minutes = Field(int, section="uptime", key="minutes")
+    uptime_seconds = Field(int, section="uptime", key="seconds")
+
+    cpu_model = Field(section="cpu", key="model")
+    cpu_usage_percent = Field(_percent, section="cpu", key="usage_percent")
+    cpu_temp_c = Field(int, section="cpu", key="temp_c")
+    cpu_temp_f = Field(int, section="cpu", key="temp_f")
+
+    memory_total = Field(float, section="memory", key="total")
+    memory_free = Field(float, section="memory", key="free")
+
+    nics = Field()
+    dns = Field()
+    sysfans = Field()
+
+    @classmethod
+    def from_response(cls, resp):
+        """Build the result from a parsed sysinfo response."""
+        root = resp["func"]["ownContent"]["root"]
+        firmware = resp["firmware"]
+
+        nics = {}
+        for nic_index in range(int(root["nic_cnt"])):
+            i = str(nic_index + 1)
+            nics["eth" + str(nic_index)] = Nic(
+                link_status=root["eth_status" + i],
+                max_speed=root["eth_max_speed" + i],
+                ip=root["eth_ip" + i],
+                mask=root["eth_mask" + i],
+                mac=root["eth_mac" + i],
+                usage=root["eth_usage" + i],
+                rx_packets=root["rx_packet" + i],
+                tx_packets=root["tx_packet" + i],
+                err_packets=root["err_packet" + i],
+            )
+
+        sysfans = {}
+        for sysfan_index in range(int(root["sysfan_count"])):
+            i = str(sysfan_index + 1)
+            sysfans["sysfan" + str(sysfan_index)] = SysFan(
+                speed=root["sysfan" + i], status=root["sysfan" + i + "_stat"]
+            )
+
+        dns_info = root.get("dnsInfo")
+
+        return cls(
+            name=root["server_name"],
+            model=resp["model"]["displayModelName"],
+            serial_number=root["serial_number"],
+            temp_c=root["sys_tempc"],
+            temp_f=root["sys_tempf"],
+            timezone=root["timezone"],
+            firmware_version=firmware["version"],
+            firmware_build=firmware["build"],
+            firmware_patch=firmware["patch"],
+            firmware_build_time=firmware["buildTime"],
+            uptime_days=root["uptime_day"],
+            uptime_hours=root["uptime_hour"],
+            uptime_minutes=root["uptime_min"],
+            uptime_seconds=root["uptime_sec"],
+            cpu_model=root.get("cpu_model"),
+            cpu_usage_percent=root["cpu_usage"],
+            cpu_temp_c=root.get("cpu_tempc"),
+            cpu_temp_f=root.get("cpu_tempf"),
+            memory_total=root["total_memory"],
+            memory_free=root["free_memory"],
+            nics=nics,
+            dns=list(dns_info["DNS_LIST"]) if dns_info else [],
+            sysfans=sysfans,
+        )
+
+
+class Folder(Result):  # pylint: disable=too-few-public-methods
+    """A shared folder and the space it uses."""
+
+    __slots__ = ("_sharename", "_used_size")
+
+    sharename = Field()
+    used_size = Field(int)
+
+
+class Volume(Result):
+    """A volume, its free and total size and its shared folders."""
+
+    __slots__ = ("_id", "_label", "_free_size", "_total_size", "_folders")
+
+    id = Field()
+    label = Field()
+    free_size = Field(int)
+    total_size = Field(int)
+    folders = Field()
+
+    @classmethod
+    def from_response(cls, resp):
+        """Build a dict of volumes, keyed by label, from a parsed disk_usage response."""
+        if resp["volumeList"] is None or resp["volumeUseList"] is None:
+            return {}
+
+        labels = volume_labels(resp)
+        volumes = {label: {"id": key, "label": label} for key, label in labels.items()}
+
+        for label, vol in volume_usage(resp, labels):
+            raw = volumes[label]
+            raw["free_size"] = vol["free_size"]
+            raw["total_size"] = vol["total_size"]
+
+            folder_elements = vol["folder_element"]
+            if len(folder_elements) > 0:
+                raw["folders"] = []
+                for folder in folder_elements:
+                    try:
+                        sharename, used_size = folder["sharename"], folder["used_size"]
+                        # Checked here as Folder only converts it when read; get_volumes() skips such folders too
+                        int(used_size)
+                    except (KeyError, TypeError, ValueError):
+                        continue
+                    raw["folders"].append(Folder(sharename=sharename, used_size=used_size))
+
+        return {label: cls(**raw) for label, raw in volumes.items()}
+
+
+class Disk(Result):
+    """SMART summary of a disk."""
+
+    __slots__ = ("_drive_number", "_health", "_temp_c", "_temp_f", "_capacity", "_model", "_serial", "_type")
+
+    drive_number = Field()
+    health = Field()
+    temp_c = Field(int)
+    temp_f = Field(int)
+    capacity = Field()
+    model = Field()
+    serial = Field()
+    type = Field(_disk_type)
+
+    @classmethod
+    def from_response(cls, resp):
+        """Build a dict of disks, keyed by drive number, from a parsed qsmart response."""
+        disks = {}
+        for disk in resp["Disk_Info"]["entry"]:
+            if disk["Model"]:
+                disks[disk["HDNo"]] = cls(
+                    drive_number=disk["HDNo"],
+                    health=disk["Health"],
+                    temp_c=disk["Temperature"]["oC"],
+                    temp_f=disk["Temperature"]["oF"],
+                    capacity=disk["Capacity"],
+                    model=disk["Model"],
+                    serial=disk["Serial"],
+                    type=disk.get("hd_is_ssd") or "0",
+                )
+
+        return disks
+
+
+class BandwidthInterface(Result):
+    """Current receive and transmit speed of a network interface, in bytes per second."""
+
+    __slots__ = ("_name", "_rx", "_tx", "_is_default")
+
+    name = Field()
+    rx = Field(_per_second)
+    tx = Field(_per_second)
+    is_default = Field()
+
+    @classmethod
+    def from_response(cls, resp):
+        """Build a dict of interfaces, keyed by interface id, from a parsed bandwidth response."""
+        interfaces, default = bandwidth_interfaces(resp)
+
+        return {
+            item["id"]: cls(
+                name=item["dname"] if "dname" in item else item["name"],
+                rx=item["rx"],
+                tx=item["tx"],
+                is_default=item["id"] == default,
+            )
+            for item in interfaces
+        }
+
+
+def volume_labels(resp):
+    """Map the id of each volume in a disk_usage response to its label."""
+    labels = {}
+    for vol in resp["volumeList"]["volume"]:
+        labels[vol["volumeValue"]] = vol["volumeLabel"] if "volumeLabel" in vol else "Volume " + vol["volumeValue"]
+    return labels
+
+
+def volume_usage(resp, labels):
+    """Yield the label and usage entry of each volume of a disk_usage response.
+
+    ``labels`` maps volume ids to labels, as returned by volume_labels().
+    """
+    for vol in resp["volumeUseList"]["volumeUse"]:
+        # Skip any system reserved volumes
+        if vol["volumeValue"] in labels:
+            yield labels[vol["volumeValue"]], vol
+
+
+def bandwidth_interfaces(resp):
+    """Return the interface entries of a bandwidth response, each with its "id", and the default one's id."""
+    interfaces = []
+    bandwidth_info = resp["bandwidth_info"]
+
+    default = resp.get("df_gateway") or bandwidth_info.get("df_gateway")
+
+    if "item" in bandwidth_info:
+        interfaces.extend(bandwidth_info["item"])
+    else:
+        interface_ids = []
+        if bandwidth_info["eth_index_list"]:
+            for num in bandwidth_info["eth_index_list"].split(','):
+                interface_ids.append("eth" + num)
+        if bandwidth_info["wlan_index_list"]:
+            for num in bandwidth_info["wlan_index_list"].split(','):
+                interface_ids.append("wlan" + num)
+        for interface_id in interface_ids:
+            # Copy so the cached response is left untouched
+            interface = dict(bandwidth_info[interface_id])
+            interface["id"] = interface_id
+            interfaces.append(interface)
+
+    return interfaces, default
+
+
+def external_devices(resp):
+    """Return the externalDevice element of a getExternalDev response, or None when no device is attached."""
+    own_content = (resp.get("func") or {}).get("ownContent") or {}
+    return own_content.get("externalDevice")
@@ -0,0 +1,188 @@
+"""Module containing the retry policy and circuit breaker used for CGI requests."""
+# -*- coding:utf-8 -*-
+import collections
+import random
+import threading
+import time
+
+from .lazy import LazyModule
+
+requests = LazyModule("requests")
+
+Failure = collections.namedtuple("Failure", ["reason", "retryable", "status", "exception"])
+Failure.__doc__ = """Why a request produced no result.
+
+``reason`` is one of "session" (the NAS rejected the SID), "login" (the
+credentials were refused), "http" (unexpected status), "response" (neither an
+XML nor a JSON document), "timeout", "connection" or "ssl". ``status`` is the HTTP
+status, if any, and ``exception`` the exception raised by the transport, if any.
+"""
+
+
+class RequestFailed(Exception):
+    """Raised by streaming methods, which cannot return None, when a request fails."""
+
+    def __init__(self, failure):
+        """Instantiate the error for a Failure, kept as ``failure``."""
+        super().__init__(f"Request failed: {failure.reason}")
+        self.failure = failure
+
+
+class TransportError(OSError):
+    """Raised by LiteSession when a request fails on the network."""
+
+
+class TransportTimeout(TransportError):
+    """Raised by LiteSession when the NAS does not answer in time."""
+
+
+class TransportSSLError(TransportError):
+    """Raised by LiteSession when the TLS handshake or certificate check fails."""
+
+
+# Statuses worth retrying: the NAS is busy or a proxy in front of it gave up
+RETRYABLE_STATUSES = (408, 429, 500, 502, 503, 504)
+
+
+def http_failure(status):
+    """Classify an unexpected HTTP status."""
+    return Failure("http", status in RETRYABLE_STATUSES, status, None)
+
+
+def exception_failure(exception):  # pylint: disable=too-many-return-statements
+    """Classify an exception raised by requests or LiteSession; certificate errors are fatal."""
+    if isinstance(exception, TransportSSLError):
+        return Failure("ssl", False, None, exception)
+    if isinstance(exception, TransportTimeout):
+        return Failure("timeout", True, None, exception)
+    if isinstance(exception, TransportError):
+        return Failure("connection", True, None, exception)
+
+    if isinstance(exception, requests.exceptions.SSLError):
+        return Failure("ssl", False, None, exception)
+    if isinstance(exception, requests.exceptions.Timeout):
+        return Failure("timeout", True, None, exception)
+    if isinstance(exception, requests.exceptions.ConnectionError):
+        return Failure("connection", True, None, exception)
+
+    return Failure("connection", False, None, exception)
+
+
+SESSION_REJECTED = Failure("session", True, 200, None)
+LOGIN_REFUSED = Failure("login", False, 200, None)
+NOT_XML = Failure("response", False, 200, None)
+
+
+class RetryPolicy:  # pylint: disable=too-few-public-methods
+    """How often and how patiently failed requests are retried.
+
+    A rejected SID is retried at once after logging in again. Other retryable
+    failures wait ``backoff * 2 ** (retry - 1)`` seconds, capped at
+    ``max_backoff``; with ``jitter`` the wait is drawn uniformly between zero
+    and that value so many clients don't retry in lockstep.
+    """
+
+    def __init__(self, attempts=2, backoff=0.5, max_backoff=30, jitter=True):
+        """Instantiate a policy making at most ``attempts`` attempts per request."""
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+
+    def delay(self, retry, failure):
+        """Return the seconds to wait before the ``retry``-th retry (1-based) after ``failure``."""
+        if failure.reason == "session":
+            return 0
+
+        delay = min(self.max_backoff, self.backoff * 2 ** (retry - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+
+        return delay
+
+
+# pylint: disable=too-many-instance-attributes
+class CircuitBreaker:
+    """Stop sending requests to a failing NAS for a cooldown period.
+
+    After ``failure_threshold`` consecutive failed requests the breaker opens
+    and requests are refused for ``cooldown`` seconds. It then lets a single
+    trial request through ("half_open"): success closes it again, failure
+    reopens it for another cooldown.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, cooldown=60):
+        """Instantiate a closed breaker."""
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._trips = 0
+        self._last_failure = None  # type: Failure
+
+    @property
+    def state(self):
+        """The current state: "closed", "open" or "half_open"."""
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+            return self.HALF_OPEN
+        return self._state
+
+    def allow(self):
+        """Return whether a request may be sent now."""
+        with self._lock:
+            state = self._current_state()
+            if state == self.HALF_OPEN and self._state == self.OPEN:
+                # Let exactly one trial request through
+                self._state = self.HALF_OPEN
+                return True
+
+            return state == self.CLOSED
+
+    def record_success(self):
+        """Record a successful request, closing the breaker."""
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self, failure=None):
+        """Record a failed request, opening the breaker once the threshold is reached."""
+        with self._lock:
+            self._failures += 1
+            self._last_failure = failure
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._trips += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def reset(self):
+        """Close the breaker and forget all failures."""
+        self.record_success()
+
+    def stats(self):
+        """Return the breaker's state as a dict, for monitoring."""
+        with self._lock:
+            state = self._current_state()
+            retry_in = None
+            if self._state == self.OPEN:
+                retry_in = max(self.cooldown - (time.monotonic() - self._opened_at), 0)
+
+            return {
+                "state": state,
+                "failures": self._failures,
+                "trips": self._trips,
+                "retry_in": retry_in,
+                "last_failure": self._last_failure.reason if self._last_failure is not None else None,
+            }
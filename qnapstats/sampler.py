@@ -0,0 +1,216 @@
+"""Module for sampling QNAP metrics over time and deriving rates from counters."""
+# -*- coding:utf-8 -*-
+import abc
+import array
+import threading
+import time
+
+from .results import to_plain
+
+# Cumulative NIC counters reported by get_system_stats, turned into per-second rates
+NIC_COUNTERS = ("rx_packets", "tx_packets", "err_packets")
+
+
+class RingBuffer:
+    """Fixed-size circular buffer of numbers backed by an array."""
+
+    def __init__(self, size, typecode="d"):
+        """Instantiate a buffer holding the last ``size`` values."""
+        self._values = array.array(typecode, bytes(array.array(typecode).itemsize * size))
+        self._size = size
+        self._count = 0
+        self._next = 0
+
+    def append(self, value):
+        """Add a value, overwriting the oldest one once the buffer is full."""
+        self._values[self._next] = value
+        self._next = (self._next + 1) % self._size
+        self._count = min(self._count + 1, self._size)
+
+    def values(self, window=None):
+        """Return the stored values, oldest first, optionally only the last ``window`` ones."""
+        if self._count < self._size:
+            values = self._values[:self._count].tolist()
+        else:
+            values = (self._values[self._next:] + self._values[:self._next]).tolist()
+
+        if window is not None:
+            values = values[-window:]
+
+        return values
+
+    def last(self):
+        """Return the most recent value, or None when empty."""
+        if self._count == 0:
+            return None
+
+        return self._values[self._next - 1]
+
+    def mean(self, window=None):
+        """Return the average of the last ``window`` values (all by default), or None when empty."""
+        values = self.values(window)
+        if not values:
+            return None
+
+        return sum(values) / len(values)
+
+    def percentile(self, percent, window=None):
+        """Return the value below which ``percent`` percent of the values fall, or None when empty."""
+        values = sorted(self.values(window))
+        if not values:
+            return None
+
+        rank = (len(values) - 1) * percent / 100.0
+        lower = int(rank)
+        upper = min(lower + 1, len(values) - 1)
+
+        return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+    def __len__(self):
+        """Return the number of stored values."""
+        return self._count
+
+
+class BackgroundPoller(abc.ABC):
+    """Base of the classes polling a NAS from a background thread, which run ``_run()`` until ``_stop`` is set."""
+
+    thread_name = "qnapstats-poller"
+
+    def __init__(self):
+        """Instantiate a poller whose thread is not started yet."""
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Start polling in a background thread."""
+        if self._thread is not None:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread started by start()."""
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    @abc.abstractmethod
+    def _run(self):
+        """Poll until ``_stop`` is set; runs in the thread started by start()."""
+
+
+# pylint: disable=too-many-instance-attributes
+class Sampler(BackgroundPoller):
+    """Poll a QNAPStats client periodically and keep a ring buffer per metric.
+
+    NIC packet counters are stored as per-second rates; CPU usage, free memory,
+    temperatures and bandwidth are stored as-is.
+    """
+
+    thread_name = "qnapstats-sampler"
+
+    def __init__(self, qnap, interval=10, size=360, bandwidth=True):
+        """Instantiate a sampler keeping ``size`` samples taken every ``interval`` seconds."""
+        super().__init__()
+        self._qnap = qnap
+        self._interval = interval
+        self._size = size
+        self._bandwidth = bandwidth
+
+        self._series = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def sample(self, timestamp=None):
+        """Take one sample now and record it; returns False if the NAS did not answer."""
+        # Typed results are sampled through the dicts they convert to
+        stats = to_plain(self._qnap.get_system_stats())
+        bandwidth = to_plain(self._qnap.get_bandwidth()) if self._bandwidth else None
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        if stats is None:
+            return False
+
+        with self._lock:
+            self._record("cpu.usage_percent", stats["cpu"]["usage_percent"])
+            self._record("memory.free", stats["memory"]["free"])
+            self._record("system.temp_c", stats["system"]["temp_c"])
+            if stats["cpu"]["temp_c"] is not None:
+                self._record("cpu.temp_c", stats["cpu"]["temp_c"])
+
+            for interface, nic in stats["nics"].items():
+                for counter in NIC_COUNTERS:
+                    self._record_counter(f"nics.{interface}.{counter}", nic[counter], timestamp)
+
+            for interface, usage in (bandwidth or {}).items():
+                self._record(f"bandwidth.{interface}.rx", usage["rx"])
+                self._record(f"bandwidth.{interface}.tx", usage["tx"])
+
+        return True
+
+    def _record(self, name, value):
+        series = self._series.get(name)
+        if series is None:
+            series = self._series[name] = RingBuffer(self._size)
+        series.append(value)
+
+    def _record_counter(self, name, value, timestamp):
+        previous = self._counters.get(name)
+        self._counters[name] = (value, timestamp)
+        if previous is None:
+            return
+
+        elapsed = timestamp - previous[1]
+        # A counter going backwards means the NAS rebooted or the NIC was reset
+        if elapsed <= 0 or value < previous[0]:
+            return
+
+        self._record(name, (value - previous[0]) / elapsed)
+
+    def metrics(self):
+        """Return the names of all recorded metrics."""
+        with self._lock:
+            return sorted(self._series)
+
+    def series(self, name, window=None):
+        """Return the recorded values of a metric, oldest first."""
+        with self._lock:
+            series = self._series.get(name)
+            return series.values(window) if series is not None else []
+
+    def last(self, name):
+        """Return the latest value (or rate) of a metric, or None."""
+        with self._lock:
+            series = self._series.get(name)
+            return series.last() if series is not None else None
+
+    def moving_average(self, name, window=None):
+        """Return the average of a metric over its last ``window`` samples, or None."""
+        with self._lock:
+            series = self._series.get(name)
+            return series.mean(window) if series is not None else None
+
+    def percentile(self, name, percent, window=None):
+        """Return the ``percent``-th percentile of a metric over its last ``window`` samples, or None."""
+        with self._lock:
+            series = self._series.get(name)
+            return series.percentile(percent, window) if series is not None else None
+
+    def _run(self):
+        next_run = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except Exception:  # pylint: disable=broad-except
+                # A failed poll only leaves a gap in the series
+                pass
+
+            # Keep a steady cadence regardless of how long the poll took
+            next_run += self._interval
+            self._stop.wait(max(next_run - time.monotonic(), 0))
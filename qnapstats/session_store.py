@@ -0,0 +1,88 @@
+"""Module containing stores that persist QNAP session ids between clients."""
+# -*- coding:utf-8 -*-
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class MemorySessionStore:
+    """Keep session ids in memory, shared by every client using this store."""
+
+    def __init__(self):
+        """Instantiate a new in-memory store."""
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the stored session id for the key, or None if missing or expired."""
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is None:
+                return None
+
+            if entry["expires"] <= time.time():
+                del self._sessions[key]
+                return None
+
+            return entry["sid"]
+
+    def set(self, key, sid, ttl):
+        """Store a session id that stays valid for ``ttl`` seconds."""
+        with self._lock:
+            self._sessions[key] = {"sid": sid, "expires": time.time() + ttl}
+
+    def delete(self, key):
+        """Forget the session id for the key."""
+        with self._lock:
+            self._sessions.pop(key, None)
+
+
+class FileSessionStore(MemorySessionStore):
+    """Persist session ids to a JSON file so they survive process restarts."""
+
+    def __init__(self, path):
+        """Instantiate a new store backed by the file at ``path``."""
+        super().__init__()
+        self._path = path
+
+    def _load(self):
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                self._sessions = json.load(f)
+        except (OSError, ValueError):
+            self._sessions = {}
+
+    def _save(self):
+        # Write to a temporary file and swap it in so readers never see a partial file
+        directory = os.path.dirname(os.path.abspath(self._path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".qnapstats-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._sessions, f)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self._path)
+        except OSError:
+            os.unlink(tmp_path)
+            raise
+
+    def get(self, key):
+        """Return the stored session id for the key, or None if missing or expired."""
+        with self._lock:
+            self._load()
+        return super().get(key)
+
+    def set(self, key, sid, ttl):
+        """Store a session id that stays valid for ``ttl`` seconds."""
+        with self._lock:
+            self._load()
+            self._sessions[key] = {"sid": sid, "expires": time.time() + ttl}
+            self._save()
+
+    def delete(self, key):
+        """Forget the session id for the key."""
+        with self._lock:
+            self._load()
+            if self._sessions.pop(key, None) is not None:
+                self._save()
@@ -0,0 +1,317 @@
+"""Module containing a local HTTP server that replays recorded QTS responses.
+
+Useful as a realistic load-testing and benchmarking target without hardware::
+
+    python -m qnapstats.simulator tests/responses/TS-451-4.2.2 --port 8080 --count 100 --latency 0.05
+"""
+# -*- coding:utf-8 -*-
+import argparse
+import base64
+import http.server
+import json
+import os
+import random
+import re
+import secrets
+import socketserver
+import sys
+import threading
+import time
+import urllib.parse
+
+import xmltodict
+
+# (CGI path, query without the SID) -> recorded response served for it
+ROUTES = {
+    ("management/manaRequest.cgi", "subfunc=sysinfo&hd=no&multicpu=1"): "systemstats.xml",
+    ("management/manaRequest.cgi", "subfunc=sysinfo&sysHealth=1"): "systemhealth.xml",
+    # Answered like a firmware that ignores sysHealth=1 and returns the stats only
+    ("management/manaRequest.cgi", "subfunc=sysinfo&hd=no&multicpu=1&sysHealth=1"): "systemstats.xml",
+    ("management/chartReq.cgi", "chart_func=disk_usage&disk_select=all&include=all"): "volumes.xml",
+    ("management/chartReq.cgi", "chart_func=QSM40bandwidth"): "bandwidth.xml",
+    ("management/chartReq.cgi", "chart_func=bandwidth"): "bandwidth2.xml",
+    ("disk/qsmart.cgi", "func=all_hd_data"): "smartdiskhealth.xml",
+    ("sys/sysRequest.cgi", "subfunc=firm_update"): "firmwareupdate.xml",
+    ("devices/devRequest.cgi", "func=getExternalDev"): "externaldrive.xml",
+    ("disk/disk_manage.cgi", "func=external_get_all"): "externalstorage.xml",
+}
+
+AUTH_FAILED = (b'<?xml version="1.0" encoding="UTF-8" ?>\n'
+               b'<QDocRoot version="1.0"><authPassed><![CDATA[0]]></authPassed></QDocRoot>')
+
+_AUTH_SID = re.compile(rb"<authSid><!\[CDATA\[[^\]]*\]\]></authSid>")
+
+
+def _route_key(path, params):
+    """Build the ROUTES key for a request, ignoring parameter order, the SID and the output format."""
+    query = sorted((key, value) for key, value in params.items() if key not in ("sid", "output"))
+    return path, tuple(query)
+
+
+_ROUTES = {
+    _route_key(path, dict(urllib.parse.parse_qsl(query))): fixture for (path, query), fixture in ROUTES.items()
+}
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        """Ignore clients that hang up before their response is written, e.g. after a timeout."""
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+# pylint: disable=too-many-instance-attributes
+class QTSSimulator:
+    """Serve the recorded responses of one NAS model at the real CGI paths."""
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, fixture_dir, host="127.0.0.1", port=0, *, username=None, password=None,
+                 latency=0, jitter=0, error_rate=0, session_ttl=None, json_responses=False):
+        """Instantiate a simulator serving the files in ``fixture_dir``.
+
+        ``latency`` (plus up to ``jitter``) seconds are added to every request,
+        ``error_rate`` is the share of requests answered with HTTP 500 and
+        ``session_ttl`` the number of seconds a SID stays valid (forever if None).
+        When ``username``/``password`` are given, other credentials are refused.
+        With ``json_responses`` requests asking for ``output=json`` are answered
+        with the recorded XML converted to JSON; otherwise the parameter is ignored.
+        """
+        self.fixture_dir = fixture_dir
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.session_ttl = session_ttl
+        self.json_responses = json_responses
+
+        self.logins = 0
+        self.requests = 0
+        self.connections = 0
+
+        self._fixtures = {}
+        self._json_fixtures = {}
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self._server = _ThreadingHTTPServer((host, port), self._handler_class())
+
+    @property
+    def port(self):
+        """The TCP port the simulator listens on."""
+        return self._server.server_address[1]
+
+    @property
+    def host(self):
+        """The address the simulator listens on, usable as QNAPStats host."""
+        return "http://" + self._server.server_address[0]
+
+    def start(self):
+        """Serve requests in a background thread and return the simulator."""
+        self._thread = threading.Thread(target=self._server.serve_forever, name=f"qts-simulator-{self.port}",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and release the port."""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def expire_sessions(self):
+        """Invalidate every SID handed out so far, forcing clients to log in again."""
+        with self._lock:
+            self._sessions.clear()
+
+    def _fixture(self, name):
+        if name not in self._fixtures:
+            path = os.path.join(self.fixture_dir, name)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    self._fixtures[name] = f.read()
+            else:
+                self._fixtures[name] = None
+
+        return self._fixtures[name]
+
+    def _json_fixture(self, body):
+        if body not in self._json_fixtures:
+            self._json_fixtures[body] = json.dumps(xmltodict.parse(body)).encode("utf-8")
+
+        return self._json_fixtures[body]
+
+    def _login(self, params, fixture):
+        body = self._fixture(fixture)
+        if body is None:
+            return 404, b""
+
+        if self.username is not None:
+            try:
+                # The GET login sends the base64 password unescaped, so "+" arrives as a space
+                password = base64.b64decode(params.get("pwd", "").replace(" ", "+")).decode("utf-8")
+            except ValueError:
+                password = None
+            if params.get("user") != self.username or password != self.password:
+                return 200, AUTH_FAILED
+
+        # Only logins that return a SID count; the others make the client fall back to GET
+        if _AUTH_SID.search(body) is None:
+            return 200, body
+
+        sid = secrets.token_hex(8)
+        with self._lock:
+            self._sessions[sid] = time.monotonic() + self.session_ttl if self.session_ttl is not None else None
+            self.logins += 1
+
+        return 200, _AUTH_SID.sub(b"<authSid><![CDATA[" + sid.encode("ascii") + b"]]></authSid>", body)
+
+    def _session_valid(self, sid):
+        with self._lock:
+            if sid not in self._sessions:
+                return False
+
+            expires = self._sessions[sid]
+            if expires is not None and expires < time.monotonic():
+                del self._sessions[sid]
+                return False
+
+            return True
+
+    def _respond(self, method, path, params):
+        """Return the status, body and content type for a request."""
+        status, body = self._respond_xml(method, path, params)
+        if self.json_responses and params.get("output") == "json" and path != "authLogin.cgi" and body:
+            return status, self._json_fixture(body), "application/json"
+
+        return status, body, "text/xml"
+
+    def _respond_xml(self, method, path, params):
+        with self._lock:
+            self.requests += 1
+
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        if self.error_rate and random.random() < self.error_rate:
+            return 500, b""
+
+        if path == "authLogin.cgi":
+            return self._login(params, "login.xml" if method == "POST" else "login_with_get.xml")
+
+        fixture = _ROUTES.get(_route_key(path, params))
+        if fixture is None:
+            return 404, b""
+
+        if not self._session_valid(params.get("sid")):
+            return 200, AUTH_FAILED
+
+        body = self._fixture(fixture)
+        if body is None:
+            return 404, b""
+
+        return 200, body
+
+    def _handler_class(self):
+        simulator = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            """Dispatch CGI requests to the simulator."""
+
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately; don't let Nagle hold the body back
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                """Count the accepted TCP connection."""
+                super().setup()
+                with simulator._lock:  # pylint: disable=protected-access
+                    simulator.connections += 1
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """Handle a GET request."""
+                url = urllib.parse.urlsplit(self.path)
+                self._reply("GET", url.path, dict(urllib.parse.parse_qsl(url.query)))
+
+            def do_POST(self):  # pylint: disable=invalid-name
+                """Handle a POST request; form fields are merged with the query string."""
+                url = urllib.parse.urlsplit(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                params = dict(urllib.parse.parse_qsl(url.query))
+                params.update(urllib.parse.parse_qsl(self.rfile.read(length).decode("utf-8")))
+                self._reply("POST", url.path, params)
+
+            def _reply(self, method, path, params):
+                prefix = "/cgi-bin/"
+                path = path[len(prefix):] if path.startswith(prefix) else path
+                # pylint: disable=protected-access
+                status, body, content_type = simulator._respond(method, path, params)
+
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                """Keep the console quiet."""
+
+        return Handler
+
+
+def start_simulators(fixture_dir, count, base_port=0, **kwargs):
+    """Start ``count`` simulators on consecutive ports (or OS-assigned ones if base_port is 0)."""
+    simulators = []
+    try:
+        for i in range(count):
+            port = base_port + i if base_port else 0
+            simulators.append(QTSSimulator(fixture_dir, port=port, **kwargs).start())
+    except Exception:
+        for simulator in simulators:
+            simulator.stop()
+        raise
+
+    return simulators
+
+
+def main(argv=None):
+    """Run simulators from the command line until interrupted."""
+    parser = argparse.ArgumentParser(description="Replay recorded QTS responses over HTTP.")
+    parser.add_argument("fixture_dir", help="directory with the recorded responses of one model")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080, help="port of the first simulator")
+    parser.add_argument("--count", type=int, default=1, help="number of simulated devices")
+    parser.add_argument("--latency", type=float, default=0, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0, help="random extra latency, in seconds")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of requests failing with HTTP 500")
+    parser.add_argument("--session-ttl", type=float, default=None, help="seconds a SID stays valid")
+    parser.add_argument("--json", action="store_true", help="answer requests asking for output=json in JSON")
+    args = parser.parse_args(argv)
+
+    simulators = start_simulators(
+        args.fixture_dir, args.count, base_port=args.port, host=args.host, latency=args.latency,
+        jitter=args.jitter, error_rate=args.error_rate, session_ttl=args.session_ttl,
+        json_responses=args.json
+    )
+    print(f"Simulating {args.count} device(s) on {args.host}:{args.port}-{args.port + args.count - 1}")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for simulator in simulators:
+            simulator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""Module containing the outputs the command-line collector writes poll results to."""
+# -*- coding:utf-8 -*-
+import http.server
+import json
+import math
+import re
+import socketserver
+import sys
+import threading
+import time
+
+from .results import to_plain
+
+# Getters whose results are dicts keyed by an id, and the label that id becomes
+ENTRY_LABELS = {
+    "get_volumes": "volume",
+    "get_smart_disk_health": "drive",
+    "get_bandwidth": "interface",
+}
+
+# Nested dicts keyed by an id, and nested lists of dicts with a naming key: key -> (label, naming key)
+NESTED_LABELS = {
+    "nics": ("nic", None),
+    "sysfans": ("fan", None),
+    "folders": ("folder", "sharename"),
+}
+
+_INVALID_NAME_CHARS = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def samples(getter, result):
+    """Yield the numeric values of a getter's result as ``(field, labels, value)``.
+
+    ``field`` joins the keys leading to the value (e.g. "cpu_usage_percent"),
+    ids of volumes, disks, interfaces, NICs, fans and folders become
+    ``labels`` and booleans become 1 or 0. Text values are left out. Typed
+    results are walked through the dicts they convert to.
+    """
+    result = to_plain(result)
+    if getter in ENTRY_LABELS and isinstance(result, dict):
+        for key, entry in result.items():
+            yield from _walk(entry, (), {ENTRY_LABELS[getter]: str(key)})
+    else:
+        yield from _walk(result, (), {})
+
+
+def _walk(value, path, labels):
+    if isinstance(value, bool):
+        yield "_".join(path), labels, int(value)
+    elif isinstance(value, (int, float)):
+        yield "_".join(path), labels, value
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            label = NESTED_LABELS.get(key)
+            if label is not None and isinstance(item, dict):
+                for entry_key, entry in item.items():
+                    yield from _walk(entry, path + (key,), dict(labels, **{label[0]: str(entry_key)}))
+            else:
+                yield from _walk(item, path + (str(key),), labels)
+    elif isinstance(value, list) and path and path[-1] in NESTED_LABELS:
+        label, naming_key = NESTED_LABELS[path[-1]]
+        for entry in value:
+            if isinstance(entry, dict) and naming_key in entry:
+                yield from _walk(entry, path, dict(labels, **{label: str(entry[naming_key])}))
+
+
+def is_up(result):
+    """Return whether a poll succeeded: it raised no error and at least one getter returned data."""
+    return result.error is None and any(value is not None for value in result.data.values())
+
+
+def metric_name(*parts):
+    """Join name parts into a valid Prometheus metric name."""
+    return _INVALID_NAME_CHARS.sub("_", "_".join(part for part in parts if part))
+
+
+class JsonLinesSink:
+    """Write every poll result as one JSON object per line."""
+
+    def __init__(self, stream=None):
+        """Instantiate a sink writing to ``stream`` (stdout by default)."""
+        self._stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def write(self, result):
+        """Write a DeviceResult."""
+        line = json.dumps({
+            "time": time.time(),
+            "device": result.name,
+            "latency": result.latency,
+            "error": None if result.error is None else repr(result.error),
+            "data": to_plain(result.data),
+        }, default=str)
+
+        with self._lock:
+            self._stream.write(line + "\n")
+            self._stream.flush()
+
+    def close(self):
+        """Flush the stream."""
+        self._stream.flush()
+
+
+def _escape_tag(value):
+    return value.replace("\\", "\\\\").replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+
+def _influx_value(value):
+    return f"{value}i" if isinstance(value, int) else repr(float(value))
+
+
+class InfluxSink(JsonLinesSink):
+    """Write poll results in InfluxDB line protocol, one measurement per getter.
+
+    The output can be piped into ``influx write`` or read by Telegraf's execd
+    input. Every poll also writes a ``qnap_poll`` point with the latency and
+    whether the poll succeeded.
+    """
+
+    def write(self, result):
+        """Write a DeviceResult."""
+        timestamp = time.time_ns() if hasattr(time, "time_ns") else int(time.time() * 1e9)
+        device = _escape_tag(result.name)
+
+        lines = [f"qnap_poll,device={device} up={int(is_up(result))}i,latency={result.latency!r} {timestamp}"]
+        for getter, data in result.data.items():
+            points = {}
+            for field, labels, value in samples(getter, data):
+                if isinstance(value, float) and not math.isfinite(value):
+                    continue
+                tags = "".join(f",{key}={_escape_tag(labels[key])}" for key in sorted(labels))
+                points.setdefault(tags, []).append(f"{_escape_tag(field or 'value')}={_influx_value(value)}")
+
+            measurement = metric_name("qnap", getter[len("get_"):])
+            for tags, fields in points.items():
+                lines.append(f"{measurement},device={device}{tags} {','.join(fields)} {timestamp}")
+
+        with self._lock:
+            self._stream.write("\n".join(lines) + "\n")
+            self._stream.flush()
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class PrometheusSink:
+    """Serve the latest result of every device in the Prometheus text exposition format.
+
+    Every numeric value becomes a gauge named ``qnap_<getter>_<field>`` with a
+    ``device`` label; ``qnap_up`` (see is_up()) and ``qnap_poll_duration_seconds`` describe
+    the last poll of each device.
+    """
+
+    def __init__(self, host="0.0.0.0", port=9942):
+        """Instantiate a sink and start serving /metrics on ``host``:``port`` in a background thread."""
+        self._latest = {}
+        self._lock = threading.Lock()
+
+        sink = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            """Serve the exposition."""
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """Handle a scrape."""
+                if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+
+                body = sink.exposition().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                """Keep the console quiet."""
+
+        self._server = _ThreadingHTTPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="qnapstats-prometheus", daemon=True)
+        self._thread.start()
+
+    @property
+    def port(self):
+        """The TCP port the exposition is served on."""
+        return self._server.server_address[1]
+
+    def write(self, result):
+        """Replace the metrics of a device with those of a DeviceResult."""
+        metrics = {
+            "qnap_up": [({}, int(is_up(result)))],
+            "qnap_poll_duration_seconds": [({}, result.latency)],
+        }
+        for getter, data in result.data.items():
+            for field, labels, value in samples(getter, data):
+                metrics.setdefault(metric_name("qnap", getter[len("get_"):], field), []).append((labels, value))
+
+        with self._lock:
+            self._latest[result.name] = metrics
+
+    def exposition(self):
+        """Return the metrics of every device in the text exposition format."""
+        with self._lock:
+            latest = dict(self._latest)
+
+        series = {}
+        for device, metrics in sorted(latest.items()):
+            for name, values in metrics.items():
+                for labels, value in values:
+                    series.setdefault(name, []).append((dict(labels, device=device), value))
+
+        lines = []
+        for name in sorted(series):
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in series[name]:
+                label_text = ",".join(f'{key}="{_escape_label(labels[key])}"' for key in sorted(labels))
+                lines.append(f"{name}{{{label_text}}} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        """Stop serving."""
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
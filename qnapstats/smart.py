@@ -0,0 +1,163 @@
+"""Module for collecting SMART attribute tables of all disks of a NAS and keeping their history."""
+# -*- coding:utf-8 -*-
+import concurrent.futures
+import math
+import re
+import threading
+import time
+
+from .results import Disk
+from .sampler import RingBuffer
+
+# Attributes whose raw values predict disk failure (plus power-on hours and temperature for context)
+DEFAULT_ATTRIBUTES = (
+    5,    # Reallocated sectors
+    9,    # Power-on hours
+    10,   # Spin retries
+    187,  # Reported uncorrectable errors
+    188,  # Command timeouts
+    194,  # Temperature
+    197,  # Pending sectors
+    198,  # Offline uncorrectable sectors
+    199,  # UDMA CRC errors
+)
+
+_LEADING_INTEGER = re.compile(r"\s*(-?\d+)")
+
+
+def raw_value(raw):
+    """Return the leading integer of a raw SMART value such as "34 (Min/Max 21/45)", or None."""
+    match = _LEADING_INTEGER.match(raw or "")
+    return int(match.group(1)) if match else None
+
+
+class _DiskHistory:  # pylint: disable=too-few-public-methods
+    """Timestamps and raw values of the tracked attributes of one disk."""
+
+    __slots__ = ("serial", "timestamps", "values")
+
+    def __init__(self, serial, size, attributes):
+        self.serial = serial
+        self.timestamps = RingBuffer(size)
+        self.values = {attribute: RingBuffer(size) for attribute in attributes}
+
+
+def _serial(disk):
+    # Clients with typed_results return Disk objects
+    return disk.serial if isinstance(disk, Disk) else disk["serial"]
+
+
+# pylint: disable=too-many-instance-attributes
+class SmartCollector:
+    """Fetch the SMART attributes of every disk of a NAS concurrently and keep a compact history.
+
+    Attribute tables are refetched at most every ``ttl`` seconds. For each disk
+    the raw values of ``attributes`` are kept for the last ``history`` fetches,
+    in ring buffers of floats, so trends can be computed without new requests.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, qnap, ttl=3600, history=720, attributes=DEFAULT_ATTRIBUTES, max_workers=4):
+        """Instantiate a collector for the NAS behind a QNAPStats client."""
+        self._qnap = qnap
+        self._ttl = ttl
+        self._size = history
+        self._attributes = tuple(attributes)
+        self._max_workers = max_workers
+
+        self._latest = {}
+        self._fetched = {}
+        self._history = {}
+        self._lock = threading.Lock()
+
+    def collect(self, force=False):
+        """Return the attribute tables of all disks, keyed by drive number, fetching the stale ones.
+
+        Disks whose table could not be fetched are left out. Returns None if the
+        disk list itself is unavailable.
+        """
+        disks = self._qnap.get_smart_disk_health(use_cache=not force)
+        if disks is None:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            stale = [
+                drive for drive in disks
+                if force or drive not in self._fetched or now - self._fetched[drive] >= self._ttl
+            ]
+
+        if stale:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(self._max_workers, len(stale))) as executor:
+                tables = executor.map(lambda drive: self._fetch(drive, force), stale)
+                for drive, table in zip(stale, tables):
+                    if table is not None:
+                        self._record(drive, _serial(disks[drive]), table, now)
+
+        with self._lock:
+            # Forget disks that were removed from the NAS
+            for drive in list(self._latest):
+                if drive not in disks:
+                    self._forget(drive)
+
+            return {drive: self._latest[drive] for drive in disks if drive in self._latest}
+
+    def _fetch(self, drive, force):
+        """Return the attribute table of a disk, or None if it could not be fetched."""
+        try:
+            return self._qnap.get_smart_disk_attributes(drive, use_cache=not force)
+        except Exception:
+            # A timeout on one disk must not drop the tables of the others
+            return None
+
+    def _record(self, drive, serial, table, timestamp):
+        with self._lock:
+            history = self._history.get(drive)
+            if history is None or history.serial != serial:
+                # A new disk in this bay starts a new history
+                history = self._history[drive] = _DiskHistory(serial, self._size, self._attributes)
+
+            history.timestamps.append(time.time())
+            for attribute, series in history.values.items():
+                value = raw_value(table[attribute]["raw"]) if attribute in table else None
+                series.append(float("nan") if value is None else value)
+
+            self._latest[drive] = table
+            self._fetched[drive] = timestamp
+
+    def _forget(self, drive):
+        self._latest.pop(drive, None)
+        self._fetched.pop(drive, None)
+        self._history.pop(drive, None)
+
+    def drives(self):
+        """Return the drive numbers that have a history."""
+        with self._lock:
+            return sorted(self._history)
+
+    def history(self, drive, attribute, window=None):
+        """Return ``(timestamp, raw value)`` pairs of an attribute, oldest first; None marks a missing value."""
+        with self._lock:
+            history = self._history.get(drive)
+            if history is None or attribute not in history.values:
+                return []
+
+            timestamps = history.timestamps.values(window)
+            values = history.values[attribute].values(window)
+
+        return [(timestamp, None if math.isnan(value) else int(value)) for timestamp, value in zip(timestamps, values)]
+
+    def growth(self, drive, attribute, window=None):
+        """Return how much an attribute's raw value grew over the last ``window`` fetches, or None.
+
+        Useful for counters like reallocated (5) or pending (197) sectors.
+        """
+        values = [value for _, value in self.history(drive, attribute, window) if value is not None]
+        if not values:
+            return None
+
+        return values[-1] - values[0]
+
+    def growing(self, attribute=5, window=None):
+        """Return the drive numbers whose ``attribute`` grew over the last ``window`` fetches."""
+        return [drive for drive in self.drives() if (self.growth(drive, attribute, window) or 0) > 0]
@@ -0,0 +1,44 @@
+"""Module for building tuned requests sessions that can be shared between QNAPStats instances."""
+# -*- coding:utf-8 -*-
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class PoolAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools can use a shared SSL context."""
+
+    def __init__(self, ssl_context=None, **kwargs):
+        """Instantiate an adapter; ``kwargs`` are passed to HTTPAdapter."""
+        self._ssl_context = ssl_context
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):  # pylint: disable=arguments-differ
+        """Create the pool manager, handing it the shared SSL context."""
+        if self._ssl_context is not None:
+            kwargs["ssl_context"] = self._ssl_context
+        super().init_poolmanager(*args, **kwargs)
+
+
+# pylint: disable=too-many-arguments
+def create_session(pool_connections=10, pool_maxsize=10, max_retries=0, keep_alive=True, ssl_context=None):
+    """Build a requests.Session to pass as ``session`` to one or many QNAPStats instances.
+
+    ``pool_connections`` is the number of hosts whose connections are kept,
+    ``pool_maxsize`` the number of connections kept per host and ``max_retries``
+    the connection-level retries (an int or a urllib3 Retry). Pass an
+    ``ssl_context`` to use the same certificate and cipher settings for all
+    pools, and ``keep_alive=False`` to close connections after every request.
+    """
+    session = requests.Session()
+
+    adapter = PoolAdapter(
+        ssl_context=ssl_context, pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+        max_retries=max_retries
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+
+    return session
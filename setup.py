@@ -22,13 +22,15 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
         'Programming Language :: Python :: 3.9',
         'Topic :: Home Automation',
         'Topic :: System :: Monitoring'
     ],
-    install_requires=['requests>=1.0.0', 'xmltodict>=0.10.0']
+    python_requires='>=3.7',
+    install_requires=['requests>=1.0.0', 'xmltodict>=0.10.0'],
+    entry_points={
+        'console_scripts': ['qnapstats=qnapstats.cli:main'],
+    }
 )
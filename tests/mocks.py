@@ -0,0 +1,110 @@
+"""Helpers registering the recorded QNAP responses with the responses library"""
+# -*- coding:utf-8 -*-
+import base64
+import os
+import responses
+
+
+def get_immediate_subdirectories(a_dir):
+    return [name for name in os.listdir(a_dir)
+            if os.path.isdir(os.path.join(a_dir, name))]
+
+
+response_directory = os.path.join(os.path.dirname(__file__), 'responses')
+models = get_immediate_subdirectories(response_directory)
+
+# Recorded JSON result -> getter returning it
+getters = {
+    'bandwidth.json': 'get_bandwidth',
+    'smartdiskhealth.json': 'get_smart_disk_health',
+    'systemhealth.json': 'get_system_health',
+    'systemstats.json': 'get_system_stats',
+    'volumes.json': 'get_volumes',
+    'firmwareupdate.json': 'get_firmware_update',
+}
+
+
+def add_mock_responses(rsps, directory, base_url='http://localhost:8080/cgi-bin/'):
+    rsps.add(responses.POST,
+             base_url + 'authLogin.cgi',
+             body=file_get_contents(directory, 'login.xml'),
+             status=200,
+             content_type='text/xml')
+    if file_get_contents(directory, "login_with_get.xml"):
+        pwd = base64.b64encode("correcthorsebatterystaple".encode('utf-8')).decode('ascii')
+        rsps.add(responses.GET,
+                 base_url + 'authLogin.cgi?user=admin&pwd=' + pwd,
+                 body=file_get_contents(directory, 'login_with_get.xml'),
+                 status=200,
+                 content_type='text/xml')
+    xml = file_get_contents(directory, 'bandwidth.xml')
+    if xml is not None:
+        rsps.add(responses.GET,
+                 base_url + 'management/chartReq.cgi?chart_func=QSM40bandwidth&sid=12345',
+                 match_querystring=True,
+                 body=xml,
+                 status=200,
+                 content_type='text/xml')
+
+    xml = file_get_contents(directory, 'bandwidth2.xml')
+    if xml is not None:
+        rsps.add(responses.GET,
+                 base_url + 'management/chartReq.cgi?chart_func=bandwidth&sid=12345',
+                 match_querystring=True,
+                 body=xml,
+                 status=200,
+                 content_type='text/xml')
+
+    xml = file_get_contents(directory, 'systemhealth.xml')
+    if xml is not None:
+        rsps.add(responses.GET,
+                 base_url + 'management/manaRequest.cgi?subfunc=sysinfo&sysHealth=1&sid=12345',
+                 match_querystring=True,
+                 body=file_get_contents(directory, 'systemhealth.xml'),
+                 status=200,
+                 content_type='text/xml')
+
+    xml = file_get_contents(directory, 'volumes.xml')
+    if xml is not None:
+        rsps.add(responses.GET,
+                 base_url + 'management/chartReq.cgi?chart_func=disk_usage&disk_select=all&include=all&sid=12345',  # noqa: E501
+                 match_querystring=True,
+                 body=file_get_contents(directory, 'volumes.xml'),
+                 status=200,
+                 content_type='text/xml')
+
+    xml = file_get_contents(directory, 'smartdiskhealth.xml')
+    if xml is not None:
+        rsps.add(responses.GET,
+                 base_url + 'disk/qsmart.cgi?func=all_hd_data&sid=12345',
+                 match_querystring=True,
+                 body=file_get_contents(directory, 'smartdiskhealth.xml'),
+                 status=200,
+                 content_type='text/xml')
+
+    xml = file_get_contents(directory, 'systemstats.xml')
+    if xml is not None:
+        rsps.add(responses.GET,
+                 base_url + 'management/manaRequest.cgi?subfunc=sysinfo&hd=no&multicpu=1&sid=12345',
+                 match_querystring=True,
+                 body=file_get_contents(directory, 'systemstats.xml'),
+                 status=200,
+                 content_type='text/xml')
+
+    xml = file_get_contents(directory, 'firmwareupdate.xml')
+    if xml is not None:
+        rsps.add(responses.GET,
+                 base_url + 'sys/sysRequest.cgi?subfunc=firm_update&sid=12345',
+                 match_querystring=True,
+                 body=file_get_contents(directory, 'firmwareupdate.xml'),
+                 status=200,
+                 content_type='text/xml')
+
+
+def file_get_contents(directory, file):
+    file = os.path.join(response_directory, directory, file)
+    if not os.path.exists(file):
+        return None
+
+    with open(file, 'r') as myfile:
+        return myfile.read()
@@ -0,0 +1,81 @@
+"""Functional tests for the TTL response cache"""
+# -*- coding:utf-8 -*-
+import json
+import time
+import qnapstats
+import responses
+from mocks import add_mock_responses, file_get_contents
+
+model = 'TS-451-4.2.2'
+
+
+def url_calls(rsps, fragment):
+    return len([c for c in rsps.calls if fragment in c.request.url])
+
+
+cache = qnapstats.ResponseCache(ttls={"disk/qsmart.cgi": 3600, "management/chartReq.cgi": 0.2}, max_size=2)
+assert cache.ttl("disk/qsmart.cgi?func=all_hd_data") == 3600
+assert cache.ttl("management/manaRequest.cgi?subfunc=sysinfo&hd=no&multicpu=1") == 0
+
+qnap = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple", cache=cache)
+assert qnap.cache is cache
+
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    add_mock_responses(rsps, model)
+    smartdiskhealth = file_get_contents(model, 'smartdiskhealth.json')
+
+    # Second call is served from the cache
+    assert json.dumps(qnap.get_smart_disk_health(), sort_keys=True) == smartdiskhealth
+    assert json.dumps(qnap.get_smart_disk_health(), sort_keys=True) == smartdiskhealth
+    assert url_calls(rsps, 'qsmart.cgi') == 1
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0, "size": 1}
+
+    # Bypassing goes to the NAS and refreshes the entry
+    qnap.get_smart_disk_health(use_cache=False)
+    assert url_calls(rsps, 'qsmart.cgi') == 2
+
+    # Endpoints without a TTL are never cached nor counted
+    qnap.get_system_stats()
+    qnap.get_system_stats()
+    assert url_calls(rsps, 'multicpu=1') == 2
+    assert cache.stats()["misses"] == 1
+
+    # Entries expire after their TTL
+    qnap.get_volumes()
+    qnap.get_volumes()
+    assert url_calls(rsps, 'disk_usage') == 1
+    time.sleep(0.25)
+    qnap.get_volumes()
+    assert url_calls(rsps, 'disk_usage') == 2
+
+    # The least recently used entry is evicted once max_size is reached
+    qnap.get_bandwidth()
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] == 2
+    qnap.get_smart_disk_health()
+    assert url_calls(rsps, 'qsmart.cgi') == 3
+
+    cache.invalidate()
+    assert len(cache) == 0
+
+# A cache shared by clients of different devices keeps their responses apart
+shared = qnapstats.ResponseCache()
+nas_a = qnapstats.QNAPStats("nas-a", 8080, "admin", "correcthorsebatterystaple", cache=shared)
+nas_b = qnapstats.QNAPStats("nas-b", 8080, "admin", "correcthorsebatterystaple", cache=shared)
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    add_mock_responses(rsps, model, base_url='http://nas-a:8080/cgi-bin/')
+    add_mock_responses(rsps, 'TS-639-4.2.3', base_url='http://nas-b:8080/cgi-bin/')
+
+    assert json.dumps(nas_a.get_volumes(), sort_keys=True) == file_get_contents(model, 'volumes.json')
+    assert json.dumps(nas_b.get_volumes(), sort_keys=True) == file_get_contents('TS-639-4.2.3', 'volumes.json')
+    assert url_calls(rsps, 'nas-b:8080/cgi-bin/management/chartReq.cgi') == 1
+    assert shared.stats()["size"] == 2
+    assert shared.ttl("http://nas-a:8080/cgi-bin/disk/qsmart.cgi?func=all_hd_data") == 3600
+
+    # A full URL invalidates one device's entry, a CGI path every device's
+    volumes = "management/chartReq.cgi?chart_func=disk_usage&disk_select=all&include=all"
+    shared.invalidate("http://nas-a:8080/cgi-bin/" + volumes)
+    assert len(shared) == 1
+    nas_a.get_volumes()
+    shared.invalidate(volumes)
+    assert len(shared) == 0
@@ -0,0 +1,110 @@
+"""Tests for the per-device cache of supported endpoint variants"""
+# -*- coding:utf-8 -*-
+import asyncio
+import json
+import os
+import qnapstats
+import requests
+from qnapstats.simulator import QTSSimulator
+from mocks import file_get_contents, response_directory
+
+
+def client(simulator, urls, **kwargs):
+    """Build a client whose session records the CGI path and chart of every request."""
+    session = requests.Session()
+    session.hooks['response'].append(lambda resp, **_: urls.append(resp.url.split('/cgi-bin/')[1].split('&sid=')[0]))
+    return qnapstats.QNAPStats(simulator.host, simulator.port, "admin", "x", session=session, **kwargs)
+
+
+# QTS 4.5.4 only returns bandwidth_info for chart_func=bandwidth; the fallback is learned once
+simulator = QTSSimulator(os.path.join(response_directory, 'TS-X53-4.5.4')).start()
+try:
+    urls = []
+    qnap = client(simulator, urls)
+    expected = file_get_contents('TS-X53-4.5.4', 'bandwidth.json').rstrip()
+    assert json.dumps(qnap.get_bandwidth(), sort_keys=True) == expected
+    assert qnap.capabilities.get('bandwidth') == 'bandwidth'
+    assert urls[1:] == ['management/chartReq.cgi?chart_func=QSM40bandwidth',
+                        'management/chartReq.cgi?chart_func=bandwidth'], urls
+
+    del urls[:]
+    for _ in range(3):
+        assert json.dumps(qnap.get_bandwidth(), sort_keys=True) == expected
+    assert urls == ['management/chartReq.cgi?chart_func=bandwidth'] * 3, urls
+
+    # Capabilities can be shared by clients of the same device
+    urls = []
+    other = client(simulator, urls, capabilities=qnap.capabilities)
+    assert json.dumps(other.get_bandwidth(), sort_keys=True) == expected
+    assert urls[1:] == ['management/chartReq.cgi?chart_func=bandwidth'], urls
+
+    # So does the async client
+    urls = []
+    async_qnap = qnapstats.AsyncQNAPStats(simulator.host, simulator.port, "admin", "x",
+                                          capabilities=qnap.capabilities)
+    assert json.dumps(asyncio.run(async_qnap.get_bandwidth()), sort_keys=True) == expected
+    async_qnap.close()
+finally:
+    simulator.stop()
+
+# Firmware that refuses the POST login is logged into with GET straight away
+simulator = QTSSimulator(os.path.join(response_directory, 'TS-251-4.5.1')).start()
+try:
+    urls = []
+    qnap = client(simulator, urls)
+    assert qnap.get_system_stats() is not None
+    assert [url.split('?')[0] for url in urls[:2]] == ['authLogin.cgi', 'authLogin.cgi']
+    assert qnap.capabilities.get('login') == 'get'
+
+    del urls[:]
+    simulator.expire_sessions()
+    assert qnap.get_system_stats(use_cache=False) is not None
+    assert [url.split('?')[0] for url in urls].count('authLogin.cgi') == 1, urls
+    assert 'user=admin' in [url for url in urls if url.startswith('authLogin.cgi')][0]
+finally:
+    simulator.stop()
+
+# A cached login method that stops working falls back to the other one
+simulator = QTSSimulator(os.path.join(response_directory, 'TS-451-4.2.2')).start()
+try:
+    urls = []
+    capabilities = qnapstats.Capabilities()
+    capabilities.set('login', 'get')
+    qnap = client(simulator, urls, capabilities=capabilities)
+    assert qnap.get_system_stats() is not None
+    assert [url.split('?')[0] for url in urls[:2]] == ['authLogin.cgi', 'authLogin.cgi']
+    assert 'user=admin' in urls[0] and 'user=admin' not in urls[1]
+    assert capabilities.get('login') == 'post'
+finally:
+    simulator.stop()
+
+# A new firmware reported by get_system_stats invalidates what was learned
+capabilities = qnapstats.Capabilities()
+assert not capabilities.firmware_seen('4.5.4 build 20210630')
+capabilities.set('bandwidth', 'bandwidth')
+capabilities.set('login', 'post')
+assert not capabilities.firmware_seen('4.5.4 build 20210630')
+assert capabilities.as_dict() == {'bandwidth': 'bandwidth', 'login': 'post'}
+assert capabilities.firmware_seen('5.0.1 build 20220324')
+assert capabilities.as_dict() == {}
+assert capabilities.firmware == '5.0.1 build 20220324'
+
+simulator = QTSSimulator(os.path.join(response_directory, 'TS-451-4.2.2')).start()
+try:
+    qnap = qnapstats.QNAPStats(simulator.host, simulator.port, "admin", "x")
+    firmware = qnap.get_system_stats()['firmware']
+    assert qnap.capabilities.firmware == f"{firmware['version']} build {firmware['build']}"
+    assert qnap.capabilities.as_dict() == {'login': 'post'}
+    qnap.get_snapshot(('system_stats', 'system_health'))
+    assert qnap.capabilities.get('combined_sysinfo') is False
+
+    # Unchanged firmware keeps the capabilities, an upgrade drops them
+    qnap.get_system_stats(use_cache=False)
+    assert qnap.capabilities.as_dict() == {'login': 'post', 'combined_sysinfo': False}
+    qnap.capabilities.firmware_seen('4.1.0 build 20150101')
+    qnap.capabilities.set('bandwidth', 'bandwidth')
+    qnap.get_system_stats(use_cache=False)
+    assert qnap.capabilities.as_dict() == {}
+    assert qnap.capabilities.firmware == f"{firmware['version']} build {firmware['build']}"
+finally:
+    simulator.stop()
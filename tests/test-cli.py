@@ -0,0 +1,128 @@
+"""Tests for the command-line collector, its scheduler and its output sinks"""
+# -*- coding:utf-8 -*-
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import requests
+from qnapstats.cli import PollScheduler, build_fleet, load_config, main
+from qnapstats.fleet import DeviceResult
+from qnapstats.simulator import start_simulators
+from qnapstats.sinks import InfluxSink, JsonLinesSink, PrometheusSink, samples
+from mocks import file_get_contents, response_directory
+
+model = 'TS-451-4.2.2'
+getters = ['get_system_stats', 'get_volumes', 'get_smart_disk_health', 'get_bandwidth']
+
+
+def write_config(simulators, **settings):
+    devices = [{'name': f'nas{i}', 'host': s.host, 'port': s.port, 'username': 'admin', 'password': 'x'}
+               for i, s in enumerate(simulators)]
+    fd, path = tempfile.mkstemp(suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(dict(settings, devices=devices, getters=getters), f)
+    return path
+
+
+# Numeric values are extracted with their ids as labels
+stats = json.loads(file_get_contents(model, 'systemstats.json'))
+extracted = {(field, tuple(sorted(labels.items()))): value
+             for field, labels, value in samples('get_system_stats', stats)}
+assert extracted[('cpu_usage_percent', ())] == stats['cpu']['usage_percent']
+assert extracted[('nics_rx_packets', (('nic', 'eth0'),))] == stats['nics']['eth0']['rx_packets']
+assert ('system_name', ()) not in extracted
+
+volumes = json.loads(file_get_contents(model, 'volumes.json'))
+extracted = {(field, tuple(sorted(labels.items()))): value for field, labels, value in samples('get_volumes', volumes)}
+label = next(iter(volumes))
+assert extracted[('free_size', (('volume', label),))] == volumes[label]['free_size']
+folder = volumes[label]['folders'][0]
+assert extracted[('folders_used_size', (('folder', folder['sharename']), ('volume', label)))] == folder['used_size']
+
+# --once writes one JSON line per device
+simulators = start_simulators(os.path.join(response_directory, model), 3)
+try:
+    config = write_config(simulators)
+    fd, output = tempfile.mkstemp()
+    os.close(fd)
+    assert main([config, '--once', '--output', output]) == 0
+    with open(output) as f:
+        lines = [json.loads(line) for line in f]
+    assert sorted(line['device'] for line in lines) == ['nas0', 'nas1', 'nas2']
+    assert all(line['error'] is None for line in lines)
+    assert lines[0]['data']['get_system_stats'] == stats
+
+    # InfluxDB line protocol, one point per volume, disk, interface...
+    stream = io.StringIO()
+    sink = InfluxSink(stream)
+    fleet = build_fleet(load_config(config))
+    sink.write(fleet.poll_device('nas0'))
+    lines = stream.getvalue().splitlines()
+    assert lines[0].startswith('qnap_poll,device=nas0 up=1i,latency=')
+    assert any(line.startswith(f'qnap_volumes,device=nas0,volume={label} ') and
+               f'free_size={volumes[label]["free_size"]}i' in line for line in lines), lines
+    assert any(line.startswith('qnap_system_stats,device=nas0 ') and 'cpu_usage_percent=' in line for line in lines)
+    for line in lines:
+        measurement, fields, timestamp = line.rsplit(' ', 2)
+        assert timestamp.isdigit() and '=' in fields
+
+    # Prometheus exposition of the latest poll of each device
+    sink = PrometheusSink('127.0.0.1', 0)
+    try:
+        for result in fleet.poll():
+            sink.write(result)
+        sink.write(DeviceResult('broken', {}, OSError('unreachable'), 0.5))
+        body = requests.get(f'http://127.0.0.1:{sink.port}/metrics').text
+        assert '# TYPE qnap_up gauge' in body
+        assert 'qnap_up{device="nas0"} 1' in body and 'qnap_up{device="broken"} 0' in body
+        assert f'qnap_volumes_free_size{{device="nas2",volume="{label}"}} {volumes[label]["free_size"]}' in body
+        assert requests.get(f'http://127.0.0.1:{sink.port}/other').status_code == 404
+    finally:
+        sink.close()
+    os.unlink(config)
+    os.unlink(output)
+finally:
+    for simulator in simulators:
+        simulator.stop()
+
+# The scheduler spreads device polls over the interval
+simulators = start_simulators(os.path.join(response_directory, model), 4)
+try:
+    fleet = build_fleet(load_config(write_config(simulators)))
+    started = []
+    fleet_poll = fleet.poll_device
+    fleet.poll_device = lambda name: started.append((time.monotonic(), name)) or fleet_poll(name)
+
+    stream = io.StringIO()
+    scheduler = PollScheduler(fleet, JsonLinesSink(stream), interval=0.4)
+    timer = threading.Timer(0.7, scheduler.stop)
+    timer.start()
+    scheduler.run()
+
+    names = [name for _, name in started]
+    assert names[:4] == ['nas0', 'nas1', 'nas2', 'nas3'], names
+    gaps = [later - earlier for (earlier, _), (later, _) in zip(started, started[1:4])]
+    assert all(0.05 < gap < 0.2 for gap in gaps), gaps
+    assert names.count('nas0') == 2 and sum(scheduler.skipped.values()) == 0
+finally:
+    for simulator in simulators:
+        simulator.stop()
+
+# A device whose last poll is still running is skipped
+simulators = start_simulators(os.path.join(response_directory, model), 2, latency=0.15)
+try:
+    fleet = build_fleet(load_config(write_config(simulators)))
+    stream = io.StringIO()
+    scheduler = PollScheduler(fleet, JsonLinesSink(stream), interval=0.2)
+    timer = threading.Timer(1, scheduler.stop)
+    timer.start()
+    scheduler.run()
+    # Each poll makes at least 5 requests of 0.15s, so a device is due again long before it finishes
+    assert all(skipped >= 2 for skipped in scheduler.skipped.values()), scheduler.skipped
+    time.sleep(1)
+    assert len(stream.getvalue().splitlines()) >= 2
+finally:
+    for simulator in simulators:
+        simulator.stop()
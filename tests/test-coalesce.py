@@ -0,0 +1,151 @@
+"""Tests for sharing one request between concurrent callers of the same endpoint"""
+# -*- coding:utf-8 -*-
+import asyncio
+import concurrent.futures
+import json
+import threading
+import time
+import qnapstats
+import requests
+import responses
+from mocks import file_get_contents
+
+model = 'TS-451-4.2.2'
+volumes_url = 'management/chartReq.cgi?chart_func=disk_usage&disk_select=all&include=all&sid=12345'
+stats_url = 'management/manaRequest.cgi?subfunc=sysinfo&hd=no&multicpu=1&sid=12345'
+
+
+def slow(fixture, calls, delay=0.2):
+    def callback(request):
+        calls.append(request.url)
+        time.sleep(delay)
+        return 200, {}, file_get_contents(model, fixture)
+    return callback
+
+
+def add_device(rsps, port, calls):
+    base_url = f'http://localhost:{port}/cgi-bin/'
+    rsps.add(responses.POST, base_url + 'authLogin.cgi', body=file_get_contents(model, 'login.xml'),
+             content_type='text/xml')
+    rsps.add_callback(responses.GET, base_url + volumes_url, callback=slow('volumes.xml', calls),
+                      content_type='text/xml', match_querystring=True)
+    rsps.add_callback(responses.GET, base_url + stats_url, callback=slow('systemstats.xml', calls),
+                      content_type='text/xml', match_querystring=True)
+
+
+def concurrently(funcs):
+    barrier = threading.Barrier(len(funcs))
+
+    def run(func):
+        barrier.wait()
+        try:
+            return func()
+        except Exception as e:
+            return e
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(funcs)) as executor:
+        return list(executor.map(run, funcs))
+
+
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    calls = []
+    add_device(rsps, 8080, calls)
+    coalescer = qnapstats.RequestCoalescer()
+    qnap = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple", coalescer=coalescer)
+    assert qnap.coalescer is coalescer
+    qnap._init_session()
+
+    # Threads asking for the same endpoint at once share one request and one parsed result
+    results = concurrently([qnap.get_volumes] * 16)
+    assert len(calls) == 1
+    assert all(json.dumps(result, sort_keys=True) == file_get_contents(model, 'volumes.json').rstrip()
+               for result in results)
+    assert coalescer.stats() == {"requests": 1, "coalesced": 15, "in_flight": 0}
+
+    # Different endpoints are not coalesced
+    del calls[:]
+    results = concurrently([qnap.get_volumes, qnap.get_system_stats] * 4)
+    assert len(calls) == 2
+    assert coalescer.stats() == {"requests": 3, "coalesced": 21, "in_flight": 0}
+
+    # Calls made one after another each make their own request
+    del calls[:]
+    qnap.get_volumes()
+    qnap.get_volumes()
+    assert len(calls) == 2
+
+    # Clients of different devices can share a coalescer, as the key holds the whole URL
+    del calls[:]
+    add_device(rsps, 8081, calls)
+    other = qnapstats.QNAPStats("localhost", 8081, "admin", "correcthorsebatterystaple", coalescer=coalescer)
+    other._init_session()
+    concurrently([qnap.get_system_stats, other.get_system_stats] * 4)
+    assert len(calls) == 2
+
+    # Coroutines on one event loop share a request too
+    del calls[:]
+    async_qnap = qnapstats.AsyncQNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple",
+                                          coalescer=qnapstats.RequestCoalescer())
+
+    async def gather():
+        await async_qnap._init_session()
+        return await asyncio.gather(*([async_qnap.get_volumes() for _ in range(8)] +
+                                      [async_qnap.get_system_stats() for _ in range(8)]))
+
+    loop = asyncio.new_event_loop()
+    results = loop.run_until_complete(gather())
+    assert len(calls) == 2
+    assert all(json.dumps(result, sort_keys=True) == file_get_contents(model, 'volumes.json').rstrip()
+               for result in results[:8])
+    assert all(json.dumps(result, sort_keys=True) == file_get_contents(model, 'systemstats.json').rstrip()
+               for result in results[8:])
+    assert async_qnap.coalescer.stats() == {"requests": 2, "coalesced": 14, "in_flight": 0}
+
+    # Cancelling the coroutine that started a request does not cancel it for the others
+    del calls[:]
+
+    async def cancel_first():
+        first = asyncio.ensure_future(async_qnap.get_volumes())
+        await asyncio.sleep(0.05)
+        second = asyncio.ensure_future(async_qnap.get_volumes())
+        await asyncio.sleep(0.05)
+        first.cancel()
+        return await asyncio.gather(first, second, return_exceptions=True)
+
+    first, second = loop.run_until_complete(cancel_first())
+    assert isinstance(first, asyncio.CancelledError)
+    assert json.dumps(second, sort_keys=True) == file_get_contents(model, 'volumes.json').rstrip()
+    assert len(calls) == 1
+    assert async_qnap.coalescer.stats() == {"requests": 3, "coalesced": 15, "in_flight": 0}
+
+
+# A failed request fails every caller that waited for it
+def refused(request):
+    time.sleep(0.2)
+    raise requests.exceptions.ConnectionError("refused")
+
+
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    rsps.add(responses.POST, 'http://localhost:8080/cgi-bin/authLogin.cgi',
+             body=file_get_contents(model, 'login.xml'), content_type='text/xml')
+    rsps.add_callback(responses.GET, 'http://localhost:8080/cgi-bin/' + stats_url, callback=refused,
+                      match_querystring=True)
+    coalescer = qnapstats.RequestCoalescer()
+    qnap = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple", coalescer=coalescer,
+                               retry_policy=qnapstats.RetryPolicy(attempts=1))
+    qnap._init_session()
+    results = concurrently([qnap.get_system_stats] * 8)
+    assert all(isinstance(result, requests.exceptions.ConnectionError) for result in results), results
+    assert coalescer.stats() == {"requests": 1, "coalesced": 7, "in_flight": 0}
+
+    async_qnap = qnapstats.AsyncQNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple",
+                                          coalescer=coalescer, retry_policy=qnapstats.RetryPolicy(attempts=1))
+
+    async def gather_errors():
+        await async_qnap._init_session()
+        return await asyncio.gather(*(async_qnap.get_system_stats() for _ in range(4)), return_exceptions=True)
+
+    results = loop.run_until_complete(gather_errors())
+    assert all(isinstance(result, requests.exceptions.ConnectionError) for result in results), results
+    assert coalescer.stats() == {"requests": 2, "coalesced": 10, "in_flight": 0}
+    loop.close()
@@ -0,0 +1,111 @@
+"""Tests for the columnar metrics archive"""
+# -*- coding:utf-8 -*-
+import json
+import os
+import shutil
+import tempfile
+import qnapstats
+from qnapstats.fleet import DeviceResult
+from qnapstats.simulator import start_simulators
+from mocks import file_get_contents, response_directory
+
+fixtures = {
+    'get_system_stats': 'systemstats.json',
+    'get_volumes': 'volumes.json',
+    'get_smart_disk_health': 'smartdiskhealth.json',
+}
+model = 'TS-451-4.2.2'
+results = {getter: json.loads(file_get_contents(model, fixture)) for getter, fixture in fixtures.items()}
+polls = 2000
+
+directory = tempfile.mkdtemp()
+try:
+    archive = os.path.join(directory, 'archive')
+    with qnapstats.ColumnarWriter(archive, batch_size=5000) as writer:
+        for poll in range(polls):
+            cpu = dict(results['get_system_stats']['cpu'], usage_percent=poll / 10)
+            stats = dict(results['get_system_stats'], cpu=cpu)
+            writer.add('nas1', 'get_system_stats', stats, timestamp=1000.0 + poll)
+            writer.add('nas1', 'get_volumes', results['get_volumes'], timestamp=1000.0 + poll)
+            writer.add('nas1', 'get_smart_disk_health', results['get_smart_disk_health'], timestamp=1000.0 + poll)
+
+    # A series per device, getter, field and labels, each holding every poll
+    reader = qnapstats.ColumnarReader(archive)
+    series = reader.series('get_system_stats', 'cpu_usage_percent')
+    assert len(series) == 1 and series[0]['device'] == 'nas1' and series[0]['count'] == polls
+    assert series[0]['type'] == 'd'
+    assert len(reader.series('get_smart_disk_health', 'temp_c')) == 4
+    assert reader.series(field='rx_packets') == []
+    eth1 = reader.series('get_system_stats', 'nics_rx_packets', nic='eth1')
+    assert len(eth1) == 1 and eth1[0]['type'] == 'q'
+
+    # Scanning one metric reads its own columns only, and bisects the time range
+    samples = list(reader.scan('get_system_stats', 'cpu_usage_percent'))
+    assert [value for _, _, value in samples] == [poll / 10 for poll in range(polls)]
+    samples = list(reader.scan('get_system_stats', 'cpu_usage_percent', start=1500, end=1509.5))
+    assert [timestamp for _, timestamp, _ in samples] == [1500.0 + i for i in range(10)]
+    volume = next(iter(results['get_volumes']))
+    free = list(reader.scan('get_volumes', 'free_size', volume=volume))
+    assert len(free) == polls and all(value == results['get_volumes'][volume]['free_size'] for _, _, value in free)
+
+    # Columns are typed memoryviews over the mapped files
+    with reader.columns(eth1[0]) as (timestamps, values):
+        assert timestamps.format == 'd' and values.format == 'q' and len(values) == polls
+        assert values[0] == results['get_system_stats']['nics']['eth1']['rx_packets']
+
+    # Far smaller than the same results stored as JSON lines
+    size = sum(os.path.getsize(os.path.join(archive, name)) for name in os.listdir(archive))
+    json_size = polls * len(json.dumps({'time': 1000.0, 'device': 'nas1', 'data': results}))
+    assert size * 3 < json_size, (size, json_size)
+
+    # Reopening appends to the existing series; unwritten samples and partial values are not read
+    with qnapstats.ColumnarWriter(archive, batch_size=5000) as writer:
+        writer.add('nas1', 'get_smart_disk_health', results['get_smart_disk_health'], timestamp=5000.0)
+        writer.add('nas2', 'get_smart_disk_health', results['get_smart_disk_health'], timestamp=5000.0)
+        assert len(qnapstats.ColumnarReader(archive).series(field='temp_c', device='nas2')) == 0
+    reader = qnapstats.ColumnarReader(archive)
+    assert [s['count'] for s in reader.series(field='temp_c', drive='0:1')] == [polls + 1, 1]
+    ts_file = os.path.join(archive, '%06d.ts' % reader.series(field='temp_c', device='nas2')[0]['id'])
+    with open(ts_file, 'ab') as f:
+        f.write(b'\0\0\0')
+    assert len(list(reader.scan('get_smart_disk_health', 'temp_c', device='nas2'))) == 4
+
+    # A batch interrupted after its values is dropped when the writer reopens, so new samples stay aligned
+    val_file = ts_file[:-len('ts')] + 'val'
+    with open(val_file, 'ab') as f:
+        f.write(b'\1' * 8 * 3)
+    disks = {drive: dict(disk, temp_c=99) for drive, disk in results['get_smart_disk_health'].items()}
+    with qnapstats.ColumnarWriter(archive) as writer:
+        writer.add('nas2', 'get_smart_disk_health', disks, timestamp=6000.0)
+    scanned = qnapstats.ColumnarReader(archive).scan('get_smart_disk_health', 'temp_c', device='nas2', drive='0:1')
+    assert [(timestamp, value) for _, timestamp, value in scanned] == [
+        (5000.0, results['get_smart_disk_health']['0:1']['temp_c']), (6000.0, 99)
+    ]
+
+    # The collector archives every device of a config
+    simulators = start_simulators(os.path.join(response_directory, model), 2)
+    try:
+        devices = [{'name': f'nas{i}', 'host': s.host, 'port': s.port, 'username': 'admin', 'password': 'x'}
+                   for i, s in enumerate(simulators)]
+        config = os.path.join(directory, 'devices.json')
+        with open(config, 'w') as f:
+            json.dump({'devices': devices, 'getters': list(fixtures)}, f)
+        collected = os.path.join(directory, 'collected')
+        assert qnapstats.cli.main([config, '--once', '--format', 'columnar', '--output', collected]) == 0
+    finally:
+        for simulator in simulators:
+            simulator.stop()
+
+    reader = qnapstats.ColumnarReader(collected)
+    assert sorted(s['device'] for s in reader.series('get_volumes', 'free_size')) == ['nas0', 'nas1']
+    assert all(s['count'] == 1 for s in reader.series())
+
+    # DeviceResults skip the getters that failed
+    with qnapstats.ColumnarWriter(os.path.join(directory, 'failed')) as writer:
+        writer.write(DeviceResult('nas1', {'get_volumes': None, 'get_system_stats': results['get_system_stats']},
+                                  None, 0.1))
+    assert {s['getter'] for s in qnapstats.ColumnarReader(os.path.join(directory, 'failed')).series()} == {
+        'get_system_stats'
+    }
+finally:
+    shutil.rmtree(directory)
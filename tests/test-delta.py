@@ -0,0 +1,53 @@
+"""Tests for change-only polling"""
+# -*- coding:utf-8 -*-
+import asyncio
+import json
+import qnapstats
+import responses
+from qnapstats.delta import diff
+from mocks import add_mock_responses, file_get_contents
+
+assert diff({"a": 1, "b": {"c": 2, "d": 3}, "e": [1]}, {"a": 1, "b": {"c": 2, "d": 4}, "e": [1, 2], "f": 5}) == (
+    {"b": {"d": 4}, "e": [1, 2], "f": 5}, []
+)
+assert diff({"a": {"b": 1, "c": 2}, "d": 3}, {"a": {"b": 1}}) == ({}, [("a", "c"), ("d",)])
+
+tracker = qnapstats.DeltaTracker(resync_every=3)
+assert tracker.update("x", {"a": 1}) == (True, {"a": 1}, [])
+assert tracker.update("x", {"a": 1}) == (False, {}, [])
+assert tracker.update("x", {"a": 2}) == (False, {"a": 2}, [])
+assert tracker.update("x", {"a": 2}) == (True, {"a": 2}, [])
+# Scalar results are sent whole whenever they change
+assert tracker.update("health", "good").full
+assert tracker.update("health", "good") == (False, {}, [])
+assert tracker.update("health", "warning") == (True, "warning", [])
+
+model = 'TS-451-4.2.2'
+url = 'http://localhost:8080/cgi-bin/management/manaRequest.cgi?subfunc=sysinfo&hd=no&multicpu=1&sid=12345'
+xml = file_get_contents(model, 'systemstats.xml')
+busy = xml.replace('<cpu_usage><![CDATA[', '<cpu_usage><![CDATA[9', 1)
+expected = json.loads(file_get_contents(model, 'systemstats.json'))
+
+for client in (qnapstats.QNAPStats, qnapstats.AsyncQNAPStats):
+    qnap = client("localhost", 8080, "admin", "correcthorsebatterystaple")
+    qnap.enable_delta(resync_every=10)
+
+    def poll():
+        delta = qnap.get_delta("get_system_stats")
+        if asyncio.iscoroutine(delta):
+            delta = asyncio.new_event_loop().run_until_complete(delta)
+        return delta
+
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        add_mock_responses(rsps, model)
+        rsps.add(responses.GET, url, match_querystring=True, body=xml, content_type='text/xml')
+        rsps.add(responses.GET, url, match_querystring=True, body=busy, content_type='text/xml')
+
+        first, second, third = poll(), poll(), poll()
+
+    assert first.full and first.changes == expected
+    assert second == (False, {}, [])
+    # Only the CPU usage leaf is shipped
+    assert not third.full
+    assert list(third.changes) == ["cpu"] and list(third.changes["cpu"]) == ["usage_percent"]
+    assert third.changes["cpu"]["usage_percent"] != expected["cpu"]["usage_percent"]
@@ -0,0 +1,132 @@
+"""Tests for the external drive watcher"""
+# -*- coding:utf-8 -*-
+import asyncio
+import threading
+import qnapstats
+import responses
+from qnapstats.external import entries, entry_key
+from mocks import file_get_contents
+
+base_url = 'http://localhost:8080/cgi-bin/'
+
+# No external drive responses were recorded, so these documents are synthetic
+DEVICE = ('<externalDevice><serial_num>{serial}</serial_num><vendor>WD</vendor>'
+          '<model>My Passport</model></externalDevice>')
+VOLUME = ('<volume><serial_num>{serial}</serial_num><vol_label>USBDisk{serial}</vol_label>'
+          '<total_size>2000000000000</total_size><free_size>{free}</free_size>'
+          '<temperature>{temperature}</temperature></volume>')
+
+
+class Nas:
+    """Mocked NAS whose external drives can be plugged and filled."""
+
+    def __init__(self, rsps):
+        self.drives = {}
+        self.status = 200
+        rsps.add(responses.POST, base_url + 'authLogin.cgi', body=file_get_contents('TS-451-4.2.2', 'login.xml'),
+                 content_type='text/xml')
+        rsps.add_callback(responses.POST, base_url + 'devices/devRequest.cgi', callback=self.devices,
+                          content_type='text/xml')
+        rsps.add_callback(responses.POST, base_url + 'disk/disk_manage.cgi', callback=self.storage,
+                          content_type='text/xml')
+
+    def devices(self, request):
+        devices = ''.join(DEVICE.format(serial=serial) for serial in self.drives)
+        return self.status, {}, ('<QDocRoot version="1.0"><authPassed><![CDATA[1]]></authPassed>'
+                                 f'<func><name>getExternalDev</name><ownContent>{devices}</ownContent></func>'
+                                 '</QDocRoot>')
+
+    def storage(self, request):
+        volumes = ''.join(VOLUME.format(serial=serial, **drive) for serial, drive in self.drives.items())
+        return self.status, {}, ('<QDocRoot version="1.0"><authPassed><![CDATA[1]]></authPassed>'
+                                 f'<Disk_Vol>{volumes}</Disk_Vol></QDocRoot>')
+
+
+async def async_listing():
+    async_qnap = qnapstats.AsyncQNAPStats('localhost', 8080, 'admin', 'correcthorsebatterystaple')
+    try:
+        return await async_qnap.get_external_drive_listing()
+    finally:
+        async_qnap.close()
+
+
+# Listings hold one entry, several or none, depending on how many elements the XML had
+assert entries(None) == [] and entries({'a': '1', 'b': '2'}) == [{'a': '1', 'b': '2'}]
+assert entries({'volume': [{'a': '1'}, {'a': '2'}]}) == [{'a': '1'}, {'a': '2'}]
+assert entry_key({'vol_label': 'USB', 'serial_num': 'S1'}) == 'S1'
+assert entry_key({'model': 'X', 'free_size': '1'}) == entry_key({'model': 'X', 'free_size': '2'})
+
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    nas = Nas(rsps)
+    qnap = qnapstats.QNAPStats('localhost', 8080, 'admin', 'correcthorsebatterystaple')
+    # The external drive requests log in first, like the getters
+    assert qnap.list_external_drive() is None
+    assert qnap.get_storage_information_on_external_device() is None
+    assert qnap._sid == '12345'
+
+    # The listings tell an empty listing from a failed request, and hash the response body
+    empty = qnap.get_external_drive_listing()
+    assert empty.data is None and qnap.get_external_storage_listing().data is None
+    assert qnap.get_external_drive_listing().digest == empty.digest
+    nas.drives['S0'] = {'free': 1, 'temperature': 25}
+    listing = qnap.get_external_drive_listing()
+    assert listing.digest != empty.digest and listing.data['serial_num'] == 'S0'
+    assert asyncio.run(async_listing()) == listing
+    del nas.drives['S0']
+    nas.status = 500
+    assert qnap.get_external_drive_listing() is None
+    nas.status = 200
+
+    events = []
+    watcher = qnapstats.ExternalDeviceWatcher(qnap, callback=events.append, min_interval=1, max_interval=8)
+
+    # The first poll records the drives already attached
+    nas.drives['S1'] = {'free': 1000, 'temperature': 30}
+    assert watcher.poll() == [] and list(watcher.devices) == ['S1']
+
+    # Nothing changed: no events, and the interval grows up to its maximum
+    assert [(watcher.poll(), watcher.interval)[1] for _ in range(4)] == [4, 8, 8, 8]
+
+    # Plugging a drive is reported and brings the interval back down
+    nas.drives['S2'] = {'free': 5000, 'temperature': 30}
+    plugged = watcher.poll()
+    assert [(event.kind, event.key) for event in plugged] == [('plugged', 'S2')]
+    assert plugged[0].data['model'] == 'My Passport' and plugged[0].previous is None
+    assert watcher.interval == 1 and events == plugged
+
+    # Only capacity changes are reported for volumes, not other fields
+    nas.drives['S1'] = {'free': 900, 'temperature': 35}
+    nas.drives['S2']['temperature'] = 31
+    changed = watcher.poll()
+    assert [(event.kind, event.key) for event in changed] == [('capacity_changed', 'S1')]
+    assert changed[0].previous['free_size'] == '1000' and changed[0].data['free_size'] == '900'
+    nas.drives['S1']['temperature'] = 40
+    assert watcher.poll() == [] and watcher.interval == 2
+
+    # A failed poll is not mistaken for every drive being unplugged
+    nas.status = 500
+    assert watcher.poll() == [] and sorted(watcher.devices) == ['S1', 'S2']
+    nas.status = 200
+
+    # Unplugging the last drives empties the listing
+    del nas.drives['S1']
+    del nas.drives['S2']
+    unplugged = watcher.poll()
+    assert sorted((event.kind, event.key) for event in unplugged) == [('unplugged', 'S1'), ('unplugged', 'S2')]
+    assert unplugged[0].data is None and unplugged[0].previous['vendor'] == 'WD'
+    assert watcher.devices == {} and watcher.storage == {}
+
+    # In the background, events reach the callback as drives come and go
+    plugged = threading.Event()
+    watcher = qnapstats.ExternalDeviceWatcher(
+        qnap, callback=lambda event: plugged.set() if event.kind == 'plugged' else None,
+        min_interval=0.05, max_interval=0.2
+    )
+    watcher.start()
+    try:
+        while watcher.devices is None:
+            plugged.wait(0.01)
+        nas.drives['S3'] = {'free': 1, 'temperature': 25}
+        assert plugged.wait(2)
+    finally:
+        watcher.stop()
@@ -0,0 +1,52 @@
+"""Functional tests for polling several mocked QNAP devices at once"""
+# -*- coding:utf-8 -*-
+import json
+import time
+import qnapstats
+import responses
+from mocks import add_mock_responses, file_get_contents, models
+
+models = [model for model in models if file_get_contents(model, 'systemstats.json') is not None]
+
+devices = [
+    {"name": model, "host": "localhost", "port": 8100 + i, "username": "admin", "password": "correcthorsebatterystaple"}
+    for i, model in enumerate(models)
+]
+# Nothing is registered on this port, so every request fails
+devices.append({"name": "dead", "host": "localhost", "port": 9999, "username": "admin", "password": "x"})
+# This one answers, but far too slowly
+devices.append({"name": "slow", "host": "localhost", "port": 9998, "username": "admin", "password": "x"})
+
+
+def slow_login(request):
+    time.sleep(1)
+    return 200, {}, file_get_contents(models[0], 'login.xml')
+
+
+fleet = qnapstats.QNAPFleet(devices, getters=("get_system_stats",), max_workers=4, host_timeout=0.5)
+assert fleet.names == [device["name"] for device in devices]
+
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    for i, model in enumerate(models):
+        add_mock_responses(rsps, model, f'http://localhost:{8100 + i}/cgi-bin/')
+    rsps.add_callback(responses.POST, 'http://localhost:9998/cgi-bin/authLogin.cgi',
+                      callback=slow_login, content_type='text/xml')
+
+    start = time.monotonic()
+    results = list(fleet.poll())
+    elapsed = time.monotonic() - start
+
+# The slow device must not hold up the sweep beyond its timeout
+assert elapsed < 1
+assert sorted(result.name for result in results) == sorted(fleet.names)
+
+for result in results:
+    assert result.latency >= 0
+    if result.name == "dead":
+        assert result.error is not None
+    elif result.name == "slow":
+        assert isinstance(result.error, qnapstats.DeviceTimeout)
+    else:
+        assert result.error is None
+        expected = file_get_contents(result.name, 'systemstats.json')
+        assert json.dumps(result.data["get_system_stats"], sort_keys=True) == expected.rstrip()
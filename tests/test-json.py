@@ -0,0 +1,93 @@
+"""Tests for JSON responses and the once-per-session detection of JSON support"""
+# -*- coding:utf-8 -*-
+import json
+import os
+import qnapstats
+import requests
+from qnapstats.simulator import QTSSimulator
+from mocks import file_get_contents, getters, models, response_directory
+
+
+def recording_session(record):
+    """Build a session passing every response to ``record``."""
+    session = requests.Session()
+    session.hooks['response'].append(lambda resp, **kwargs: record(resp))
+    return session
+
+
+# JSON bodies are parsed into the same results as their XML counterparts
+for model in models:
+    simulator = QTSSimulator(os.path.join(response_directory, model), json_responses=True).start()
+    try:
+        for response_format in ('json', 'auto'):
+            content_types = []
+            session = recording_session(lambda resp: content_types.append(
+                (resp.url.split('?')[0].endswith('authLogin.cgi'), resp.headers['Content-Type'])
+            ))
+            qnap = qnapstats.QNAPStats(simulator.host, simulator.port, "admin", "x", session=session,
+                                       response_format=response_format)
+            for fixture, getter in getters.items():
+                expected = file_get_contents(model, fixture)
+                if expected is not None:
+                    assert json.dumps(getattr(qnap, getter)(), sort_keys=True) == expected.rstrip(), (model, getter)
+            assert qnap._json_supported is (True if response_format == 'auto' else None)
+            # Only the login is answered in XML
+            assert all((content_type == 'text/xml') == login for login, content_type in content_types), content_types
+    finally:
+        simulator.stop()
+
+directory = os.path.join(response_directory, 'TS-451-4.2.2')
+
+# Firmware ignoring output=json is probed once per session, then asked for XML only
+simulator = QTSSimulator(directory).start()
+try:
+    urls = []
+    session = recording_session(lambda resp: urls.append(resp.url))
+    qnap = qnapstats.QNAPStats(simulator.host, simulator.port, "admin", "x", session=session, response_format="auto")
+    expected = file_get_contents('TS-451-4.2.2', 'systemstats.json')
+    for _ in range(3):
+        assert json.dumps(qnap.get_system_stats(use_cache=False), sort_keys=True) == expected.rstrip()
+    assert qnap._json_supported is False
+    assert [url for url in urls if 'output=json' in url] == urls[1:2], urls
+
+    # A new session probes again
+    simulator.expire_sessions()
+    qnap.get_system_stats(use_cache=False)
+    assert simulator.logins == 2
+    assert qnap._json_supported is False
+    assert 'output=json' in urls[-1] and 'output=json' not in urls[-3]
+finally:
+    simulator.stop()
+
+# An error response does not decide JSON support
+simulator = QTSSimulator(directory, json_responses=True).start()
+try:
+    qnap = qnapstats.QNAPStats(simulator.host, simulator.port, "admin", "x", response_format="auto",
+                               retry_policy=qnapstats.RetryPolicy(attempts=1))
+    assert qnap._init_session() is None
+    simulator.error_rate = 1
+    assert qnap.get_system_stats() is None
+    assert qnap._json_supported is None
+    simulator.error_rate = 0
+    assert qnap.get_system_stats() is not None
+    assert qnap._json_supported is True
+finally:
+    simulator.stop()
+
+# The default stays on XML and never asks for JSON
+simulator = QTSSimulator(directory, json_responses=True).start()
+try:
+    content_types = []
+    session = recording_session(lambda resp: content_types.append(resp.headers['Content-Type']))
+    qnap = qnapstats.QNAPStats(simulator.host, simulator.port, "admin", "x", session=session)
+    assert qnap.get_system_stats() is not None
+    assert set(content_types) == {'text/xml'}
+finally:
+    simulator.stop()
+
+# JSON parsing follows the XML conventions
+parsed = qnapstats.parsers.parse_json(
+    b'{"QDocRoot": {"authPassed": 1, "flag": true, "items": {"a": null}, "skip": "x"}}',
+    force_list=['items'], keep=['flag', 'items']
+)
+assert parsed == {'authPassed': '1', 'flag': '1', 'items': [{'a': None}]}
@@ -0,0 +1,93 @@
+"""Tests for lazy imports and the http.client based LiteSession"""
+# -*- coding:utf-8 -*-
+import json
+import os
+import subprocess
+import sys
+import qnapstats
+from qnapstats.simulator import QTSSimulator
+from mocks import file_get_contents, getters, models, response_directory
+
+
+def loaded_modules(code):
+    """Run code in a fresh interpreter and return the heavy modules it imported."""
+    script = code + "\nimport sys\nprint(' '.join(m for m in ('requests', 'urllib3', 'xmltodict', 'asyncio', " \
+                    "'concurrent.futures') if m in sys.modules))"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    return subprocess.check_output([sys.executable, '-c', script], env=env).decode().split()
+
+
+# Importing the package, or building a client, loads none of the heavy dependencies
+assert loaded_modules('import qnapstats') == []
+assert loaded_modules('import qnapstats; qnapstats.QNAPStats("nas", 8080, "admin", "x")') == []
+assert loaded_modules('from qnapstats import ResponseCache, Snapshot, SystemStats') == []
+# Submodules are still reachable as attributes
+assert qnapstats.parsers.PARSERS and qnapstats.qnap_stats.SNAPSHOT_SECTIONS
+assert 'QNAPStats' in dir(qnapstats)
+
+# A LiteSession returns the same results as requests, without importing it
+for model in models:
+    simulator = QTSSimulator(os.path.join(response_directory, model)).start()
+    try:
+        qnap = qnapstats.QNAPStats(simulator.host, simulator.port, "admin", "x", session=qnapstats.LiteSession())
+        expected = {getter: file_get_contents(model, fixture) for fixture, getter in getters.items()
+                    if file_get_contents(model, fixture) is not None}
+        for getter, result in expected.items():
+            assert json.dumps(getattr(qnap, getter)(), sort_keys=True) == result.rstrip(), (model, getter)
+
+        if 'get_volumes' in expected:
+            # Streaming reads the body in chunks
+            volumes = {}
+            for kind, label, value in qnap.iter_volumes(chunk_size=64):
+                if kind == 'volume':
+                    volumes[label] = value
+                else:
+                    volumes[label].setdefault('folders', []).append(value)
+            assert json.dumps(volumes, sort_keys=True) == expected['get_volumes'].rstrip()
+
+        # Expired sessions trigger a single re-login, as with requests
+        simulator.expire_sessions()
+        getter = next(iter(expected))
+        assert json.dumps(getattr(qnap, getter)(use_cache=False), sort_keys=True) == expected[getter].rstrip()
+        assert simulator.logins == 2
+        # Connections are kept alive between requests
+        assert simulator.connections == 1, simulator.connections
+    finally:
+        simulator.stop()
+
+directory = os.path.join(response_directory, 'TS-451-4.2.2')
+simulator = QTSSimulator(directory).start()
+try:
+    modules = loaded_modules(
+        f'import qnapstats\n'
+        f'qnap = qnapstats.QNAPStats("{simulator.host}", {simulator.port}, "admin", "x", parser="etree",'
+        f' session=qnapstats.LiteSession())\n'
+        f'assert qnap.get_system_stats()["system"]["model"] == "TS-451"'
+    )
+    assert modules == [], modules
+finally:
+    simulator.stop()
+
+# Network failures are classified and re-raised like those of requests
+simulator = QTSSimulator(directory, latency=0.5).start()
+try:
+    qnap = qnapstats.QNAPStats(simulator.host, simulator.port, "admin", "x", timeout=0.1,
+                               session=qnapstats.LiteSession(), retry_policy=qnapstats.RetryPolicy(attempts=1),
+                               circuit_breaker=qnapstats.CircuitBreaker())
+    try:
+        qnap.get_system_stats()
+        assert False, "the timeout was not raised"
+    except qnapstats.retry.TransportTimeout:
+        pass
+    assert qnap.circuit_breaker.stats()['last_failure'] == 'timeout'
+finally:
+    simulator.stop()
+
+qnap = qnapstats.QNAPStats(simulator.host, simulator.port, "admin", "x", session=qnapstats.LiteSession(),
+                           retry_policy=qnapstats.RetryPolicy(attempts=1), circuit_breaker=qnapstats.CircuitBreaker())
+try:
+    qnap.get_system_stats()
+    assert False, "the connection error was not raised"
+except qnapstats.TransportError:
+    pass
+assert qnap.circuit_breaker.stats()['last_failure'] == 'connection'
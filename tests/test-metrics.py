@@ -0,0 +1,66 @@
+"""Functional tests for per-request metrics and hooks"""
+# -*- coding:utf-8 -*-
+import requests
+import qnapstats
+import responses
+from mocks import add_mock_responses, file_get_contents
+
+qnap = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple")
+assert qnap.request_stats is None
+
+recorded = []
+qnap.add_request_hook(recorded.append)
+stats = qnap.enable_request_stats()
+assert qnap.request_stats is stats
+
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    # This model needs the GET login fallback
+    add_mock_responses(rsps, 'TS-251-4.5.1')
+    qnap.get_system_stats()
+    qnap.get_system_stats()
+
+    try:
+        qnap.get_volumes()
+        assert False, "unmocked endpoint should raise once retries are exhausted"
+    except requests.exceptions.ConnectionError:
+        pass
+
+systemstats_url = 'management/manaRequest.cgi?subfunc=sysinfo&hd=no&multicpu=1'
+assert [m.endpoint for m in recorded] == [
+    'authLogin.cgi', 'authLogin.cgi', systemstats_url, systemstats_url,
+    'management/chartReq.cgi?chart_func=disk_usage&disk_select=all&include=all',
+    'management/chartReq.cgi?chart_func=disk_usage&disk_select=all&include=all',
+]
+# Credentials never end up in the endpoint label
+assert all('pwd' not in m.endpoint for m in recorded)
+assert [m.method for m in recorded[:2]] == ['POST', 'GET']
+assert recorded[-1].status is None and recorded[-1].retry
+
+totals = stats.totals()
+assert totals["requests"] == 6
+assert totals["logins"] == 2
+assert totals["errors"] == 2
+assert totals["retries"] == 1
+assert totals["network_time"] > 0 and totals["parse_time"] > 0
+
+endpoint = stats.endpoints()[systemstats_url]
+assert endpoint["requests"] == 2
+assert endpoint["bytes"] == 2 * len(file_get_contents('TS-251-4.5.1', 'systemstats.xml').encode('utf-8'))
+
+# Retried requests are flagged
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    add_mock_responses(rsps, 'TS-451-4.2.2')
+    rsps.replace(responses.GET, 'http://localhost:8080/cgi-bin/disk/qsmart.cgi?func=all_hd_data&sid=12345',
+                 status=500)
+    assert qnap.get_smart_disk_health() is None
+    assert [m.retry for m in recorded[-2:]] == [False, True]
+
+stats.reset()
+assert stats.totals()["requests"] == 0
+
+qnap.remove_request_hook(recorded.append)
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    add_mock_responses(rsps, 'TS-451-4.2.2')
+    qnap.get_system_stats()
+assert len(recorded) == 8
+assert stats.totals()["requests"] == 1
@@ -1,109 +1,15 @@
 """Functional tests where the QNAP responses are mocked"""
 # -*- coding:utf-8 -*-
-import base64
+import asyncio
+import itertools
 import json
-import os
 import qnapstats
 import responses
+from mocks import add_mock_responses, file_get_contents, getters, models
 
 
-def get_immediate_subdirectories(a_dir):
-    return [name for name in os.listdir(a_dir)
-            if os.path.isdir(os.path.join(a_dir, name))]
-
-
-response_directory = os.path.join(os.path.dirname(__file__), 'responses')
-models = get_immediate_subdirectories(response_directory)
-
-
-def add_mock_responses(rsps, directory):
-    rsps.add(responses.POST,
-             'http://localhost:8080/cgi-bin/authLogin.cgi',
-             body=file_get_contents(directory, 'login.xml'),
-             status=200,
-             content_type='text/xml')
-    if file_get_contents(directory, "login_with_get.xml"):
-        pwd = base64.b64encode("correcthorsebatterystaple".encode('utf-8')).decode('ascii')
-        rsps.add(responses.GET,
-                 'http://localhost:8080/cgi-bin/authLogin.cgi?user=admin&pwd=' + pwd,
-                 body=file_get_contents(directory, 'login_with_get.xml'),
-                 status=200,
-                 content_type='text/xml')
-    xml = file_get_contents(directory, 'bandwidth.xml')
-    if xml is not None:
-        rsps.add(responses.GET,
-                 'http://localhost:8080/cgi-bin/management/chartReq.cgi?chart_func=QSM40bandwidth&sid=12345',
-                 match_querystring=True,
-                 body=xml,
-                 status=200,
-                 content_type='text/xml')
-
-    xml = file_get_contents(directory, 'bandwidth2.xml')
-    if xml is not None:
-        rsps.add(responses.GET,
-                 'http://localhost:8080/cgi-bin/management/chartReq.cgi?chart_func=bandwidth&sid=12345',
-                 match_querystring=True,
-                 body=xml,
-                 status=200,
-                 content_type='text/xml')
-
-    xml = file_get_contents(directory, 'systemhealth.xml')
-    if xml is not None:
-        rsps.add(responses.GET,
-                 'http://localhost:8080/cgi-bin/management/manaRequest.cgi?subfunc=sysinfo&sysHealth=1&sid=12345',
-                 match_querystring=True,
-                 body=file_get_contents(directory, 'systemhealth.xml'),
-                 status=200,
-                 content_type='text/xml')
-
-    xml = file_get_contents(directory, 'volumes.xml')
-    if xml is not None:
-        rsps.add(responses.GET,
-                 'http://localhost:8080/cgi-bin/management/chartReq.cgi?chart_func=disk_usage&disk_select=all&include=all&sid=12345',  # noqa: E501
-                 match_querystring=True,
-                 body=file_get_contents(directory, 'volumes.xml'),
-                 status=200,
-                 content_type='text/xml')
-
-    xml = file_get_contents(directory, 'smartdiskhealth.xml')
-    if xml is not None:
-        rsps.add(responses.GET,
-                 'http://localhost:8080/cgi-bin/disk/qsmart.cgi?func=all_hd_data&sid=12345',
-                 match_querystring=True,
-                 body=file_get_contents(directory, 'smartdiskhealth.xml'),
-                 status=200,
-                 content_type='text/xml')
-
-    xml = file_get_contents(directory, 'systemstats.xml')
-    if xml is not None:
-        rsps.add(responses.GET,
-                 'http://localhost:8080/cgi-bin/management/manaRequest.cgi?subfunc=sysinfo&hd=no&multicpu=1&sid=12345',
-                 match_querystring=True,
-                 body=file_get_contents(directory, 'systemstats.xml'),
-                 status=200,
-                 content_type='text/xml')
-
-    xml = file_get_contents(directory, 'firmwareupdate.xml')
-    if xml is not None:
-        rsps.add(responses.GET,
-                 'http://localhost:8080/cgi-bin/sys/sysRequest.cgi?subfunc=firm_update&sid=12345',
-                 match_querystring=True,
-                 body=file_get_contents(directory, 'firmwareupdate.xml'),
-                 status=200,
-                 content_type='text/xml')
-
-
-def file_get_contents(directory, file):
-    file = os.path.join(response_directory, directory, file)
-    if not os.path.exists(file):
-        return None
-
-    with open(file, 'r') as myfile:
-        return myfile.read()
-
-
-for model_directory in models:
-    qnap = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple")
+for model_directory, parser in itertools.product(models, qnapstats.parsers.PARSERS):
+    qnap = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple", parser=parser)
     with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
         add_mock_responses(rsps, model_directory)
 
@@ -130,3 +36,27 @@ for model_directory in models:
         firmwareupdate = file_get_contents(model_directory, 'firmwareupdate.json')
         if firmwareupdate is not None:
             assert json.dumps(qnap.get_firmware_update(), sort_keys=True) == firmwareupdate
+
+
+async def gather_getters(qnap, names):
+    return await asyncio.gather(*[getattr(qnap, name)() for name in names])
+
+
+for model_directory in models:
+    qnap = qnapstats.AsyncQNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple")
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        add_mock_responses(rsps, model_directory)
+
+        expected = {}
+        for fixture, getter in getters.items():
+            contents = file_get_contents(model_directory, fixture)
+            if contents is not None:
+                expected[getter] = contents.rstrip()
+
+        # Fetch every available endpoint concurrently
+        results = asyncio.new_event_loop().run_until_complete(gather_getters(qnap, expected))
+        for getter, result in zip(expected, results):
+            assert json.dumps(result, sort_keys=True) == expected[getter]
+
+        # Concurrent getters must share a single login (POST, plus the GET fallback on some models)
+        assert len([c for c in rsps.calls if 'authLogin.cgi' in c.request.url]) <= 2
@@ -0,0 +1,30 @@
+"""Tests comparing the etree parser backend with xmltodict on every recorded response"""
+# -*- coding:utf-8 -*-
+import os
+from qnapstats.parsers import parse_etree, parse_xmltodict
+from mocks import models, response_directory
+
+force_lists = (None, "entry", "item", "DNS_LIST", ("volume", "volumeUse", "folder_element"))
+
+for model in models:
+    for name in os.listdir(os.path.join(response_directory, model)):
+        if not name.endswith('.xml'):
+            continue
+
+        with open(os.path.join(response_directory, model, name), 'rb') as f:
+            content = f.read()
+
+        for force_list in force_lists:
+            assert parse_etree(content, force_list) == parse_xmltodict(content, force_list), (model, name)
+
+        # Pruned documents only contain the requested sections (and authPassed)
+        expected = parse_xmltodict(content)
+        pruned = parse_etree(content, keep=("firmware",))
+        assert set(pruned) <= {"firmware", "authPassed", "@version"}
+        for key in pruned:
+            assert pruned[key] == expected[key]
+
+# Mixed content, attributes and whitespace-only text follow xmltodict's rules
+document = b'<QDocRoot a="1"> lead <x b="2">t</x> tail <x/> <y>  </y><z c="3"/></QDocRoot>'
+assert parse_etree(document) == parse_xmltodict(document)
+assert parse_etree(document, force_list=("y",)) == parse_xmltodict(document, force_list=("y",))
@@ -0,0 +1,115 @@
+"""Tests for the lazy typed result objects"""
+# -*- coding:utf-8 -*-
+import json
+import pickle
+import qnapstats
+import responses
+from qnapstats.results import Result
+from mocks import add_mock_responses, file_get_contents, getters, models
+
+result_types = {
+    'get_bandwidth': qnapstats.BandwidthInterface,
+    'get_smart_disk_health': qnapstats.Disk,
+    'get_volumes': qnapstats.Volume,
+}
+
+
+def plain(value):
+    return {key: item.to_dict() for key, item in value.items()} if isinstance(value, dict) else value.to_dict()
+
+
+for model_directory in models:
+    qnap = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple", typed_results=True)
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        add_mock_responses(rsps, model_directory)
+
+        # to_dict() reproduces the untyped output
+        for fixture, getter in getters.items():
+            expected = file_get_contents(model_directory, fixture)
+            if getter not in result_types or expected is None:
+                continue
+            cls = result_types[getter]
+            result = getattr(qnap, getter)()
+            assert all(type(item) is cls for item in result.values())
+            assert json.dumps(plain(result), sort_keys=True) == expected.rstrip(), (model_directory, getter)
+
+        expected = file_get_contents(model_directory, 'systemstats.json')
+        if expected is not None:
+            stats = qnap.get_system_stats()
+            assert type(stats) is qnapstats.SystemStats
+            assert json.dumps(stats.to_dict(), sort_keys=True) == expected
+            assert stats == pickle.loads(pickle.dumps(stats))
+
+            expected = json.loads(expected)
+            assert stats.cpu_usage_percent == expected["cpu"]["usage_percent"]
+            assert stats.memory_free == expected["memory"]["free"]
+            assert stats.firmware_version == expected["firmware"]["version"]
+            for interface, nic in stats.nics.items():
+                assert type(nic) is qnapstats.Nic
+                assert nic.rx_packets == expected["nics"][interface]["rx_packets"]
+                assert nic.link_status == expected["nics"][interface]["link_status"]
+            for fan, sysfan in stats.sysfans.items():
+                assert sysfan.speed == expected["sysfans"][fan]["speed"]
+
+            snapshot = qnap.get_snapshot(("system_stats",))
+            assert type(snapshot.system_stats.data) is qnapstats.SystemStats
+
+# Results carry no per-instance dict
+for cls in (qnapstats.SystemStats, qnapstats.Nic, qnapstats.SysFan, qnapstats.Volume, qnapstats.Folder,
+            qnapstats.Disk, qnapstats.BandwidthInterface):
+    assert issubclass(cls, Result)
+    assert not hasattr(cls(), '__dict__')
+
+# Raw values are only converted when read, and absent fields are left out of to_dict()
+nic = qnapstats.Nic(link_status="1", rx_packets="not a number")
+assert nic.link_status == "Up"
+assert nic.ip is None
+try:
+    nic.rx_packets
+    assert False, "conversion happens on access"
+except ValueError:
+    pass
+assert qnapstats.Folder(sharename="Public").to_dict() == {"sharename": "Public"}
+assert qnapstats.Disk(temp_c=None, type="1").to_dict() == {"temp_c": None, "type": "ssd"}
+assert repr(qnapstats.SysFan(speed="900", status="-1")) == "SysFan(speed=900, status='alert')"
+assert qnapstats.SysFan(speed="900") != qnapstats.SysFan(speed="901")
+try:
+    qnapstats.SysFan(rpm="900")
+    assert False, "unknown fields are refused"
+except TypeError:
+    pass
+
+# Folders with a malformed size are skipped, as without typed results
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    add_mock_responses(rsps, 'TS-451-4.2.2')
+    volumes = file_get_contents('TS-451-4.2.2', 'volumes.xml').replace('<![CDATA[602112]]>', '<![CDATA[n/a]]>', 1)
+    rsps.replace(responses.GET, 'http://localhost:8080/cgi-bin/management/chartReq.cgi'
+                 '?chart_func=disk_usage&disk_select=all&include=all&sid=12345',
+                 body=volumes, content_type='text/xml', match_querystring=True)
+    typed = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple", typed_results=True)
+    untyped = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple")
+    expected = untyped.get_volumes()
+    recorded = json.loads(file_get_contents('TS-451-4.2.2', 'volumes.json'))
+    assert sum(len(volume['folders']) for volume in expected.values()) == sum(
+        len(volume['folders']) for volume in recorded.values()
+    ) - 1
+    assert plain(typed.get_volumes()) == expected
+
+# The consumers of getter results accept typed results through their dicts
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    add_mock_responses(rsps, 'TS-451-4.2.2')
+    typed = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple", typed_results=True)
+    untyped = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple")
+
+    sampler = qnapstats.Sampler(typed, size=3)
+    assert sampler.sample(timestamp=1.0) and sampler.sample(timestamp=2.0)
+    assert sampler.last("cpu.usage_percent") == untyped.get_system_stats()["cpu"]["usage_percent"]
+    assert sampler.series("nics.eth0.rx_packets") == [0.0]
+
+    typed.enable_delta()
+    assert typed.get_delta("get_system_stats").changes == untyped.get_system_stats()
+    assert typed.get_delta("get_system_stats") == (False, {}, [])
+
+    for getter in ('get_system_stats', 'get_volumes', 'get_smart_disk_health', 'get_bandwidth'):
+        samples = list(qnapstats.sinks.samples(getter, getattr(typed, getter)()))
+        assert samples and samples == list(qnapstats.sinks.samples(getter, getattr(untyped, getter)()))
@@ -0,0 +1,146 @@
+"""Tests for the retry policy and circuit breaker"""
+# -*- coding:utf-8 -*-
+import asyncio
+import os
+import time
+import xml.parsers.expat
+import requests
+import responses
+import qnapstats
+from qnapstats.retry import SESSION_REJECTED, exception_failure, http_failure
+from qnapstats.simulator import QTSSimulator
+from mocks import add_mock_responses, file_get_contents, response_directory
+
+# Backoff doubles per retry up to the cap; jitter stays below it; a rejected SID is retried at once
+policy = qnapstats.RetryPolicy(attempts=5, backoff=1, max_backoff=3, jitter=False)
+assert [policy.delay(retry, http_failure(503)) for retry in (1, 2, 3, 4)] == [1, 2, 3, 3]
+assert policy.delay(1, SESSION_REJECTED) == 0
+assert all(0 <= qnapstats.RetryPolicy(backoff=1).delay(1, http_failure(503)) <= 1 for _ in range(100))
+
+assert http_failure(503).retryable and not http_failure(404).retryable
+assert exception_failure(requests.exceptions.ReadTimeout()).reason == "timeout"
+assert exception_failure(requests.exceptions.ConnectionError()).retryable
+assert not exception_failure(requests.exceptions.SSLError()).retryable
+
+no_wait = qnapstats.RetryPolicy(attempts=3, backoff=0)
+smart_url = 'http://localhost:8080/cgi-bin/disk/qsmart.cgi?func=all_hd_data&sid=12345'
+
+# A retry that succeeds is returned to the caller
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    add_mock_responses(rsps, 'TS-451-4.2.2')
+    rsps.replace(responses.GET, smart_url, status=503)
+    rsps.add(responses.GET, smart_url, status=502)
+    rsps.add(responses.GET, smart_url, status=503)
+    rsps.add(responses.GET, smart_url, body=file_get_contents('TS-451-4.2.2', 'smartdiskhealth.xml'),
+             content_type='text/xml')
+    qnap = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple", retry_policy=no_wait)
+    assert qnap.get_smart_disk_health() is None
+    assert len([call for call in rsps.calls if 'qsmart' in call.request.url]) == 3
+    # The next attempt gets the recorded response
+    assert qnap.get_smart_disk_health() is not None
+
+# Fatal errors are not retried
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    add_mock_responses(rsps, 'TS-451-4.2.2')
+    rsps.replace(responses.GET, smart_url, status=404)
+    qnap = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple", retry_policy=no_wait)
+    assert qnap.get_smart_disk_health() is None
+    assert len([call for call in rsps.calls if 'qsmart' in call.request.url]) == 1
+
+# A half-open trial that fails unexpectedly, such as with a truncated body, reopens the breaker
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    add_mock_responses(rsps, 'TS-451-4.2.2')
+    rsps.replace(responses.GET, smart_url, status=503)
+    rsps.add(responses.GET, smart_url, body='<QDocRoot version="1.0"><authPassed>', content_type='text/xml')
+    rsps.add(responses.GET, smart_url, body=file_get_contents('TS-451-4.2.2', 'smartdiskhealth.xml'),
+             content_type='text/xml')
+    breaker = qnapstats.CircuitBreaker(failure_threshold=1, cooldown=0.1)
+    qnap = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple",
+                               retry_policy=qnapstats.RetryPolicy(attempts=1), circuit_breaker=breaker)
+    assert qnap.get_smart_disk_health() is None
+    assert breaker.state == "open"
+    time.sleep(0.15)
+    try:
+        qnap.get_smart_disk_health()
+        assert False, "parse errors are raised"
+    except xml.parsers.expat.ExpatError:
+        pass
+    assert breaker.state == "open"
+    time.sleep(0.15)
+    assert qnap.get_smart_disk_health() is not None
+    assert breaker.state == "closed"
+
+model = os.path.join(response_directory, 'TS-251-4.5.1')
+simulator = QTSSimulator(model, username="admin", password="correcthorsebatterystaple").start()
+try:
+    # Refused credentials are fatal: both login methods are tried once and no getter request is made
+    breaker = qnapstats.CircuitBreaker(failure_threshold=2, cooldown=0.2)
+    intruder = qnapstats.QNAPStats(simulator.host, simulator.port, "admin", "hunter2", retry_policy=no_wait,
+                                   circuit_breaker=breaker)
+    assert intruder.circuit_breaker is breaker
+    assert intruder.get_system_stats() is None
+    assert simulator.requests == 2
+    assert breaker.stats()["last_failure"] == "login"
+    assert breaker.state == "closed"
+
+    # The second failure opens the breaker, which then refuses requests without contacting the NAS
+    assert intruder.get_system_stats() is None
+    assert breaker.state == "open"
+    assert breaker.stats()["trips"] == 1
+    assert 0 < breaker.stats()["retry_in"] <= 0.2
+    assert intruder.get_system_stats() is None
+    assert simulator.requests == 4
+
+    # After the cooldown a single trial request is let through; success closes the breaker
+    time.sleep(0.25)
+    assert breaker.state == "half_open"
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.stats()["trips"] == 2
+    time.sleep(0.25)
+    qnap = qnapstats.QNAPStats(simulator.host, simulator.port, "admin", "correcthorsebatterystaple",
+                               circuit_breaker=breaker)
+    assert qnap.get_system_stats() is not None
+    assert breaker.state == "closed"
+    assert breaker.stats()["failures"] == 0 and breaker.stats()["retry_in"] is None
+
+    # Transient errors are retried and, when they persist, the last exception is raised
+    slow = qnapstats.QNAPStats(simulator.host, simulator.port, "admin", "correcthorsebatterystaple", timeout=0.1,
+                               retry_policy=no_wait)
+    assert slow.get_system_stats() is not None
+    simulator.latency = 0.3
+    before = simulator.requests
+    try:
+        slow.get_system_stats()
+        assert False, "timeouts should be raised once retries are exhausted"
+    except requests.exceptions.Timeout:
+        pass
+    assert simulator.requests - before == 3
+
+    # The async client follows the same policy
+    simulator.latency = 0
+    breaker = qnapstats.CircuitBreaker(failure_threshold=1, cooldown=60)
+    aqnap = qnapstats.AsyncQNAPStats(simulator.host, simulator.port, "admin", "correcthorsebatterystaple",
+                                     retry_policy=no_wait, circuit_breaker=breaker)
+    loop = asyncio.new_event_loop()
+    assert loop.run_until_complete(aqnap.get_system_stats()) is not None
+    simulator.error_rate = 1
+    before = simulator.requests
+    assert loop.run_until_complete(aqnap.get_system_stats()) is None
+    assert simulator.requests - before == 3
+    assert breaker.state == "open" and breaker.stats()["last_failure"] == "http"
+    assert loop.run_until_complete(aqnap.get_system_stats()) is None
+    assert simulator.requests - before == 3
+    loop.close()
+
+    # Fleets report the breakers of their devices
+    fleet = qnapstats.QNAPFleet([
+        {"name": "sick", "host": simulator.host, "port": simulator.port, "username": "admin",
+         "password": "correcthorsebatterystaple", "circuit_breaker": breaker},
+        {"name": "plain", "host": simulator.host, "port": simulator.port, "username": "admin",
+         "password": "correcthorsebatterystaple"},
+    ])
+    assert list(fleet.circuit_states()) == ["sick"]
+    assert fleet.circuit_states()["sick"]["state"] == "open"
+finally:
+    simulator.stop()
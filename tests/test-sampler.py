@@ -0,0 +1,79 @@
+"""Tests for the time-series sampler and its ring buffers"""
+# -*- coding:utf-8 -*-
+import copy
+import json
+import time
+import qnapstats
+from mocks import file_get_contents
+
+buffer = qnapstats.RingBuffer(4)
+assert buffer.last() is None and buffer.mean() is None and buffer.percentile(50) is None
+for value in range(1, 7):
+    buffer.append(value)
+assert buffer.values() == [3, 4, 5, 6]
+assert buffer.values(window=2) == [5, 6]
+assert len(buffer) == 4
+assert buffer.last() == 6
+assert buffer.mean() == 4.5
+assert buffer.percentile(50) == 4.5
+assert buffer.percentile(100) == 6
+assert buffer.percentile(0) == 3
+
+
+class FakeQNAP:
+    """Replays recorded stats with NIC counters growing by a fixed amount per poll."""
+
+    def __init__(self):
+        self.stats = json.loads(file_get_contents('TS-451-4.2.2', 'systemstats.json'))
+        self.bandwidth = json.loads(file_get_contents('TS-451-4.2.2', 'bandwidth.json'))
+        self.polls = 0
+
+    def get_system_stats(self):
+        stats = copy.deepcopy(self.stats)
+        stats["nics"]["eth0"]["rx_packets"] += 100 * self.polls
+        stats["cpu"]["usage_percent"] = float(self.polls)
+        self.polls += 1
+        return stats
+
+    def get_bandwidth(self):
+        return self.bandwidth
+
+
+qnap = FakeQNAP()
+sampler = qnapstats.Sampler(qnap, interval=10, size=3)
+for i in range(5):
+    assert sampler.sample(timestamp=i * 10)
+
+assert "nics.eth0.rx_packets" in sampler.metrics()
+assert "bandwidth.eth0.rx" in sampler.metrics()
+
+# Counters become per-second rates; the ring keeps only the last `size` samples
+assert sampler.series("nics.eth0.rx_packets") == [10.0, 10.0, 10.0]
+assert sampler.last("nics.eth0.tx_packets") == 0.0
+assert sampler.series("cpu.usage_percent") == [2.0, 3.0, 4.0]
+assert sampler.moving_average("cpu.usage_percent", window=2) == 3.5
+assert sampler.percentile("cpu.usage_percent", 50) == 3.0
+assert sampler.last("bandwidth.eth0.rx") == qnap.bandwidth["eth0"]["rx"]
+assert sampler.last("unknown") is None
+
+# A counter reset (reboot) is skipped rather than recorded as a negative rate
+qnap.polls = 0
+sampler.sample(timestamp=50)
+assert sampler.series("nics.eth0.rx_packets") == [10.0, 10.0, 10.0]
+sampler.sample(timestamp=60)
+assert sampler.last("nics.eth0.rx_packets") == 10.0
+
+# Background sampling
+sampler = qnapstats.Sampler(FakeQNAP(), interval=0.01, size=10, bandwidth=False)
+sampler.start()
+time.sleep(0.1)
+sampler.stop()
+assert len(sampler.series("cpu.usage_percent")) >= 2
+assert "bandwidth.eth0.rx" not in sampler.metrics()
+
+# Pollers must implement their polling loop
+try:
+    qnapstats.sampler.BackgroundPoller()
+    assert False, "BackgroundPoller is abstract"
+except TypeError:
+    pass
@@ -0,0 +1,54 @@
+"""Functional tests for reusing session ids across clients"""
+# -*- coding:utf-8 -*-
+import json
+import os
+import tempfile
+import qnapstats
+import responses
+from mocks import add_mock_responses, file_get_contents
+
+model = 'TS-451-4.2.2'
+systemstats = file_get_contents(model, 'systemstats.json')
+key = 'admin@http://localhost:8080/cgi-bin/'
+
+
+def new_client(store):
+    return qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple", session_store=store)
+
+
+def login_calls(rsps):
+    return len([c for c in rsps.calls if 'authLogin.cgi' in c.request.url])
+
+
+with tempfile.TemporaryDirectory() as directory:
+    for store in (qnapstats.MemorySessionStore(), qnapstats.FileSessionStore(os.path.join(directory, 'sids.json'))):
+        with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+            add_mock_responses(rsps, model)
+            rsps.add(responses.GET,
+                     'http://localhost:8080/cgi-bin/management/manaRequest.cgi?subfunc=sysinfo&hd=no&multicpu=1&sid=stale',  # noqa: E501
+                     match_querystring=True,
+                     body='<QDocRoot><authPassed><![CDATA[0]]></authPassed></QDocRoot>',
+                     content_type='text/xml')
+
+            # Only the first client logs in; the next one reuses its SID
+            assert json.dumps(new_client(store).get_system_stats(), sort_keys=True) == systemstats
+            assert json.dumps(new_client(store).get_system_stats(), sort_keys=True) == systemstats
+            assert login_calls(rsps) == 1
+            assert store.get(key) == '12345'
+
+            # A rejected SID is dropped and replaced by a fresh login within the same call
+            store.set(key, 'stale', 3600)
+            assert json.dumps(new_client(store).get_system_stats(), sort_keys=True) == systemstats
+            assert login_calls(rsps) == 2
+            assert store.get(key) == '12345'
+
+            # Expired SIDs are not reused
+            store.set(key, 'expired', -1)
+            assert store.get(key) is None
+            new_client(store).get_system_stats()
+            assert login_calls(rsps) == 3
+
+    # The file store survives a "restart" and is only readable by its owner
+    path = os.path.join(directory, 'sids.json')
+    assert qnapstats.FileSessionStore(path).get(key) == '12345'
+    assert os.stat(path).st_mode & 0o077 == 0
@@ -0,0 +1,62 @@
+"""Functional tests running the client against the local QTS simulator over real HTTP"""
+# -*- coding:utf-8 -*-
+import json
+import os
+import qnapstats
+from qnapstats.simulator import QTSSimulator, start_simulators
+from mocks import file_get_contents, getters, models, response_directory
+
+for model in models:
+    simulator = QTSSimulator(os.path.join(response_directory, model),
+                             username="admin", password="correcthorsebatterystaple").start()
+    try:
+        qnap = qnapstats.QNAPStats(simulator.host, simulator.port, "admin", "correcthorsebatterystaple")
+        expected = {getter: file_get_contents(model, fixture) for fixture, getter in getters.items()
+                    if file_get_contents(model, fixture) is not None}
+        for getter, result in expected.items():
+            assert json.dumps(getattr(qnap, getter)(), sort_keys=True) == result.rstrip(), (model, getter)
+        assert simulator.logins == 1
+
+        # Expired sessions are detected through authPassed and trigger a single re-login
+        simulator.expire_sessions()
+        getter = next(iter(expected))
+        assert json.dumps(getattr(qnap, getter)(), sort_keys=True) == expected[getter].rstrip()
+        assert simulator.logins == 2
+
+        # Wrong credentials are refused
+        intruder = qnapstats.QNAPStats(simulator.host, simulator.port, "admin", "hunter2")
+        assert intruder.get_firmware_update() is None
+    finally:
+        simulator.stop()
+
+# Injected errors and session expiry
+directory = os.path.join(response_directory, 'TS-451-4.2.2')
+simulator = QTSSimulator(directory, error_rate=1).start()
+try:
+    assert qnapstats.QNAPStats(simulator.host, simulator.port, "admin", "x").get_system_stats() is None
+finally:
+    simulator.stop()
+
+simulator = QTSSimulator(directory, session_ttl=0).start()
+try:
+    qnap = qnapstats.QNAPStats(simulator.host, simulator.port, "admin", "x")
+    # Every SID is already stale when used, so the retry cannot succeed either
+    assert qnap.get_system_stats() is None
+    assert simulator.logins == 2
+finally:
+    simulator.stop()
+
+# Many devices at once
+simulators = start_simulators(directory, 20, latency=0.01)
+try:
+    fleet = qnapstats.QNAPFleet(
+        [{"host": s.host, "port": s.port, "username": "admin", "password": "x"} for s in simulators],
+        getters=("get_system_health",), max_workers=20
+    )
+    results = list(fleet.poll())
+    assert len(results) == 20
+    assert all(result.error is None and result.data["get_system_health"] == "good" for result in results)
+    assert len({s.port for s in simulators}) == 20
+finally:
+    for simulator in simulators:
+        simulator.stop()
@@ -0,0 +1,115 @@
+"""Tests for the bulk SMART attribute collector"""
+# -*- coding:utf-8 -*-
+import re
+import threading
+import time
+import qnapstats
+import requests
+import responses
+from qnapstats.smart import raw_value
+from mocks import add_mock_responses
+
+# The per-disk attribute table is not among the recorded responses, so this document is synthetic
+SMART_INFO = """<?xml version="1.0" encoding="UTF-8" ?>
+<QDocRoot version="1.0"><authPassed><![CDATA[1]]></authPassed><SmartInfo>
+<entry><ID>5</ID><Name>Reallocated_Sector_Ct</Name><Value>200</Value><Worst>200</Worst><Threshold>140</Threshold>
+<Raw>{reallocated}</Raw><Status>OK</Status></entry>
+<entry><ID>194</ID><Name>Temperature_Celsius</Name><Value>118</Value><Worst>105</Worst><Threshold>0</Threshold>
+<Raw>32 (Min/Max 21/45)</Raw><Status>OK</Status></entry>
+<entry><ID>197</ID><Name>Current_Pending_Sector</Name><Value>200</Value><Worst>200</Worst><Threshold>0</Threshold>
+<Raw>0</Raw><Status>OK</Status></entry>
+</SmartInfo></QDocRoot>"""
+
+assert raw_value("32 (Min/Max 21/45)") == 32
+assert raw_value("0x0000") == 0
+assert raw_value(None) is None and raw_value("n/a") is None
+
+requested = []
+reallocated = {"0:1": 0, "0:2": 0, "0:3": 0, "0:4": 0}
+in_flight = {"now": 0, "max": 0}
+lock = threading.Lock()
+
+
+def smart_info(request):
+    drive = re.search(r"drive_no=([^&]+)", request.url).group(1).replace("%3A", ":")
+    with lock:
+        requested.append(drive)
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+    time.sleep(0.05)
+    with lock:
+        in_flight["now"] -= 1
+    return 200, {}, SMART_INFO.format(reallocated=reallocated[drive])
+
+
+qnap = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple")
+collector = qnapstats.SmartCollector(qnap, ttl=60, history=3, attributes=(5, 194, 199))
+
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    add_mock_responses(rsps, 'TS-451-4.2.2')
+    rsps.add_callback(responses.GET, re.compile(r".*qsmart\.cgi\?func=get_hd_smartinfo.*"), callback=smart_info,
+                      content_type="text/xml")
+
+    assert qnap.get_smart_disk_attributes("0:1")[194] == {
+        "name": "Temperature_Celsius", "value": 118, "worst": 105, "threshold": 0, "raw": "32 (Min/Max 21/45)",
+        "status": "OK",
+    }
+    del requested[:]
+
+    # All disks are fetched concurrently
+    tables = collector.collect()
+    assert sorted(tables) == ["0:1", "0:2", "0:3", "0:4"]
+    assert sorted(requested) == sorted(tables)
+    assert in_flight["max"] > 1
+    assert tables["0:1"][5]["raw"] == "0"
+
+    # Fresh tables are served from memory
+    assert collector.collect() == tables
+    assert len(requested) == 4
+
+    reallocated["0:3"] = 8
+    collector.collect(force=True)
+    reallocated["0:3"] = 24
+    collector.collect(force=True)
+    assert len(requested) == 12
+
+history = collector.history("0:3", 5)
+assert [value for _, value in history] == [0, 8, 24]
+assert all(timestamp > 0 for timestamp, _ in history)
+assert collector.history("0:3", 194)[-1][1] == 32
+# Attributes the disk does not report are recorded as missing
+assert [value for _, value in collector.history("0:3", 199)] == [None, None, None]
+assert collector.history("0:3", 197) == []
+
+assert collector.growth("0:3", 5) == 24
+assert collector.growth("0:3", 5, window=2) == 16
+assert collector.growth("0:1", 5) == 0
+assert collector.growth("0:3", 199) is None
+assert collector.growing(5) == ["0:3"]
+assert collector.drives() == ["0:1", "0:2", "0:3", "0:4"]
+
+# The history is bounded
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    add_mock_responses(rsps, 'TS-451-4.2.2')
+    rsps.add_callback(responses.GET, re.compile(r".*qsmart\.cgi\?func=get_hd_smartinfo.*"), callback=smart_info,
+                      content_type="text/xml")
+    reallocated["0:3"] = 30
+    collector.collect(force=True)
+assert [value for _, value in collector.history("0:3", 5)] == [8, 24, 30]
+
+# A disk whose table times out is left out, without dropping the others
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    add_mock_responses(rsps, 'TS-451-4.2.2')
+    rsps.add(responses.GET, re.compile(r".*qsmart\.cgi\?func=get_hd_smartinfo&drive_no=0%3A2.*"),
+             body=requests.exceptions.Timeout())
+    rsps.add_callback(responses.GET, re.compile(r".*qsmart\.cgi\?func=get_hd_smartinfo.*"), callback=smart_info,
+                      content_type="text/xml")
+    qnap = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple",
+                               retry_policy=qnapstats.RetryPolicy(attempts=1))
+    assert sorted(qnapstats.SmartCollector(qnap).collect()) == ["0:1", "0:3", "0:4"]
+
+    # Typed clients return Disk objects; the timeout was only registered once, so every disk answers now
+    typed = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple", typed_results=True)
+    typed_collector = qnapstats.SmartCollector(typed)
+    assert sorted(typed_collector.collect()) == ["0:1", "0:2", "0:3", "0:4"]
+    assert typed_collector.drives() == ["0:1", "0:2", "0:3", "0:4"]
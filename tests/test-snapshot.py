@@ -0,0 +1,87 @@
+"""Functional tests for fetching all metrics in a single snapshot"""
+# -*- coding:utf-8 -*-
+import asyncio
+import json
+import qnapstats
+import responses
+from mocks import add_mock_responses, file_get_contents, models
+
+combined_url = ('http://localhost:8080/cgi-bin/management/manaRequest.cgi'
+                '?subfunc=sysinfo&hd=no&multicpu=1&sysHealth=1&sid=12345')
+
+
+def combined_sysinfo(model):
+    """Splice the sysHealth block of systemhealth.xml into systemstats.xml."""
+    health = file_get_contents(model, 'systemhealth.xml')
+    health = health[health.index('<sysHealth>'):health.index('</sysHealth>') + len('</sysHealth>')]
+    return file_get_contents(model, 'systemstats.xml').replace('<ownContent>', '<ownContent>' + health, 1)
+
+
+def sysinfo_calls(rsps):
+    return len([c for c in rsps.calls if 'subfunc=sysinfo' in c.request.url])
+
+
+def assert_section(snapshot, section, model):
+    expected = file_get_contents(model, section.replace('_', '') + '.json')
+    value = getattr(snapshot, section)
+    assert value.timestamp > 0
+    assert json.dumps(value.data, sort_keys=True) == expected.rstrip()
+
+
+for model in models:
+    available = [section for section in qnapstats.qnap_stats.SNAPSHOT_SECTIONS
+                 if file_get_contents(model, section.replace('_', '') + '.json') is not None]
+    if not {'system_stats', 'system_health'} <= set(available):
+        continue
+
+    # Firmware answering both sections from one sysinfo request
+    for client in (qnapstats.QNAPStats, qnapstats.AsyncQNAPStats):
+        qnap = client("localhost", 8080, "admin", "correcthorsebatterystaple")
+        with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+            add_mock_responses(rsps, model)
+            rsps.add(responses.GET, combined_url, body=combined_sysinfo(model), content_type='text/xml')
+
+            snapshot = qnap.get_snapshot(available)
+            if client is qnapstats.AsyncQNAPStats:
+                snapshot = asyncio.new_event_loop().run_until_complete(snapshot)
+
+            assert isinstance(snapshot, qnapstats.Snapshot)
+            for section in available:
+                assert_section(snapshot, section, model)
+            assert sysinfo_calls(rsps) == 1
+
+    # Firmware ignoring sysHealth=1 falls back to the dedicated health request, once
+    qnap = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple")
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        add_mock_responses(rsps, model)
+        rsps.add(responses.GET, combined_url, body=file_get_contents(model, 'systemstats.xml'),
+                 content_type='text/xml')
+
+        snapshot = qnap.get_snapshot(('system_stats', 'system_health'))
+        assert_section(snapshot, 'system_stats', model)
+        assert_section(snapshot, 'system_health', model)
+        assert snapshot.volumes is None
+        assert sysinfo_calls(rsps) == 2
+
+        qnap.get_snapshot(('system_stats', 'system_health'))
+        assert sysinfo_calls(rsps) == 4
+        # The combined request is not attempted again
+        assert len([c for c in rsps.calls if 'multicpu=1&sysHealth=1' in c.request.url]) == 1
+
+# A failed combined request leaves both sections empty, without learning anything or retrying them separately
+qnap = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple",
+                           retry_policy=qnapstats.RetryPolicy(attempts=1))
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    add_mock_responses(rsps, 'TS-451-4.2.2')
+    rsps.add(responses.GET, combined_url, status=503)
+    rsps.add(responses.GET, combined_url, body=combined_sysinfo('TS-451-4.2.2'), content_type='text/xml')
+
+    snapshot = qnap.get_snapshot(('system_stats', 'system_health'))
+    assert snapshot.system_stats.data is None and snapshot.system_health.data is None
+    assert sysinfo_calls(rsps) == 1
+    assert qnap.capabilities.get('combined_sysinfo') is None
+
+    snapshot = qnap.get_snapshot(('system_stats', 'system_health'))
+    assert_section(snapshot, 'system_stats', 'TS-451-4.2.2')
+    assert_section(snapshot, 'system_health', 'TS-451-4.2.2')
+    assert qnap.capabilities.get('combined_sysinfo') is True
@@ -0,0 +1,154 @@
+"""Stress tests sharing one client between many threads and coroutines"""
+# -*- coding:utf-8 -*-
+import asyncio
+import concurrent.futures
+import json
+import re
+import threading
+import time
+import urllib.parse
+import qnapstats
+import requests
+import responses
+from mocks import file_get_contents
+
+model = 'TS-451-4.2.2'
+base_url = 'http://localhost:8080/cgi-bin/'
+expected = file_get_contents(model, 'systemstats.json').rstrip()
+rejected = '<QDocRoot version="1.0"><authPassed><![CDATA[0]]></authPassed></QDocRoot>'
+
+
+class Device:
+    """Mocked NAS handing out a new SID on each login and rejecting any other."""
+
+    def __init__(self, rsps, login_delay=0.05):
+        self.logins = 0
+        self.rejections = 0
+        self.posted = []
+        self.sid = None
+        self.refuse_logins = False
+        self.unreachable = False
+        self._login_delay = login_delay
+        self._lock = threading.Lock()
+
+        rsps.add_callback(responses.POST, base_url + 'authLogin.cgi', callback=self.login, content_type='text/xml')
+        # Only used as a fallback after a refused POST login
+        rsps.add_callback(responses.GET, re.compile(re.escape(base_url + 'authLogin.cgi') + '.*'),
+                          callback=lambda request: (200, {}, rejected), content_type='text/xml')
+        rsps.add_callback(responses.GET, re.compile(re.escape(base_url + 'management/manaRequest.cgi') + '.*'),
+                          callback=self.system_stats, content_type='text/xml')
+        rsps.add_callback(responses.POST, base_url + 'devices/devRequest.cgi', callback=self.post,
+                          content_type='text/xml')
+
+    def login(self, request):
+        time.sleep(self._login_delay)
+        with self._lock:
+            self.logins += 1
+            if self.unreachable:
+                raise requests.exceptions.ConnectionError("Connection refused")
+            if self.refuse_logins:
+                return 200, {}, rejected
+            self.sid = f'sid{self.logins}'
+            return 200, {}, file_get_contents(model, 'login.xml').replace('12345', self.sid)
+
+    def system_stats(self, request):
+        sid = urllib.parse.parse_qs(urllib.parse.urlsplit(request.url).query).get('sid', [None])[0]
+        with self._lock:
+            if sid is None or sid != self.sid:
+                self.rejections += 1
+                return 200, {}, rejected
+        return 200, {}, file_get_contents(model, 'systemstats.xml')
+
+    def post(self, request):
+        self.posted.append(urllib.parse.parse_qs(request.body))
+        return 200, {}, '<QDocRoot version="1.0"><authPassed><![CDATA[1]]></authPassed></QDocRoot>'
+
+    def expire(self):
+        with self._lock:
+            self.sid = None
+
+
+def hammer(qnap, threads=32, calls=10):
+    """Call get_system_stats() from many threads at once and return the JSON of every result."""
+    barrier = threading.Barrier(threads)
+
+    def work(_):
+        barrier.wait()
+        return [json.dumps(qnap.get_system_stats(), sort_keys=True) for _ in range(calls)]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        return [result for results in executor.map(work, range(threads)) for result in results]
+
+
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    device = Device(rsps)
+    qnap = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple")
+
+    # Threads arriving without a session wait for a single login
+    results = hammer(qnap)
+    assert results == [expected] * len(results)
+    assert device.logins == 1, device.logins
+
+    # Once the NAS forgets the SID, every thread sees it rejected but only one logs in again
+    device.expire()
+    results = hammer(qnap)
+    assert results == [expected] * len(results)
+    assert device.logins == 2, device.logins
+    assert device.rejections >= 1
+
+    # The caller's data is not changed, so it may be shared between threads
+    data = {"func": "getExternalDev"}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: qnap._execute_post_url("devices/devRequest.cgi", data), range(32)))
+    assert data == {"func": "getExternalDev"}
+    assert all(posted == {"func": ["getExternalDev"], "sid": ["sid2"]} for posted in device.posted)
+
+    # Threads waiting for a login that is refused share its failure instead of each trying again
+    device.expire()
+    device.refuse_logins = True
+    qnap = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple",
+                               retry_policy=qnapstats.RetryPolicy(attempts=1))
+    logins = device.logins
+    assert hammer(qnap, threads=16, calls=1) == ['null'] * 16
+    assert device.logins - logins < 16, device.logins - logins
+    device.refuse_logins = False
+
+    # So do threads waiting for a login that raises; they all get its exception
+    device.unreachable = True
+    qnap = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple",
+                               retry_policy=qnapstats.RetryPolicy(attempts=1))
+    logins = device.logins
+    barrier = threading.Barrier(16)
+
+    def unreachable(_):
+        barrier.wait()
+        try:
+            return qnap.get_system_stats()
+        except requests.exceptions.ConnectionError as e:
+            return e
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+        errors = list(executor.map(unreachable, range(16)))
+    assert all(isinstance(error, requests.exceptions.ConnectionError) for error in errors), errors
+    assert device.logins - logins < 16, device.logins - logins
+    device.unreachable = False
+
+    # Coroutines run requests in executor threads; they too share one login
+    device.expire()
+    logins = device.logins
+    qnap = qnapstats.AsyncQNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple",
+                                    executor=concurrent.futures.ThreadPoolExecutor(max_workers=16))
+
+    async def gather(count):
+        return await asyncio.gather(*(qnap.get_system_stats() for _ in range(count)))
+
+    loop = asyncio.new_event_loop()
+    results = loop.run_until_complete(gather(64))
+    assert [json.dumps(result, sort_keys=True) for result in results] == [expected] * 64
+    assert device.logins - logins == 1
+
+    device.expire()
+    results = loop.run_until_complete(gather(64))
+    assert [json.dumps(result, sort_keys=True) for result in results] == [expected] * 64
+    assert device.logins - logins == 2
+    loop.close()
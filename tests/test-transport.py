@@ -0,0 +1,56 @@
+"""Tests for sharing tuned connection pools between clients"""
+# -*- coding:utf-8 -*-
+import os
+import qnapstats
+from qnapstats.simulator import start_simulators
+from mocks import response_directory
+
+session = qnapstats.create_session(pool_connections=4, pool_maxsize=2, max_retries=3)
+adapter = session.get_adapter("https://nas.example.com")
+assert adapter is session.get_adapter("http://nas.example.com")
+assert adapter._pool_connections == 4
+assert adapter._pool_maxsize == 2
+assert adapter.max_retries.total == 3
+assert session.headers["Connection"] == "keep-alive"
+
+assert qnapstats.create_session(keep_alive=False).headers["Connection"] == "close"
+
+simulators = start_simulators(os.path.join(response_directory, "TS-451-4.2.2"), 2)
+try:
+    clients = [qnapstats.QNAPStats(s.host, s.port, "admin", "secret", session=session) for s in simulators]
+    for qnap in clients:
+        assert qnap.get_system_stats() is not None
+        assert qnap._session is session
+
+    # A rejected SID only triggers a new login; the pooled connection is kept
+    simulators[0].expire_sessions()
+    assert clients[0].get_system_stats() is not None
+    assert simulators[0].logins == 2
+    assert clients[0]._session is session
+    assert simulators[0].connections == 1
+
+    # Shared sessions survive close(), owned ones are released
+    clients[0].close()
+    assert clients[0]._session is session
+    assert clients[1].get_volumes() is not None
+
+    own = qnapstats.QNAPStats(simulators[1].host, simulators[1].port, "admin", "secret")
+    assert own.get_bandwidth() is not None
+    owned_session = own._session
+    simulators[1].expire_sessions()
+    assert own.get_bandwidth() is not None
+    assert own._session is owned_session
+    own.close()
+    assert own._session is None
+    assert own.get_bandwidth() is not None
+
+    # A fleet hands its session to every device without one of its own
+    fleet = qnapstats.QNAPFleet(
+        [{"host": s.host, "port": s.port, "username": "admin", "password": "secret"} for s in simulators],
+        getters=("get_system_stats",), session=session
+    )
+    assert all(result.error is None for result in fleet.poll_all().values())
+    assert all(client._session is session for client in fleet._clients.values())
+finally:
+    for simulator in simulators:
+        simulator.stop()
@@ -0,0 +1,103 @@
+"""Functional tests for streaming volume and folder listings"""
+# -*- coding:utf-8 -*-
+import asyncio
+import json
+import qnapstats
+import responses
+from qnapstats.parsers import iter_volume_events
+from mocks import add_mock_responses, file_get_contents, models
+
+
+def rebuild(events):
+    """Assemble streamed events into the structure returned by get_volumes()."""
+    volumes = {}
+    for kind, label, value in events:
+        if kind == "volume":
+            volumes[label] = value
+        else:
+            volumes[label].setdefault("folders", []).append(value)
+    return volumes
+
+
+for model in models:
+    expected = file_get_contents(model, 'volumes.json')
+    if expected is None:
+        continue
+
+    qnap = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple")
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        add_mock_responses(rsps, model)
+        assert json.dumps(rebuild(qnap.iter_volumes(chunk_size=64)), sort_keys=True) == expected
+
+    # Feeding the document a byte at a time yields the same events
+    content = file_get_contents(model, 'volumes.xml').encode('utf-8')
+    chunks = (content[i:i + 1] for i in range(len(content)))
+    assert json.dumps(rebuild(iter_volume_events(chunks)), sort_keys=True) == expected
+
+# Thousands of folders are yielded one by one; the tree never holds more than the current one
+folders = ''.join(f'<folder_element><sharename>share{i}</sharename><used_size>{i}</used_size></folder_element>'
+                  for i in range(5000))
+document = (f'<QDocRoot><authPassed>1</authPassed><volumeList><volume><volumeValue>1</volumeValue></volume>'
+            f'</volumeList><volumeUseList><volumeUse><volumeValue>1</volumeValue><total_size>10</total_size>'
+            f'<free_size>5</free_size>{folders}</volumeUse></volumeUseList></QDocRoot>').encode('utf-8')
+events = iter_volume_events(document[i:i + 1024] for i in range(0, len(document), 1024))
+assert next(events) == ("volume", "Volume 1", {"id": "1", "label": "Volume 1", "free_size": 5, "total_size": 10})
+assert sum(1 for _ in events) == 5000
+
+# A rejected session triggers one re-login before streaming
+qnap = qnapstats.QNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple")
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    add_mock_responses(rsps, 'TS-451-4.2.2')
+    qnap.get_system_stats()
+    qnap._sid = 'stale'
+    rsps.add(responses.GET,
+             'http://localhost:8080/cgi-bin/management/chartReq.cgi?chart_func=disk_usage&disk_select=all&include=all&sid=stale',  # noqa: E501
+             match_querystring=True,
+             body='<QDocRoot><authPassed><![CDATA[0]]></authPassed></QDocRoot>',
+             content_type='text/xml')
+    assert json.dumps(rebuild(qnap.iter_volumes()), sort_keys=True) == file_get_contents('TS-451-4.2.2', 'volumes.json')
+    assert len([c for c in rsps.calls if 'authLogin.cgi' in c.request.url]) == 2
+
+# The charset of the Content-Type is ignored, as by get_volumes()
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    add_mock_responses(rsps, 'TS-451-4.2.2')
+    rsps.replace(responses.GET,
+                 'http://localhost:8080/cgi-bin/management/chartReq.cgi?chart_func=disk_usage&disk_select=all&include=all&sid=12345',  # noqa: E501
+                 match_querystring=True, body=file_get_contents('TS-451-4.2.2', 'volumes.xml'),
+                 content_type='text/xml; charset=UTF-8')
+    assert json.dumps(rebuild(qnap.iter_volumes()), sort_keys=True) == file_get_contents('TS-451-4.2.2', 'volumes.json')
+
+# Failures raise instead of ending the stream as if there were no volumes
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    add_mock_responses(rsps, 'TS-451-4.2.2')
+    rsps.replace(responses.GET,
+                 'http://localhost:8080/cgi-bin/management/chartReq.cgi?chart_func=disk_usage&disk_select=all&include=all&sid=12345',  # noqa: E501
+                 match_querystring=True, status=503)
+    try:
+        list(qnap.iter_volumes())
+        assert False
+    except qnapstats.RequestFailed as e:
+        assert e.failure.reason == "http" and e.failure.status == 503
+
+refused = qnapstats.QNAPStats("localhost", 8080, "admin", "wrong")
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    rsps.add(responses.POST, 'http://localhost:8080/cgi-bin/authLogin.cgi',
+             body='<QDocRoot><authPassed><![CDATA[0]]></authPassed></QDocRoot>', content_type='text/xml')
+    rsps.add(responses.GET, 'http://localhost:8080/cgi-bin/authLogin.cgi',
+             body='<QDocRoot><authPassed><![CDATA[0]]></authPassed></QDocRoot>', content_type='text/xml')
+    try:
+        list(refused.iter_volumes())
+        assert False
+    except qnapstats.RequestFailed as e:
+        assert e.failure.reason == "login"
+
+
+# The async client streams through its executor
+async def stream():
+    async_qnap = qnapstats.AsyncQNAPStats("localhost", 8080, "admin", "correcthorsebatterystaple")
+    return rebuild([event async for event in async_qnap.iter_volumes(chunk_size=64)])
+
+
+with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+    add_mock_responses(rsps, 'TS-451-4.2.2')
+    assert json.dumps(asyncio.run(stream()), sort_keys=True) == file_get_contents('TS-451-4.2.2', 'volumes.json')